@@ -0,0 +1,98 @@
+"""
+Admin Commands
+
+Commands for gridpunx server administration.
+
+"""
+
+import os
+import time
+
+from django.conf import settings
+
+from commands.command import MuxCommand
+from world import metrics, offload
+
+
+@offload.offloadable(offload.BATCH)
+def _write_stats(path, summary, profiles):
+    "Write a statistics dump; runs in a worker thread."
+    return metrics.write_commands(path, summary, profiles)
+
+
+class CmdCommandStats(MuxCommand):
+    """
+    show command timing statistics
+
+    Usage:
+      @cmdstats [<number of commands>]
+      @cmdstats/profile <rate>
+      @cmdstats/dump [<file name>]
+
+    Switches:
+      profile - run the given fraction (0-1) of command invocations
+                under the profiler. 0 turns profiling off.
+      dump    - write the statistics and the profiles of the slowest
+                invocations to a file in the server log directory.
+
+    Without switches, lists the commands with the slowest 99th
+    percentile, with their call counts and the database queries and
+    messages they cost per call.
+    """
+
+    key = "@cmdstats"
+    switch_options = ("profile", "dump")
+    locks = "cmd:perm(Admin)"
+    help_category = "System"
+
+    def func(self):
+        """Implement @cmdstats"""
+
+        caller = self.caller
+        if "profile" in self.switches:
+            try:
+                metrics.set_profile_rate(self.args.strip())
+            except ValueError:
+                caller.msg("Usage: @cmdstats/profile <rate between 0 and 1>")
+                return
+            caller.msg("Profiling %g%% of command invocations." % (metrics.PROFILING["rate"] * 100))
+            return
+        if "dump" in self.switches:
+            filename = os.path.basename(self.args.strip()) or time.strftime(
+                "cmdstats-%Y%m%d-%H%M%S.txt"
+            )
+            path = os.path.join(settings.LOG_DIR, filename)
+            # Snapshot the statistics here, format and write them in a
+            # worker thread.
+            return offload.run(
+                _write_stats,
+                path,
+                metrics.command_summary(),
+                sorted(metrics.SLOW_PROFILES, reverse=True),
+            ).addCallback(
+                lambda num: caller.msg("Wrote command statistics and %i profiles to %s." % (num, path))
+            )
+
+        try:
+            limit = int(self.args) if self.args else 20
+        except ValueError:
+            caller.msg("Usage: @cmdstats [<number of commands>]")
+            return
+        rows = metrics.command_summary()[:limit]
+        if not rows:
+            caller.msg("No commands recorded yet.")
+            return
+        lines = [
+            "|w%-20s %7s %9s %9s %9s %8s %8s|n"
+            % ("command", "calls", "mean(ms)", "p50(ms)", "p99(ms)", "queries", "msgs")
+        ]
+        for key, count, mean, p50, p99, queries, messages in rows:
+            lines.append(
+                "%-20s %7i %9.1f %9.1f %9.1f %8.1f %8.1f"
+                % (key[:20], count, mean * 1000, p50 * 1000, p99 * 1000, queries, messages)
+            )
+        lines.append(
+            "Profiling %g%% of invocations, %i slow profiles kept."
+            % (metrics.PROFILING["rate"] * 100, len(metrics.SLOW_PROFILES))
+        )
+        caller.msg("\n".join(lines))
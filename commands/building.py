@@ -0,0 +1,78 @@
+"""
+Building Commands
+
+Commands for builders maintaining the gridpunx world.
+
+"""
+
+import os
+
+from django.conf import settings
+
+from commands.command import MuxCommand
+from world import builder, districts, offload
+
+
+class CmdDistrict(MuxCommand):
+    """
+    update a district from its world file
+
+    Usage:
+      @district[/switches] [<world file>]
+
+    Switches:
+      dry   - only show what would change
+      prune - also delete objects no longer in the file
+
+    Compares a world file (by default the game's world file) with the
+    district it describes and creates, changes or deletes only what
+    differs. Objects keep their dbrefs. A world file given here is
+    looked up in the game's world directory, e.g. 'districts/docks.json'.
+    See world/builder.py for the file format.
+    """
+
+    key = "@district"
+    switch_options = ("dry", "prune")
+    locks = "cmd:perm(Builder)"
+    help_category = "Building"
+
+    def func(self):
+        """Implement @district"""
+
+        path = settings.GRIDPUNX_WORLD_FILE
+        if self.args.strip():
+            path = self._world_path(self.args.strip())
+            if not path:
+                self.caller.msg("|rWorld files must be given relative to the world directory.|n")
+                return
+        # Reading the file happens in a worker thread; the command
+        # handler waits for the rest.
+        return offload.run(builder.load_world, path).addCallbacks(self._update, self._failed)
+
+    def _world_path(self, name):
+        "The path of world file `name` in the world directory, or None if outside it."
+        if os.path.isabs(name) or ".." in name.replace("\\", "/").split("/"):
+            return None
+        world_dir = os.path.realpath(settings.GRIDPUNX_WORLD_DIR)
+        path = os.path.realpath(os.path.join(world_dir, name))
+        # Symlinks may still lead out of it.
+        if os.path.commonpath((world_dir, path)) != world_dir:
+            return None
+        return path
+
+    def _failed(self, failure):
+        failure.trap(builder.WorldFileError, offload.OffloadBusy)
+        self.caller.msg("|r%s|n" % failure.getErrorMessage())
+
+    def _update(self, world):
+        caller = self.caller
+        try:
+            changeset = districts.diff_district(world, prune="prune" in self.switches)
+        except builder.WorldFileError as err:
+            caller.msg("|r%s|n" % err)
+            return
+        caller.msg(changeset.summary())
+        if not changeset or "dry" in self.switches:
+            return
+        districts.apply_changeset(changeset, report=caller.msg)
+        caller.msg("District '%s' is up to date." % changeset.district)
@@ -5,9 +5,46 @@ Commands describe the input the account can do to the game.
 
 """
 
+import types
+from functools import wraps
+
+from twisted.internet.defer import Deferred
+
 from evennia import Command as BaseCommand
+from evennia.commands.default.muxcommand import MuxCommand as BaseMuxCommand
+from evennia.utils import utils
+
+from world import metrics
+
+
+def _tracked(func):
+    """
+    Wrap a command's func() so the metrics learn when it starts, when
+    it goes on waiting for a Deferred and when it fails (the command
+    handler calls no hook for either).
+    """
+
+    @wraps(func)
+    def _func(self, *args, **kwargs):
+        metrics.command_running(self)
+        try:
+            result = func(self, *args, **kwargs)
+        except Exception:
+            metrics.command_failed(self)
+            raise
+        if isinstance(result, (Deferred, types.GeneratorType)):
+            metrics.command_waiting(self)
+            if isinstance(result, Deferred):
+                result.addErrback(_failed, self)
+        return result
 
-# from evennia import default_cmds
+    _func._metrics_tracked = True
+    return _func
+
+
+def _failed(failure, cmd):
+    metrics.command_failed(cmd)
+    return failure
 
 
 class Command(BaseCommand):
@@ -29,9 +66,40 @@ class Command(BaseCommand):
         - at_post_cmd(): Extra actions, often things done after
             every command, like prompts.
 
+    The gridpunx base command records the wall time, database query
+    count and messages sent of every invocation in `world.metrics`,
+    and runs a sample of them under the profiler (see @cmdstats). Commands
+    overriding at_pre_cmd() or at_post_cmd() must call super(). The
+    func() of every subclass is wrapped to notice failures, which the
+    command handler reports to no hook; only the synchronous part of a
+    command is ever profiled.
+
+    func() may return a Deferred, for example from `world.offload.run()`
+    for blocking work; the command handler waits for it before calling
+    at_post_cmd(), without holding up other commands.
+
     """
 
-    pass
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        func = cls.__dict__.get("func")
+        if func is not None and not getattr(func, "_metrics_tracked", False):
+            cls.func = _tracked(func)
+
+    def at_pre_cmd(self):
+        """
+        This hook is called before self.parse() on all commands.
+        """
+        metrics.command_started(self)
+        return super().at_pre_cmd()
+
+    def at_post_cmd(self):
+        """
+        This hook is called after the command has finished executing
+        (after self.func()).
+        """
+        super().at_post_cmd()
+        metrics.command_finished(self)
 
 
 # -------------------------------------------------------------
@@ -40,149 +108,199 @@ class Command(BaseCommand):
 #
 #   evennia.commands.default.muxcommand.MuxCommand.
 #
-# If you want to make sweeping changes to default commands you can
-# uncomment this copy of the MuxCommand parent and add
+# gridpunx sets
 #
 #   COMMAND_DEFAULT_CLASS = "commands.command.MuxCommand"
 #
-# to your settings file. Be warned that the default commands expect
-# the functionality implemented in the parse() method, so be
-# careful with what you change.
+# in the settings file, so every default command (and the modified
+# commands in `commands/modified.py`) runs through the MuxCommand
+# below, and thus through the timing hooks of `Command` above. Be
+# warned that the default commands expect the functionality
+# implemented in Evennia's MuxCommand.parse(), so be careful with
+# what you change.
 #
 # -------------------------------------------------------------
 
-# from evennia.utils import utils
-#
-#
-# class MuxCommand(Command):
-#     """
-#     This sets up the basis for a MUX command. The idea
-#     is that most other Mux-related commands should just
-#     inherit from this and don't have to implement much
-#     parsing of their own unless they do something particularly
-#     advanced.
-#
-#     Note that the class's __doc__ string (this text) is
-#     used by Evennia to create the automatic help entry for
-#     the command, so make sure to document consistently here.
-#     """
-#     def has_perm(self, srcobj):
-#         """
-#         This is called by the cmdhandler to determine
-#         if srcobj is allowed to execute this command.
-#         We just show it here for completeness - we
-#         are satisfied using the default check in Command.
-#         """
-#         return super().has_perm(srcobj)
-#
-#     def at_pre_cmd(self):
-#         """
-#         This hook is called before self.parse() on all commands
-#         """
-#         pass
-#
-#     def at_post_cmd(self):
-#         """
-#         This hook is called after the command has finished executing
-#         (after self.func()).
-#         """
-#         pass
-#
-#     def parse(self):
-#         """
-#         This method is called by the cmdhandler once the command name
-#         has been identified. It creates a new set of member variables
-#         that can be later accessed from self.func() (see below)
-#
-#         The following variables are available for our use when entering this
-#         method (from the command definition, and assigned on the fly by the
-#         cmdhandler):
-#            self.key - the name of this command ('look')
-#            self.aliases - the aliases of this cmd ('l')
-#            self.permissions - permission string for this command
-#            self.help_category - overall category of command
-#
-#            self.caller - the object calling this command
-#            self.cmdstring - the actual command name used to call this
-#                             (this allows you to know which alias was used,
-#                              for example)
-#            self.args - the raw input; everything following self.cmdstring.
-#            self.cmdset - the cmdset from which this command was picked. Not
-#                          often used (useful for commands like 'help' or to
-#                          list all available commands etc)
-#            self.obj - the object on which this command was defined. It is often
-#                          the same as self.caller.
-#
-#         A MUX command has the following possible syntax:
-#
-#           name[ with several words][/switch[/switch..]] arg1[,arg2,...] [[=|,] arg[,..]]
-#
-#         The 'name[ with several words]' part is already dealt with by the
-#         cmdhandler at this point, and stored in self.cmdname (we don't use
-#         it here). The rest of the command is stored in self.args, which can
-#         start with the switch indicator /.
-#
-#         This parser breaks self.args into its constituents and stores them in the
-#         following variables:
-#           self.switches = [list of /switches (without the /)]
-#           self.raw = This is the raw argument input, including switches
-#           self.args = This is re-defined to be everything *except* the switches
-#           self.lhs = Everything to the left of = (lhs:'left-hand side'). If
-#                      no = is found, this is identical to self.args.
-#           self.rhs: Everything to the right of = (rhs:'right-hand side').
-#                     If no '=' is found, this is None.
-#           self.lhslist - [self.lhs split into a list by comma]
-#           self.rhslist - [list of self.rhs split into a list by comma]
-#           self.arglist = [list of space-separated args (stripped, including '=' if it exists)]
-#
-#           All args and list members are stripped of excess whitespace around the
-#           strings, but case is preserved.
-#         """
-#         raw = self.args
-#         args = raw.strip()
-#
-#         # split out switches
-#         switches = []
-#         if args and len(args) > 1 and args[0] == "/":
-#             # we have a switch, or a set of switches. These end with a space.
-#             switches = args[1:].split(None, 1)
-#             if len(switches) > 1:
-#                 switches, args = switches
-#                 switches = switches.split('/')
-#             else:
-#                 args = ""
-#                 switches = switches[0].split('/')
-#         arglist = [arg.strip() for arg in args.split()]
-#
-#         # check for arg1, arg2, ... = argA, argB, ... constructs
-#         lhs, rhs = args, None
-#         lhslist, rhslist = [arg.strip() for arg in args.split(',')], []
-#         if args and '=' in args:
-#             lhs, rhs = [arg.strip() for arg in args.split('=', 1)]
-#             lhslist = [arg.strip() for arg in lhs.split(',')]
-#             rhslist = [arg.strip() for arg in rhs.split(',')]
-#
-#         # save to object properties:
-#         self.raw = raw
-#         self.switches = switches
-#         self.args = args.strip()
-#         self.arglist = arglist
-#         self.lhs = lhs
-#         self.lhslist = lhslist
-#         self.rhs = rhs
-#         self.rhslist = rhslist
-#
-#         # if the class has the account_caller property set on itself, we make
-#         # sure that self.caller is always the account if possible. We also create
-#         # a special property "character" for the puppeted object, if any. This
-#         # is convenient for commands defined on the Account only.
-#         if hasattr(self, "account_caller") and self.account_caller:
-#             if utils.inherits_from(self.caller, "evennia.objects.objects.DefaultObject"):
-#                 # caller is an Object/Character
-#                 self.character = self.caller
-#                 self.caller = self.caller.account
-#             elif utils.inherits_from(self.caller, "evennia.accounts.accounts.DefaultAccount"):
-#                 # caller was already an Account
-#                 self.character = self.caller.get_puppet(self.session)
-#             else:
-#                 self.character = None
+# Compiled parsers, by (rhs_split, switch_options). Each command class
+# also remembers its own in `_compiled_parser`.
+_PARSERS = {}
+
+# Fields computed on first access, see _LazyField.
+_LAZY_FIELDS = ("arglist", "lhs", "rhs", "lhslist", "rhslist")
+
+
+def _parser(cmdclass, rhs_split, switch_options):
+    """
+    Returns the compiled `(delimiters, switch_options)` of a command
+    class: the non-empty `rhs_split` delimiters in priority order and
+    the lower-cased switch options. Compiled parsers are shared by all
+    classes with the same options.
+    """
+    cachekey = (
+        rhs_split if isinstance(rhs_split, str) else tuple(rhs_split or ()),
+        tuple(switch_options) if switch_options else None,
+    )
+    parser = _PARSERS.get(cachekey)
+    if parser is None:
+        # Like Evennia, a plain string is iterated (a set of
+        # one-character delimiters).
+        delimiters = tuple(delim for delim in (rhs_split or ()) if delim)
+        options = [opt.lower() for opt in switch_options] if switch_options else None
+        parser = _PARSERS[cachekey] = (delimiters, options)
+    cmdclass._compiled_parser = (rhs_split, switch_options, parser)
+    return parser
+
+
+class _LazyField:
+    """
+    A field of the parsed arguments, computed on first access. The
+    values are then stored on the instance, which shadows this
+    descriptor, so later reads (and assignments by commands) are plain
+    attribute access.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        instance._split_args()
+        return instance.__dict__[self.name]
+
+
+class MuxCommand(Command, BaseMuxCommand):
+    """
+    This sets up the basis for a MUX command. The idea
+    is that most other Mux-related commands should just
+    inherit from this and don't have to implement much
+    parsing of their own unless they do something particularly
+    advanced.
+
+    gridpunx parses the same way as Evennia's MuxCommand (setting
+    `raw`, `switches`, `args`, `arglist`, `lhs`, `rhs`, `lhslist` and
+    `rhslist`), but the `rhs_split` delimiters and switch options are
+    prepared once per command class, and everything but the switches
+    is only computed when first accessed.
+
+    Note that the class's __doc__ string (this text) is
+    used by Evennia to create the automatic help entry for
+    the command, so make sure to document consistently here.
+    """
+
+    # Evennia's defaults for these
+    switch_options = None
+    rhs_split = "="
+    account_caller = False
+
+    arglist = _LazyField("arglist")
+    lhs = _LazyField("lhs")
+    rhs = _LazyField("rhs")
+    lhslist = _LazyField("lhslist")
+    rhslist = _LazyField("rhslist")
+
+    def parse(self):
+        """
+        Parse the switches right away (unknown or ambiguous switches are
+        reported to the caller) and leave the rest for first access.
+        """
+        raw = self.args
+        args = raw.strip()
+        rhs_split, switch_options = self.rhs_split, self.switch_options
+        cached = type(self).__dict__.get("_compiled_parser")
+        if cached is not None and cached[0] is rhs_split and cached[1] is switch_options:
+            delimiters, switch_options = cached[2]
+        else:
+            delimiters, switch_options = _parser(type(self), rhs_split, switch_options)
+
+        switches = []
+        if args and len(args) > 1 and raw[0] == "/":
+            # we have a switch, or a set of switches. These end with a space.
+            switches = args[1:].split(None, 1)
+            if len(switches) > 1:
+                switches, args = switches
+                switches = switches.split("/")
+            else:
+                args = ""
+                switches = switches[0].split("/")
+            if switches and switch_options:
+                switches = self._check_switches(switches, switch_options)
+
+        # Forget fields of an earlier call on this instance.
+        instdict = self.__dict__
+        for name in _LAZY_FIELDS:
+            instdict.pop(name, None)
+        self._split_delimiters = delimiters
+        self._split_source = args
+
+        # save to object properties:
+        self.raw = raw
+        self.switches = switches
+        self.args = args.strip()
+
+        # if the class has the account_caller property set on itself, we make
+        # sure that self.caller is always the account if possible. We also create
+        # a special property "character" for the puppeted object, if any. This
+        # is convenient for commands defined on the Account only.
+        if self.account_caller:
+            if utils.inherits_from(self.caller, "evennia.objects.objects.DefaultObject"):
+                # caller is an Object/Character
+                self.character = self.caller
+                self.caller = self.caller.account
+            elif utils.inherits_from(self.caller, "evennia.accounts.accounts.DefaultAccount"):
+                # caller was already an Account
+                self.character = self.caller.get_puppet(self.session)
+            else:
+                self.character = None
+
+    def _check_switches(self, switches, switch_options):
+        """
+        Match switches against the command's switch options, allowing
+        unique abbreviations. Returns the valid switches.
+        """
+        valid_switches, unused_switches, extra_switches = [], [], []
+        for element in switches:
+            option_check = [opt for opt in switch_options if opt == element]
+            if not option_check:
+                option_check = [opt for opt in switch_options if opt.startswith(element)]
+            match_count = len(option_check)
+            if match_count > 1:
+                extra_switches.extend(option_check)  # Either the option provided is ambiguous,
+            elif match_count == 1:
+                valid_switches.extend(option_check)  # or it is a valid option abbreviation,
+            elif match_count == 0:
+                unused_switches.append(element)  # or an extraneous option to be ignored.
+        if extra_switches:
+            self.msg(
+                "|g%s|n: |wAmbiguous switch supplied: Did you mean /|C%s|w?"
+                % (self.cmdstring, " |nor /|C".join(extra_switches))
+            )
+        if unused_switches:
+            plural = "" if len(unused_switches) == 1 else "es"
+            self.msg(
+                '|g%s|n: |wExtra switch%s "/|C%s|w" ignored.'
+                % (self.cmdstring, plural, "|n, /|C".join(unused_switches))
+            )
+        return valid_switches
+
+    def _split_args(self):
+        """
+        Compute the lazy fields from the arguments saved by parse().
+        Fields the command already assigned itself are left alone.
+        """
+        instdict = self.__dict__
+        args = instdict.get("_split_source", "")
+        lhs, rhs = args.strip(), None
+        if lhs:
+            # the first delimiter (in priority order) found wins
+            for delim in instdict.get("_split_delimiters", ()):
+                if delim in lhs:
+                    lhs, _, rhs = lhs.partition(delim)
+                    lhs, rhs = lhs.strip(), rhs.strip()
+                    break
+        instdict.setdefault("arglist", [arg.strip() for arg in args.split()])
+        instdict.setdefault("lhs", lhs)
+        instdict.setdefault("rhs", rhs)
+        # Further split left/right sides by comma delimiter
+        instdict.setdefault("lhslist", [arg.strip() for arg in lhs.split(",")])
+        instdict.setdefault("rhslist", [arg.strip() for arg in rhs.split(",")] if rhs is not None else "")
@@ -0,0 +1,56 @@
+"""
+Communication Commands
+
+Commands for gridpunx channel features.
+
+"""
+
+import time
+
+from evennia.comms.models import ChannelDB
+
+from commands.command import MuxCommand
+
+
+class CmdChannelHistory(MuxCommand):
+    """
+    replay recent channel messages
+
+    Usage:
+      @chanhistory <channel> [= <number of messages>]
+
+    Shows the last messages sent to a channel (20 by default), as
+    long as the channel still remembers them.
+    """
+
+    key = "@chanhistory"
+    aliases = ["@chanhist"]
+    locks = "cmd:not pperm(channel_banned)"
+    help_category = "Comms"
+
+    def func(self):
+        """Implement @chanhistory"""
+
+        caller = self.caller
+        if not self.lhs:
+            caller.msg("Usage: @chanhistory <channel> [= <number of messages>]")
+            return
+        channel = ChannelDB.objects.get_channel(self.lhs)
+        if not channel or not channel.access(caller, "listen"):
+            caller.msg("No channel '%s' found." % self.lhs)
+            return
+        try:
+            num = int(self.rhs) if self.rhs else 20
+        except ValueError:
+            caller.msg("The number of messages must be a number.")
+            return
+        messages = channel.recent_messages(max(1, num))
+        if not messages:
+            caller.msg("Nothing has been said on %s lately." % channel.key)
+            return
+        caller.msg(
+            "\n".join(
+                "%s %s" % (time.strftime("%H:%M", time.localtime(stamp)), message)
+                for stamp, message in messages
+            )
+        )
@@ -17,6 +17,11 @@ own cmdsets by inheriting from them or directly from `evennia.CmdSet`.
 from evennia import default_cmds
 from commands.modified import CmdGive as CustomCmdGive
 from commands.modified import CmdGet as CustomCmdGet
+from commands.modified import CmdInventory as CustomCmdInventory
+from commands.modified import CmdUnconnectedLook as CustomCmdUnconnectedLook
+from commands.building import CmdDistrict
+from commands.comms import CmdChannelHistory
+from commands.admin import CmdCommandStats
 
 class CharacterCmdSet(default_cmds.CharacterCmdSet):
     """
@@ -44,6 +49,13 @@ class CharacterCmdSet(default_cmds.CharacterCmdSet):
         # which allows targeting a container.
         self.add(CustomCmdGet())
 
+        # Override the default 'inventory' command to show stacks
+        # with their quantity.
+        self.add(CustomCmdInventory())
+
+        # Builder tools for gridpunx world files.
+        self.add(CmdDistrict())
+
 
 class AccountCmdSet(default_cmds.AccountCmdSet):
     """
@@ -64,6 +76,12 @@ class AccountCmdSet(default_cmds.AccountCmdSet):
         # any commands you add below will overload the default ones.
         #
 
+        # Replay recent channel messages from memory.
+        self.add(CmdChannelHistory())
+
+        # Command timing statistics and profiles.
+        self.add(CmdCommandStats())
+
 
 class UnloggedinCmdSet(default_cmds.UnloggedinCmdSet):
     """
@@ -82,6 +100,10 @@ class UnloggedinCmdSet(default_cmds.UnloggedinCmdSet):
         # any commands you add below will overload the default ones.
         #
 
+        # Override the default unlogged-in 'look' command to send the
+        # cached, pre-rendered connection screen.
+        self.add(CustomCmdUnconnectedLook())
+
 
 class SessionCmdSet(default_cmds.SessionCmdSet):
     """
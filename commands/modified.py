@@ -27,6 +27,54 @@ from evennia.utils import utils
 # Also used by default commands.
 COMMAND_DEFAULT_CLASS = utils.class_from_module(settings.COMMAND_DEFAULT_CLASS)
 
+# Used by the unlogged-in look command.
+from evennia.commands.cmdhandler import CMD_LOGINSTART
+from server.conf.connection_screens import connection_screen_for
+
+
+# ==============================================================
+# ==
+# == Stack helpers - 'get' and 'give' take an optional amount
+# == ('get 20 bullets'), splitting stacks (see RealItem).
+# ==
+# ==============================================================
+
+def _parse_amount(caller, text, location):
+    """
+    Split '<amount> <name>' into (amount, name). The amount is None
+    if the text does not start with one, or if nothing in `location`
+    matches the rest of it ('2077 terminal' is then a name).
+    """
+    amount, _, name = text.partition(" ")
+    if amount.isdigit() and name.strip():
+        name = name.strip()
+        if caller.search(name, location=location, quiet=True):
+            return int(amount), name
+    return None, text
+
+
+def _stack_name(obj, looker):
+    "The name of an object, with the quantity for stacks."
+    if hasattr(obj, "get_stack_name"):
+        return obj.get_stack_name(looker)
+    return obj.name
+
+
+def _take_amount(caller, obj, amount):
+    """
+    Returns what to move: `obj` itself or `amount` items split off its
+    stack. Returns None (after telling the caller) if there are not
+    that many.
+    """
+    quantity = getattr(obj, "quantity", 1)
+    if amount is None or amount == quantity:
+        return obj
+    if amount < 1 or amount > quantity:
+        caller.msg("There %s only %i of %s." % ("is" if quantity == 1 else "are", quantity, obj.key))
+        return None
+    return obj.split_stack(amount)
+
+
 
 # ==============================================================
 # ==
@@ -42,9 +90,9 @@ class CmdGive(COMMAND_DEFAULT_CLASS):
     """
     give away something to someone
     Usage:
-      give <inventory obj> <-to||=> <target>
+      give [<amount>] <inventory obj> <-to||=> <target>
     Gives an item from your inventory to another character, NPC,
-    or container.
+    or container. Give an amount to hand over only part of a stack.
     """
     
     
@@ -58,14 +106,18 @@ class CmdGive(COMMAND_DEFAULT_CLASS):
 
         caller = self.caller
         if not self.args or not self.rhs:
-            caller.msg("Usage: give <inventory object> -to <target>")
+            caller.msg("Usage: give [<amount>] <inventory object> -to <target>")
             return
+        # MODIFICATION (start)
+        # Allow giving part of a stack.
+        amount, name = _parse_amount(caller, self.lhs, caller)
         to_give = caller.search(
-            self.lhs,
+            name,
             location=caller,
-            nofound_string="You aren't carrying %s." % self.lhs,
-            multimatch_string="You carry more than one %s:" % self.lhs,
+            nofound_string="You aren't carrying %s." % name,
+            multimatch_string="You carry more than one %s:" % name,
         )
+        # MODIFICATION (end)
         target = caller.search(self.rhs)
         if not (to_give and target):
             return
@@ -87,15 +139,25 @@ class CmdGive(COMMAND_DEFAULT_CLASS):
         if not to_give.at_before_give(caller, target):
             return
 
+        # MODIFICATION (start)
+        # Split off the amount given, and merge it into the receiver's
+        # stack afterwards (or back into ours if it fails).
+        to_give = _take_amount(caller, to_give, amount)
+        if not to_give:
+            return
+
         # give object
         success = to_give.move_to(target, quiet=True)
         if not success:
             caller.msg("This could not be given.")
         else:
-            caller.msg("You give %s to %s." % (to_give.key, target.key))
-            target.msg("%s gives you %s." % (caller.key, to_give.key))
+            caller.msg("You give %s to %s." % (_stack_name(to_give, caller), target.key))
+            target.msg("%s gives you %s." % (caller.key, _stack_name(to_give, target)))
             # Call the object script's at_give() method.
             to_give.at_give(caller, target)
+        if hasattr(to_give, "merge_stack"):
+            to_give.merge_stack()
+        # MODIFICATION (end)
 
 
 # ==============================================================
@@ -113,12 +175,12 @@ class CmdGet(COMMAND_DEFAULT_CLASS):
     pick up something
 
     Usage:
-      get <object> [=||-from <container>]
+      get [<amount>] <object> [=||-from <container>]
 
     Picks up an object and puts it in your inventory. Specify
     '-from <container>' or '= <container>' to get an item from a
     container. If no container is specified, the target defaults
-    to 'here'
+    to 'here'. Give an amount to take only part of a stack.
     """
     
     key = "get"
@@ -140,7 +202,7 @@ class CmdGet(COMMAND_DEFAULT_CLASS):
         # MODIFICATION (start)
         # Show simple help if there are no args
         if not self.args:
-            caller.msg("Usage: get <object> [= <target>]")
+            caller.msg("Usage: get [<amount>] <object> [= <target>]")
             return
 
         if not self.rhs:
@@ -156,11 +218,12 @@ class CmdGet(COMMAND_DEFAULT_CLASS):
             caller.msg("You can only get objects from containers and the ground.")
             return
 
+        amount, name = _parse_amount(caller, self.lhs, target)
         obj = caller.search(
-            self.lhs,
+            name,
             location=target,
-            nofound_string="There's no %s in here." % self.lhs,
-            multimatch_string="There's more than one %s:" % self.lhs,
+            nofound_string="There's no %s in here." % name,
+            multimatch_string="There's more than one %s:" % name,
         )
         # MODIFICATION (end)
 
@@ -186,14 +249,120 @@ class CmdGet(COMMAND_DEFAULT_CLASS):
         # calling at_before_get hook method
         if not obj.at_before_get(caller):
             return
-        
+
+        # MODIFICATION (start)
+        # Split off the amount taken, and merge it into the caller's
+        # stack afterwards (or back into the source if it fails).
+        obj = _take_amount(caller, obj, amount)
+        if not obj:
+            return
+
         success = obj.move_to(caller, quiet=True)
         if not success:
             caller.msg("This can't be picked up.")
         else:
-            caller.msg("You pick up %s." % obj.name)
+            caller.msg("You pick up %s." % _stack_name(obj, caller))
             caller.location.msg_contents(
-                "%s picks up %s." % (caller.name, obj.name), exclude=caller
+                "%s picks up %s." % (caller.name, _stack_name(obj, caller)), exclude=caller
             )
             # calling at_get hook method
             obj.at_get(caller)
+        if hasattr(obj, "merge_stack"):
+            obj.merge_stack()
+        # MODIFICATION (end)
+
+
+# ==============================================================
+# ==
+# == CmdInventory - The 'inventory' command. Modified for gridpunx
+# == to show stacks with their quantity.
+# ==
+# == From Evennia source file:
+# == evennia/evennia/commands/default/general.py
+# ==
+# ==============================================================
+
+class CmdInventory(COMMAND_DEFAULT_CLASS):
+    """
+    view inventory
+
+    Usage:
+      inventory
+      inv
+
+    Shows your inventory.
+    """
+
+    key = "inventory"
+    aliases = ["inv", "i"]
+    locks = "cmd:all()"
+    arg_regex = r"$"
+
+    def func(self):
+        """check inventory"""
+        items = self.caller.contents
+        if not items:
+            string = "You are not carrying anything."
+        else:
+            from evennia.utils.ansi import raw as raw_ansi
+
+            table = self.styled_table(border="header")
+            for item in items:
+                table.add_row(
+                    # MODIFICATION (start)
+                    # Stacks show their quantity ('twenty bullets').
+                    "|C%s|n" % _stack_name(item, self.caller),
+                    # MODIFICATION (end)
+                    "{}|n".format(utils.crop(raw_ansi(item.db.desc or ""), width=50) or ""),
+                )
+            string = "|wYou are carrying:\n%s" % table
+        self.caller.msg(string)
+
+
+# ==============================================================
+# ==
+# == CmdUnconnectedLook - The unlogged-in 'look' command. Modified
+# == for gridpunx to send the cached, pre-rendered connection
+# == screen instead of re-reading the connection screen module
+# == for every connecting session.
+# ==
+# == From Evennia source file:
+# == evennia/evennia/commands/default/unloggedin.py
+# ==
+# ==============================================================
+
+class CmdUnconnectedLook(COMMAND_DEFAULT_CLASS):
+    """
+    look when in unlogged-in state
+
+    Usage:
+      look
+
+    This is an unconnected version of the look command for simplicity.
+
+    This is called by the server and kicks everything in gear.
+    All it does is display the connect screen.
+    """
+
+    key = CMD_LOGINSTART
+    aliases = ["look", "l"]
+    locks = "cmd:all()"
+
+    def func(self):
+        """Show the connect screen."""
+
+        # MODIFICATION (start)
+        # The caller is the Session. Send it the cached render.
+        connection_screen_for(self.caller)
+        # MODIFICATION (end)
+
+        # Unused original code:
+        #
+        # callables = utils.callables_from_module(CONNECTION_SCREEN_MODULE)
+        # if "connection_screen" in callables:
+        #     connection_screen = callables["connection_screen"]()
+        # else:
+        #     connection_screen = utils.random_string_from_module(CONNECTION_SCREEN_MODULE)
+        #     if not connection_screen:
+        #         connection_screen = "No connection screen found. Please contact an admin."
+        # self.caller.msg(connection_screen)
@@ -0,0 +1,194 @@
+"""
+Command tests
+
+Parity of the gridpunx MuxCommand parser with Evennia's: every command
+in the default command sets (and on talking NPCs) is parsed both ways
+for a set of inputs, and all parsed fields and switch messages must
+match. Also checks which world files @district accepts, and how get
+tells an amount from a name starting with a number.
+
+Run with
+
+    evennia test --settings settings.py commands
+
+"""
+
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from evennia.commands.default.muxcommand import MuxCommand as EvenniaMuxCommand
+from evennia.commands.default.tests import CommandTest
+from evennia.utils import create
+from evennia.utils.test_resources import EvenniaTest
+
+from commands import default_cmdsets
+from commands.building import CmdDistrict
+from commands.command import MuxCommand
+from commands.modified import CmdGet
+from typeclasses.objects import RealItem
+from typeclasses.npc import TalkingCmdSet
+
+FIELDS = ("raw", "switches", "args", "arglist", "lhs", "rhs", "lhslist", "rhslist")
+
+INPUTS = (
+    "",
+    " ",
+    "/",
+    "foo",
+    "  spaced   out  ",
+    "foo bar baz",
+    "a = b",
+    "a=b=c",
+    "a,b = c, d",
+    " a , b =",
+    "=b",
+    "a;b",
+    "a:b",
+    "5 bullets to guard",
+    "box/2 = new name",
+    "/a",
+    "/l",
+    "/x foo",
+    "/sw1/sw2 a = b",
+    "/del/quiet box",
+    "/ALL",
+    "/dump stats.txt",
+    "/test foo = bar",
+    "/ foo",
+    "/switch",
+)
+
+
+def _command_classes():
+    "The classes of every command in the gridpunx command sets, once each."
+    cmdsets = (
+        default_cmdsets.CharacterCmdSet,
+        default_cmdsets.AccountCmdSet,
+        default_cmdsets.UnloggedinCmdSet,
+        default_cmdsets.SessionCmdSet,
+        TalkingCmdSet,
+    )
+    classes = {}
+    for cmdsetclass in cmdsets:
+        cmdset = cmdsetclass()
+        cmdset.at_cmdset_creation()
+        for cmd in cmdset.commands:
+            if isinstance(cmd, MuxCommand):
+                classes[type(cmd).__module__ + "." + type(cmd).__name__] = type(cmd)
+    return sorted(classes.items())
+
+
+class TestMuxCommandParity(EvenniaTest):
+    "The gridpunx parser against Evennia's MuxCommand.parse."
+
+    def _parse(self, cmdclass, parse, raw):
+        cmd = cmdclass()
+        cmd.caller = self.char1
+        cmd.session = self.session
+        cmd.account = self.account
+        cmd.cmdstring = cmd.key
+        cmd.args = raw
+        messages = []
+        cmd.msg = lambda text=None, **kwargs: messages.append(text)
+        parse(cmd)
+        fields = {name: getattr(cmd, name) for name in FIELDS}
+        fields["caller"] = cmd.caller
+        fields["character"] = getattr(cmd, "character", None)
+        return fields, messages
+
+    def test_parity(self):
+        classes = _command_classes()
+        self.assertTrue(classes)
+        for path, cmdclass in classes:
+            for raw in INPUTS:
+                with self.subTest(command=path, raw=raw):
+                    expected = self._parse(cmdclass, EvenniaMuxCommand.parse, raw)
+                    parsed = self._parse(cmdclass, MuxCommand.parse, raw)
+                    self.assertEqual(parsed, expected)
+
+    def test_rhs_split_options(self):
+        "Delimiter lists, in priority order, and plain strings."
+        for rhs_split in ("=", ("=", " to "), [" to ", "="], ":", "=:"):
+            cmdclass = type("CmdSplit", (MuxCommand,), {"key": "split", "rhs_split": rhs_split})
+            for raw in INPUTS:
+                with self.subTest(rhs_split=rhs_split, raw=raw):
+                    expected = self._parse(cmdclass, EvenniaMuxCommand.parse, raw)
+                    parsed = self._parse(cmdclass, MuxCommand.parse, raw)
+                    self.assertEqual(parsed, expected)
+
+    def test_switch_messages(self):
+        "Ambiguous and unknown switches are reported the same way."
+        cmdclass = type(
+            "CmdSwitches", (MuxCommand,), {"key": "switches", "switch_options": ("list", "lock", "Dump")}
+        )
+        for raw in ("/l foo", "/x foo", "/li/x/y foo", "/dump", "/DUMP", "/lo/li"):
+            with self.subTest(raw=raw):
+                expected = self._parse(cmdclass, EvenniaMuxCommand.parse, raw)
+                parsed = self._parse(cmdclass, MuxCommand.parse, raw)
+                self.assertEqual(parsed, expected)
+
+    def test_assigned_fields_are_kept(self):
+        "A field a command assigns is not overwritten when another is computed."
+        cmd = MuxCommand()
+        cmd.caller = self.char1
+        cmd.session = self.session
+        cmd.cmdstring = "test"
+        cmd.args = " a, b = c, d"
+        cmd.parse()
+        cmd.rhs = "e"
+        self.assertEqual(cmd.lhslist, ["a", "b"])
+        self.assertEqual(cmd.rhs, "e")
+        self.assertEqual(cmd.rhslist, ["c", "d"])
+
+    def test_reparse_forgets_fields(self):
+        "Parsing again on the same instance recomputes the fields."
+        cmd = MuxCommand()
+        cmd.caller = self.char1
+        cmd.session = self.session
+        cmd.cmdstring = "test"
+        cmd.args = "a = b"
+        cmd.parse()
+        self.assertEqual(cmd.rhs, "b")
+        cmd.args = "c"
+        cmd.parse()
+        self.assertEqual((cmd.lhs, cmd.rhs), ("c", None))
+
+
+class TestDistrictWorldPath(EvenniaTest):
+    "@district only reads world files inside the world directory."
+
+    def setUp(self):
+        super().setUp()
+        self.world_dir = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.world_dir)
+        self.settings = override_settings(GRIDPUNX_WORLD_DIR=self.world_dir)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_inside(self):
+        path = CmdDistrict()._world_path("districts/docks.json")
+        self.assertEqual(path, os.path.join(self.world_dir, "districts", "docks.json"))
+
+    def test_outside(self):
+        cmd = CmdDistrict()
+        for name in ("/etc/passwd", "../settings.py", "districts/../../x.json", "..\\x.json"):
+            with self.subTest(name=name):
+                self.assertIsNone(cmd._world_path(name))
+
+    def test_symlink_out(self):
+        os.symlink(tempfile.gettempdir(), os.path.join(self.world_dir, "out"))
+        self.assertIsNone(CmdDistrict()._world_path("out/x.json"))
+
+
+class TestGetAmount(CommandTest):
+    "A leading number is an amount only if the rest names something."
+
+    def test_name_with_number(self):
+        create.create_object(RealItem, key="2077 terminal", location=self.room1)
+        self.call(CmdGet(), "2077 terminal", "You pick up 2077 terminal")
+
+    def test_amount(self):
+        create.create_object(RealItem, key="terminal", location=self.room1)
+        self.call(CmdGet(), "2 terminal", "There is only 1 of terminal.")
@@ -12,8 +12,28 @@ will be called without arguments. Note that tracebacks in this module
 will be QUIETLY ignored, so make sure to check it well to make sure it
 does what you expect it to.
 
+gridpunx builds the world from the world file given by
+`settings.GRIDPUNX_WORLD_FILE` here, if there is one (see
+`world/builder.py` for the file format).
+
 """
 
+import os
+
+from django.conf import settings
+
+from world import builder
+
 
 def at_initial_setup():
-    pass
+    world_file = settings.GRIDPUNX_WORLD_FILE
+    if not world_file:
+        return
+    if not os.path.isfile(world_file):
+        print("World file %s not found; starting with an empty world." % world_file)
+        return
+    # Tracebacks are quietly ignored here, so report failures ourselves.
+    try:
+        builder.build_world(builder.load_world(world_file), report=print)
+    except Exception as err:
+        print("Could not build the world from %s: %s" % (world_file, err))
@@ -16,13 +16,70 @@ at_server_cold_stop()
 
 """
 
+from django.conf import settings
+from twisted.internet.task import LoopingCall
+
+from evennia.server.sessionhandler import SESSION_HANDLER
+
+from server.conf import connection_screens
+from typeclasses import npc
+from world import (
+    behaviors,
+    channelhistory,
+    climate,
+    counters,
+    derived,
+    events,
+    grid,
+    hotstate,
+    metrics,
+    pathfinding,
+    warmup,
+    worldstate,
+    zones,
+)
+
+# In-memory state carried over reloads (see world/hotstate.py).
+hotstate.register("metrics", metrics.dump_state, metrics.load_state)
+hotstate.register("conversations", npc.save_conversations, npc.restore_conversations)
+hotstate.register("channel_history", channelhistory.dump_state, channelhistory.load_state)
+hotstate.register("caches", warmup.dump_caches, warmup.load_caches)
+
+# Periodically re-renders the cached connection screen.
+_CONNECTION_SCREEN_LOOP = LoopingCall(connection_screens.refresh)
+
 
 def at_server_start():
     """
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    # Count database queries issued by the game (reactor) thread.
+    metrics.install_query_counter()
+    metrics.set_profile_rate(settings.GRIDPUNX_COMMAND_PROFILE_RATE)
+    # Keep the ndb caches derived from Attributes current.
+    derived.start()
+    # Prime the caches for the hot part of the world.
+    warmup.warm_up_world()
+    # Build the in-memory exit graph used for pathfinding.
+    pathfinding.start()
+    # Load the zone registry.
+    zones.start()
+    # Run the climate of the rooms outside, per active zone.
+    climate.start()
+    # Index the devices connected to The Grid.
+    grid.start()
+    # Start running the ambient behavior of NPCs.
+    behaviors.start()
+    # Start the batched channel log writer.
+    channelhistory.start()
+    # Start refreshing the world state snapshot for the JSON API.
+    worldstate.start()
+    # Seed the world counters and publish them for the MSSP table.
+    counters.start()
+    # Keep the cached connection screen fresh.
+    if not _CONNECTION_SCREEN_LOOP.running:
+        _CONNECTION_SCREEN_LOOP.start(settings.GRIDPUNX_CONNECTION_SCREEN_INTERVAL, now=True)
 
 
 def at_server_stop():
@@ -30,21 +87,36 @@ def at_server_stop():
     This is called just before the server is shut down, regardless
     of it is for a reload, reset or shutdown.
     """
-    pass
+    worldstate.stop()
+    counters.stop()
+    climate.stop()
+    zones.stop()
+    behaviors.stop()
+    channelhistory.stop()
+    # Hand batched event subscribers what is still pending.
+    events.stop()
+    if _CONNECTION_SCREEN_LOOP.running:
+        _CONNECTION_SCREEN_LOOP.stop()
 
 
 def at_server_reload_start():
     """
     This is called only when server starts back up after a reload.
     """
-    pass
+    # Sessions are re-attached to their puppets by now; prime the
+    # online characters and the rooms they are in.
+    warmup.warm_up_online()
+    # Mark the zones of online characters as active.
+    zones.seed_activity(sess.puppet for sess in SESSION_HANDLER.get_sessions() if sess.puppet)
+    # Bring back the in-memory state saved before the reload.
+    hotstate.restore()
 
 
 def at_server_reload_stop():
     """
     This is called only time the server stops before a reload.
     """
-    pass
+    hotstate.save()
 
 
 def at_server_cold_start():
@@ -52,7 +124,8 @@ def at_server_cold_start():
     This is called only when the server starts "cold", i.e. after a
     shutdown or a reset.
     """
-    pass
+    # A snapshot left over from before a shutdown is never valid.
+    hotstate.discard()
 
 
 def at_server_cold_stop():
@@ -18,15 +18,26 @@ The commands available to the user when the connection screen is shown
 are defined in evennia.default_cmds.UnloggedinCmdSet. The parsing and display
 of the screen is done by the unlogged-in "look" command.
 
+gridpunx uses `connection_screen()`, backed by a cached render. The screen is
+re-rendered by `refresh()` every `settings.GRIDPUNX_CONNECTION_SCREEN_INTERVAL`
+seconds (started from `at_server_start`), together with a pre-ANSI-parsed
+variant for each client capability. The gridpunx unlogged-in look command
+(`commands.modified.CmdUnconnectedLook`) sends those variants using
+`connection_screen_for()`, so a reconnect storm of thousands of sockets costs
+a single render.
+
 """
 
 from django.conf import settings
 from evennia import utils
+from evennia.server.sessionhandler import SESSION_HANDLER
 
-CONNECTION_SCREEN = """
-|b==============================================================|n
- Welcome to |g{}|n, version {}!
+from world.rendering import msg_variant, render_variants
 
+CONNECTION_SCREEN_TEMPLATE = """
+|b==============================================================|n
+ Welcome to |g{servername}|n, version {version}!
+ {online}
  If you have an existing account, connect to it by typing:
       |wconnect <username> <password>|n
  If you need to create an account, type (without the <>'s):
@@ -34,6 +45,42 @@ CONNECTION_SCREEN = """
 
  If you have spaces in your username, enclose it in quotes.
  Enter |whelp|n for more info. |wlook|n will re-show this screen.
-|b==============================================================|n""".format(
-    settings.SERVERNAME, utils.get_evennia_version("short")
-)
+|b==============================================================|n"""
+
+# The current render: the markup string and its parsed variants.
+_CACHE = {"markup": None, "variants": None}
+
+
+def refresh():
+    """
+    Re-render the connection screen and its client variants.
+    """
+    online = SESSION_HANDLER.account_count()
+    markup = CONNECTION_SCREEN_TEMPLATE.format(
+        servername=settings.SERVERNAME,
+        version=utils.get_evennia_version("short"),
+        online="|y%i|n punk%s online right now.\n" % (online, "" if online == 1 else "s"),
+    )
+    if markup != _CACHE["markup"]:
+        # Swap both at once so readers never mix two renders.
+        _CACHE.update({"markup": markup, "variants": render_variants(markup)})
+
+
+def connection_screen():
+    """
+    Returns the cached connection screen markup. Called by Evennia's
+    default unlogged-in look command.
+    """
+    if _CACHE["markup"] is None:
+        refresh()
+    return _CACHE["markup"]
+
+
+def connection_screen_for(session):
+    """
+    Send the cached connection screen to `session`, pre-parsed for
+    its client capabilities where possible.
+    """
+    if _CACHE["markup"] is None:
+        refresh()
+    msg_variant(session, _CACHE["markup"], _CACHE["variants"])
@@ -3,8 +3,11 @@
 MSSP (Mud Server Status Protocol) meta information
 
 Modify this file to specify what MUD listing sites will report about your game.
-All fields are static. The number of currently active players and your game's
-current uptime will be added automatically by Evennia.
+The number of currently active players and your game's current uptime will be
+added automatically by Evennia. The world counts (rooms, exits, mobiles, objects
+and help files) are callables reading the counts the Server publishes from its
+in-memory registry in `world/counters.py`, so crawler requests are always
+answered from memory, however often they come.
 
 You don't have to fill in everything (and most fields are not shown/used by all
 crawlers anyway); leave the default if so needed. You need to reload the server
@@ -18,6 +21,8 @@ needed on the Evennia side.
 
 """
 
+from world.counters import published_count
+
 MSSPTable = {
     # Required fields
     "NAME": "Evennia",
@@ -48,10 +53,10 @@ MSSPTable = {
     "SUBGENRE": "None",
     # World
     "AREAS": "0",
-    "HELPFILES": "0",
-    "MOBILES": "0",
-    "OBJECTS": "0",
-    "ROOMS": "0",  # use 0 if room-less
+    "HELPFILES": published_count("helpfiles"),
+    "MOBILES": published_count("mobiles"),
+    "OBJECTS": published_count("objects"),
+    "ROOMS": published_count("rooms"),  # use 0 if room-less
     "CLASSES": "0",  # use 0 if class-less
     "LEVELS": "0",  # use 0 if level-less
     "RACES": "0",  # use 0 if race-less
@@ -81,7 +86,7 @@ MSSPTable = {
     # Extended variables
     # World
     "DBSIZE": "0",
-    "EXITS": "0",
+    "EXITS": published_count("exits"),
     "EXTRA DESCRIPTIONS": "0",
     "MUDPROGS": "0",
     "MUDTRIGS": "0",
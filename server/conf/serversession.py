@@ -13,16 +13,16 @@ necessary except for the most custom and exotic designs - and even
 then it might be enough to just add custom session-level commands to
 the SessionCmdSet instead.
 
-This module is not normally called. To tell Evennia to use the class
-in this module instead of the default one, add the following to your
-settings file:
-
-    SERVER_SESSION_CLASS = "server.conf.serversession.ServerSession"
+gridpunx uses the class in this module (see SERVER_SESSION_CLASS in
+the settings file) to keep the per-session bookkeeping of
+`world/metrics.py` tidy.
 
 """
 
 from evennia.server.serversession import ServerSession as BaseServerSession
 
+from world import metrics
+
 
 class ServerSession(BaseServerSession):
     """
@@ -34,4 +34,17 @@ class ServerSession(BaseServerSession):
     through their session(s).
     """
 
-    pass
+    def data_out(self, **kwargs):
+        """
+        Sending data from Evennia->Client. Counted for the per-command
+        message metrics.
+        """
+        metrics.message_sent()
+        super().data_out(**kwargs)
+
+    def at_disconnect(self, reason=None):
+        """
+        Hook called by sessionhandler when disconnecting this session.
+        """
+        super().at_disconnect(reason=reason)
+        metrics.session_disconnected(self)
@@ -24,6 +24,8 @@ put secret game- or server-specific settings in secret_settings.py.
 
 """
 
+import os
+
 # Use the defaults from Evennia unless explicitly overridden
 from evennia.settings_default import *
 
@@ -34,6 +36,123 @@ from evennia.settings_default import *
 # This is the name of your game. Make it catchy!
 SERVERNAME = "gridpunx_default"
 
+# All default commands inherit from the gridpunx MuxCommand, which
+# records command timing in world/metrics.py.
+COMMAND_DEFAULT_CLASS = "commands.command.MuxCommand"
+
+# Use the gridpunx ServerSession (server/conf/serversession.py).
+SERVER_SESSION_CLASS = "server.conf.serversession.ServerSession"
+
+
+######################################################################
+# gridpunx world building
+######################################################################
+
+# World file (see world/builder.py) built in bulk the very first time
+# the server starts. Leave empty to start with an empty world.
+GRIDPUNX_WORLD_FILE = os.path.join(GAME_DIR, "world", "world.json")
+# Directory @district reads the world files named by builders from.
+# Files outside it can only be used as GRIDPUNX_WORLD_FILE.
+GRIDPUNX_WORLD_DIR = os.path.join(GAME_DIR, "world")
+
+# Number of recent routes kept by the in-memory exit graph
+# (see world/pathfinding.py).
+GRIDPUNX_ROUTE_CACHE_SIZE = 1024
+# Zone tickers spread their zones over this many ticks per interval
+# (see world/zones.py).
+GRIDPUNX_ZONE_TICK_SLOTS = 10
+# Seconds between climate ticks in the rooms outside (see
+# world/climate.py).
+GRIDPUNX_CLIMATE_INTERVAL = 90
+# NPC behaviors (see world/behaviors.py) are scheduled in ticks of this
+# many seconds, and at most GRIDPUNX_NPC_BATCH of them run per tick.
+GRIDPUNX_NPC_TICK = 1
+GRIDPUNX_NPC_BATCH = 200
+# Batched event subscribers (see world/events.py) get their events
+# this many seconds after the first one of a batch.
+GRIDPUNX_EVENT_BATCH_INTERVAL = 1
+
+
+######################################################################
+# gridpunx warm-up and reloads
+######################################################################
+
+# Prime the caches of hot rooms, their contents and online characters
+# at server start and after reloads (see world/warmup.py).
+GRIDPUNX_WARMUP = True
+# Rooms of these typeclasses are primed at every server start.
+GRIDPUNX_WARMUP_ROOM_TYPECLASSES = (
+    "typeclasses.rooms.RealInside",
+    "typeclasses.rooms.RealOutside",
+)
+# Upper limit of rooms primed at server start.
+GRIDPUNX_WARMUP_MAX_ROOMS = 2000
+
+
+# Version of the in-memory state saved across reloads. Bump it when a
+# hot state provider changes the shape of its data; snapshots written
+# with another version are discarded (see world/hotstate.py).
+GRIDPUNX_HOTSTATE_VERSION = 1
+
+
+######################################################################
+# gridpunx metrics
+######################################################################
+
+# Fraction (0-1) of command invocations run under cProfile at server
+# start; the profiles of the slowest 1% are kept (see world/metrics.py
+# and the @cmdstats command). Can be changed at runtime.
+GRIDPUNX_COMMAND_PROFILE_RATE = 0.0
+
+
+######################################################################
+# gridpunx worker threads
+######################################################################
+
+# Blocking work is run in worker threads, in lanes (see
+# world/offload.py). Per lane: (worker threads, jobs accepted before
+# new ones are refused).
+GRIDPUNX_OFFLOAD_LANES = {
+    "interactive": (4, 64),
+    "batch": (2, 256),
+}
+
+
+######################################################################
+# gridpunx web endpoints
+######################################################################
+
+# Client addresses allowed to scrape the Prometheus /metrics endpoint.
+# An empty tuple allows everyone.
+GRIDPUNX_METRICS_ALLOWED_IPS = ("127.0.0.1", "::1")
+
+# Seconds between full rebuilds of the world state snapshot served by
+# the read-only JSON API (/api/who/, /api/rooms/, /api/economy/).
+GRIDPUNX_WORLDSTATE_INTERVAL = 30
+# Default and maximum page sizes for paginated API results.
+GRIDPUNX_API_PAGE_SIZE = 50
+GRIDPUNX_API_MAX_PAGE_SIZE = 200
+# Cache-Control max-age (seconds) sent with API responses.
+GRIDPUNX_API_MAX_AGE = 5
+# Seconds between publishing world counts for the Portal's MSSP table.
+GRIDPUNX_MSSP_PUBLISH_INTERVAL = 60
+# Seconds between re-renders of the cached connection screen.
+GRIDPUNX_CONNECTION_SCREEN_INTERVAL = 15
+
+
+######################################################################
+# gridpunx channels
+######################################################################
+
+# Channel messages are sent to this many sessions per reactor turn
+# (see typeclasses/channels.py). 0 sends to everyone at once.
+GRIDPUNX_CHANNEL_BATCH_SIZE = 100
+# Messages kept in memory per channel for replay, unless the channel
+# sets its own `history_size`.
+GRIDPUNX_CHANNEL_HISTORY = 50
+# Seconds between batched writes of channel log files.
+GRIDPUNX_CHANNEL_ARCHIVE_INTERVAL = 5
+
 
 ######################################################################
 # Settings given in secret_settings.py override those in this file.
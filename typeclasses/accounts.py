@@ -24,6 +24,8 @@ several more options for customizing the Guest account system.
 
 from evennia import DefaultAccount, DefaultGuest
 
+from world import worldstate
+
 
 class Account(DefaultAccount):
     """
@@ -92,7 +94,21 @@ class Account(DefaultAccount):
 
     """
 
-    pass
+    def at_post_login(self, session=None, **kwargs):
+        """
+        Called at the end of the login process. Refreshes the online
+        sections of the world state snapshot.
+        """
+        super().at_post_login(session=session, **kwargs)
+        worldstate.mark_dirty()
+
+    def at_disconnect(self, reason=None, **kwargs):
+        """
+        Called just before the account disconnects. Refreshes the
+        online sections of the world state snapshot.
+        """
+        super().at_disconnect(reason=reason, **kwargs)
+        worldstate.mark_dirty()
 
 
 class Guest(DefaultGuest):
@@ -12,7 +12,29 @@ to be modified.
 
 """
 
-from evennia import DefaultChannel
+from django.conf import settings
+from evennia import DefaultAccount, DefaultChannel, DefaultObject
+from evennia.accounts.models import AccountDB
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.utils import logger
+
+from world import channelhistory
+from world.rendering import broadcast
+
+# The default message hooks (no-ops). Receivers or senders whose
+# typeclass overrides them go through msg(), see distribute_message.
+_DEFAULT_MSG_HOOKS = {
+    DefaultAccount.at_msg_receive,
+    DefaultAccount.at_msg_send,
+    DefaultObject.at_msg_receive,
+    DefaultObject.at_msg_send,
+}
+
+
+def _has_hook(entity, hook):
+    "True if the typeclass of `entity` overrides the default `hook`."
+    method = getattr(type(entity), hook, None)
+    return method is not None and method not in _DEFAULT_MSG_HOOKS
 
 
 class Channel(DefaultChannel):
@@ -57,6 +79,138 @@ class Channel(DefaultChannel):
         pre_send_message(msg) - runs just before a message is sent to channel
         post_send_message(msg) - called just after message was sent to channel
 
+    
+    gridpunx details
+    ================
+    Channel messages are fanned out to the sessions of online
+    subscribers directly: the message is parsed once per client
+    capability (see world/rendering.py) instead of once per receiver,
+    offline subscribers are skipped without being looked at, and the
+    sessions are sent to in batches of
+    `settings.GRIDPUNX_CHANNEL_BATCH_SIZE`, one batch per reactor turn.
+    Sending to sessions skips `Account.msg()`, so this fast path is
+    only taken for accounts whose typeclass keeps the default
+    `at_msg_receive`, and only if no sender overrides `at_msg_send`.
+    Everyone else is sent to through `msg()` as in Evennia, so those
+    hooks still run (and can block or filter channel messages).
+
+    Per-channel settings (Attributes):
+        ephemeral (bool) - never log messages; only the in-memory
+                history is kept.
+        history_size (int) - number of messages kept in memory for
+                replay (default `settings.GRIDPUNX_CHANNEL_HISTORY`).
+        keep_log (bool) - as in Evennia; the log lines are written in
+                batches (see world/channelhistory.py).
     """
 
-    pass
+    @property
+    def ephemeral(self):
+        "True if messages on this channel are never logged."
+        return bool(self.db.ephemeral)
+
+    def log_filename(self):
+        "The log file this channel's messages are archived in."
+        return self.attributes.get("log_file", default="channel_%s.log" % self.key)
+
+    def recent_messages(self, num=None):
+        """
+        Returns the last `num` messages of this channel as
+        `(timestamp, message)` tuples, oldest first.
+        """
+        return channelhistory.recent(self, num)
+
+    def msg(self, msgobj, header=None, senders=None, sender_strings=None,
+            keep_log=None, online=False, emit=False, external=False):
+        """
+        Send a message to the channel. Ephemeral channels never keep a
+        log, whatever `keep_log` says.
+        """
+        if self.ephemeral:
+            keep_log = False
+        return super().msg(msgobj, header=header, senders=senders,
+                           sender_strings=sender_strings, keep_log=keep_log,
+                           online=online, emit=emit, external=external)
+
+    def _subscriber_ids(self):
+        """
+        Cached ids of subscribed accounts, and the subscribed objects
+        (which are sent to through their own msg()).
+        """
+        cached = self.ndb.subscriber_ids
+        if cached is None:
+            account_ids, objects = set(), []
+            for entity in self.subscriptions.all():
+                if isinstance(entity, AccountDB):
+                    account_ids.add(entity.id)
+                else:
+                    objects.append(entity)
+            cached = self.ndb.subscriber_ids = (account_ids, objects)
+        return cached
+
+    def post_join_channel(self, joiner, **kwargs):
+        self.ndb.subscriber_ids = None
+        super().post_join_channel(joiner, **kwargs)
+
+    def delete(self):
+        channelhistory.forget(self)
+        return super().delete()
+
+    def post_leave_channel(self, leaver, **kwargs):
+        self.ndb.subscriber_ids = None
+        super().post_leave_channel(leaver, **kwargs)
+
+    def online_sessions(self):
+        """
+        Returns the sessions of all online, unmuted subscribed accounts.
+        """
+        account_ids, _ = self._subscriber_ids()
+        muted = {entity.id for entity in self.mutelist}
+        return [
+            session
+            for session in SESSION_HANDLER.get_sessions()
+            if session.logged_in and session.uid in account_ids and session.uid not in muted
+        ]
+
+    def distribute_message(self, msgobj, online=False, **kwargs):
+        """
+        Send a transformed message to everyone listening. Accounts
+        only receive it while online, so `online` makes no difference
+        to them; subscribed objects follow the default behavior. The
+        message is added to the channel history and, if the channel
+        keeps a log, queued for the archive.
+
+        Accounts with their own `at_msg_receive` hook (and everyone,
+        if a sender has its own `at_msg_send`) are sent to through
+        their `msg()`; the rest get the pre-rendered broadcast.
+        """
+        channelhistory.record(self, msgobj.message, self.db.history_size)
+        if getattr(msgobj, "keep_log", False) and not self.ephemeral:
+            channelhistory.archive(self.log_filename(), msgobj.message)
+        options = {"from_channel": self.id}
+        senders = msgobj.senders or []
+        hooked_sender = any(_has_hook(sender, "at_msg_send") for sender in senders)
+        sessions, hooked = [], {}
+        for session in self.online_sessions():
+            account = session.account
+            if hooked_sender or _has_hook(account, "at_msg_receive"):
+                hooked[account.id] = account
+            else:
+                sessions.append(session)
+        for account in hooked.values():
+            account.msg(msgobj.message, from_obj=msgobj.senders, options=options)
+        broadcast(
+            sessions,
+            msgobj.message,
+            batch_size=settings.GRIDPUNX_CHANNEL_BATCH_SIZE,
+            **options
+        )
+        _, objects = self._subscriber_ids()
+        muted = set(self.mutelist)
+        for entity in objects:
+            if entity in muted or (online and not entity.sessions.count()):
+                continue
+            try:
+                entity.msg(msgobj.message, from_obj=msgobj.senders, options=options)
+            except AttributeError as err:
+                logger.log_trace("%s\nCannot send msg to '%s'." % (err, entity))
+
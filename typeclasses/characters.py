@@ -9,6 +9,9 @@ creation commands.
 """
 from evennia import DefaultCharacter
 
+from typeclasses.rooms import invalidate_room_of
+from world import events, grid, zones
+
 
 class Character(DefaultCharacter):
     """
@@ -45,6 +48,33 @@ class Character(DefaultCharacter):
         self.locks.add('receive:true()')
 
 
+    def at_post_puppet(self, **kwargs):
+        super().at_post_puppet(**kwargs)
+        # The room was entered before the session was attached.
+        zones.arrived(self.location, self)
+        # Characters are listed apart from things in cached room
+        # appearances.
+        invalidate_room_of(self)
+
+    def at_post_unpuppet(self, account, session=None, **kwargs):
+        if not self.sessions.count():
+            # The character is about to be taken off the grid.
+            zones.departed(self.location, self)
+            invalidate_room_of(self)
+        super().at_post_unpuppet(account, session=session, **kwargs)
+
+    def at_after_move(self, source_location, **kwargs):
+        super().at_after_move(source_location, **kwargs)
+        # Carried grid devices move along.
+        grid.moved(self)
+        events.emit(events.Moved, self, source_location, self.location)
+
+    def at_object_delete(self):
+        # delete() takes the character out of its room without calling
+        # at_object_leave.
+        invalidate_room_of(self)
+        return super().at_object_delete()
+
     def get_climate_protection(self):
         """
         Determine if character is protected from climate damage.
@@ -8,6 +8,8 @@ for allowing Characters to traverse the exit to its destination.
 """
 from evennia import DefaultExit
 
+from typeclasses.rooms import invalidate_room_of
+
 
 class Exit(DefaultExit):
     """
@@ -33,6 +35,17 @@ class Exit(DefaultExit):
         at_failed_traverse(traveller) - called by at_traverse if traversal failed for some reason. Will
                                         not be called if the attribute `err_traverse` is
                                         defined, in which case that will simply be echoed.
+
+    gridpunx details
+    ================
+    Exits refresh the cached appearance of their room when they are
+    created or deleted.
     """
 
-    pass
+    def at_object_creation(self):
+        super().at_object_creation()
+        invalidate_room_of(self)
+
+    def at_object_delete(self):
+        invalidate_room_of(self)
+        return super().at_object_delete()
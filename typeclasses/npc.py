@@ -21,9 +21,13 @@ by a GameMaster or Builder.
 """
 
 
-from evennia import CmdSet, default_cmds
+from evennia import CmdSet
+from evennia.server.sessionhandler import SESSION_HANDLER
 from evennia.utils.evmenu import EvMenu
+from evennia.utils.utils import mod_import
+from commands.command import MuxCommand
 from typeclasses.objects import RealObject
+from world import behaviors as npc_behaviors
 
 
 # ==============================================================
@@ -56,7 +60,7 @@ def END(caller, raw_string, **kwargs):
 # ==
 # ==============================================================
 
-class CmdTalk(default_cmds.MuxCommand):
+class CmdTalk(MuxCommand):
     """
     Talks to an NPC
 
@@ -101,9 +105,68 @@ class CmdTalk(default_cmds.MuxCommand):
         self.caller.msg("(You walk up and talk to %s.)" % self.obj.key)
         
         # Initiate the menu by passing the object's module path to it.
-        EvMenu(self.caller, dialogue_module, startnode="dialogue_start")
+        # The path is also stored on the menu, so that the conversation
+        # can be restored after a reload (see restore_conversations).
+        EvMenu(
+            self.caller,
+            dialogue_module,
+            startnode="dialogue_start",
+            dialogue_module=dialogue_module,
+        )
         # All dialogue trees must start at a function named 'dialogue_start'
 
+# ==============================================================
+# ==
+# == Conversations across reloads
+# ==
+# ==============================================================
+#
+#    Open dialogue menus only live in `caller.ndb._menutree`, so a
+# reload would drop every conversation. These two functions are
+# registered with world/hotstate.py to carry them over. A dialogue
+# module can define:
+#
+#   MENU_STATE - names of attributes its nodes keep on the menu
+#                (caller.ndb._menutree) that should survive.
+#   RESUME_NODES - a dict mapping nodes that must not be shown twice
+#                (like a node paying out winnings) to the node the
+#                conversation should resume at instead.
+
+def save_conversations():
+    """
+    Returns the state of all open NPC conversations of online
+    characters.
+    """
+    conversations = []
+    for session in SESSION_HANDLER.get_sessions():
+        caller = session.puppet
+        menu = caller.ndb._menutree if caller else None
+        module = getattr(menu, "dialogue_module", None)
+        if not module:
+            continue
+        state = {
+            key: getattr(menu, key)
+            for key in getattr(mod_import(module), "MENU_STATE", ())
+            if hasattr(menu, key)
+        }
+        conversations.append((caller.id, module, menu.nodename, state))
+    return conversations
+
+
+def restore_conversations(conversations):
+    """
+    Re-opens conversations saved by `save_conversations`. Each menu is
+    started at the node it was at (or its RESUME_NODES replacement).
+    """
+    puppets = {sess.puppet.id: sess.puppet for sess in SESSION_HANDLER.get_sessions() if sess.puppet}
+    for caller_id, module, nodename, state in conversations:
+        caller = puppets.get(caller_id)
+        if not caller:
+            continue
+        nodename = getattr(mod_import(module), "RESUME_NODES", {}).get(nodename, nodename)
+        EvMenu(caller, module, startnode=nodename, dialogue_module=module, **state)
+
+
 class TalkingCmdSet(CmdSet):
     "Stores the 'talk' command."
     key = "talkingcmdset"
@@ -135,8 +198,24 @@ class RealTalkingNPC(RealObject):
     dialogue tree. The tree *must* begin at a function named 
     'dialogue_start', but can otherwise be modified to do 
     anything within the limitiations of the EvMenu utility.
+
+    Subclasses can give the NPC ambient behavior: `behaviors` maps
+    behavior names to their interval in seconds, and each behavior is
+    a `behavior_<name>` method (see world/behaviors.py).
     """
-    
+
+    behaviors = {}
+
+    def at_init(self):
+        "Called whenever the NPC is loaded into memory."
+        super().at_init()
+        if self.behaviors:
+            npc_behaviors.register(self)
+
+    def at_object_delete(self):
+        npc_behaviors.unregister(self)
+        return super().at_object_delete()
+
     def at_object_creation(self):
         "This is called when object is first created."
 
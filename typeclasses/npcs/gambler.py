@@ -8,9 +8,18 @@ This is an NPC with a dialogue tree that initiates a gambling game.
 
 
 from typeclasses.npc import RealTalkingNPC
+from world import events
 from random import randint
 
 
+# Menu state that survives a server reload (see typeclasses/npc.py).
+MENU_STATE = ("player_bet",)
+
+# Nodes that pay out or settle a round are not shown again after a
+# reload; the conversation picks up at the start of the game instead.
+RESUME_NODES = {"duodo_win": "gamble_init", "duodo_lose": "gamble_init"}
+
+
 # ==============================================================
 # ==
 # == Gambler's dialogue tree - Win big. REAL big.
@@ -215,6 +224,7 @@ def duodo_win(caller, raw_string, **kwargs):
     wager = caller.ndb._menutree.player_bet['wager']
     payout = wager * caller.ndb._menutree.player_bet['payout']
     caller.db.gridbits += payout
+    events.emit(events.Payout, "duodo", caller, wager, payout)
     
     text = "'You win. Here's your " + str(payout) + " gridbits. How about another round, punk?'"
 
@@ -237,12 +247,27 @@ def END(caller, raw_string, **kwargs):
 
 # ==============================================================
 # ==
-# == RealGamblerNPC - Nothing special.
+# == RealGamblerNPC - Calls out to passers-by.
 # ==
 # ==============================================================
 
+CALLOUTS = (
+    "'Step right up, punk! Duodo pays four to one!'",
+    "'You look like the lucky type. Wanna roll some bones?'",
+    "'Twelve sides, two dice, one chance to get rich. Whadduya say?'",
+    "'C'mon, nobody ever got rich keepin' their gridbits in their pocket!'",
+)
+
+
 class RealGamblerNPC(RealTalkingNPC):
     """
-    This simply inherits the standard RealTalkingNPC typeclass.
+    The standard RealTalkingNPC, calling out to anyone in the room
+    every now and then.
     """
-    pass
+
+    behaviors = {"callout": 90}
+
+    def behavior_callout(self):
+        "Call out to the room; the next call comes a little sooner or later."
+        self.location.msg_contents("%s calls out, %s" % (self.key, CALLOUTS[randint(0, len(CALLOUTS) - 1)]))
+        return randint(60, 120)
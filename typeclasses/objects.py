@@ -10,8 +10,23 @@ the other types, you can do so by adding this as a multiple
 inheritance.
 
 """
+from django.db import transaction
 from evennia import DefaultObject
 
+from typeclasses.rooms import invalidate_room_of
+from world import events, grid, inventory
+
+
+def compute_condition(hitpoints, damage):
+    """
+    Condition as a percentage (0-100) of hitpoints left. Objects
+    without hitpoints or damage are in perfect condition.
+    """
+    if hitpoints == None or damage == None:
+        return 100
+    return round(((hitpoints - damage) / hitpoints) * 100)
+
+
 # ==============================================================
 # ==
 # == Default Evennia Object
@@ -164,7 +179,11 @@ class Object(DefaultObject):
 
      """
 
-    pass
+    def at_object_delete(self):
+        # delete() takes the object out of its location without calling
+        # at_object_leave.
+        invalidate_room_of(self)
+        return super().at_object_delete()
 
 
 # ==============================================================
@@ -186,16 +205,116 @@ class RealObject(Object):
     #    All real objects will have a 'condition', which is a perenctage
     # based on how many hitpoints the object is assigned and how much
     # damage the object has taken rounded to the nearest integer.
+    #    Condition is derived and cached in ndb. It is only recomputed
+    # after hitpoints or damage changed, however they were written:
+    # world/derived.py clears the cache whenever either Attribute is
+    # saved or deleted.
+    @property
+    def hitpoints(self):
+        return self.db.hitpoints
+
+    @hitpoints.setter
+    def hitpoints(self, value):
+        self.db.hitpoints = value
+
+    @property
+    def damage(self):
+        return self.db.damage
+
+    @damage.setter
+    def damage(self, value):
+        self.db.damage = value
+
+    @property
+    def condition(self):
+        "The cached condition, see get_condition()."
+        condition = self.ndb.condition
+        if condition is None:
+            condition = self.ndb.condition = compute_condition(self.db.hitpoints, self.db.damage)
+        return condition
+
+    def reset_condition(self):
+        "Forget the cached condition."
+        self.ndb.condition = None
+
     def get_condition(self):
         """
         The get_condition function returns a value that represents
         an objects condition as a percentage value from 0-100.
         """
-        if self.db.hitpoints == None or self.db.damage == None:
-            condition = 100
-        else:
-            condition = round(((self.db.hitpoints - self.db.damage) / self.db.hitpoints) * 100)
-        return condition
+        return self.condition
+
+    def return_appearance(self, looker, **kwargs):
+        """
+        Real objects show their condition below their description.
+        """
+        string = super().return_appearance(looker, **kwargs)
+        if string:
+            string += "\n|wCondition:|n %i%%" % self.get_condition()
+        return string
+
+    #    Real objects have a weight and a value (per item, see
+    # world/inventory.py) and keep cached totals of everything nested
+    # inside them. Change weight and value through the properties
+    # below to keep the totals of the containers around them current.
+    @property
+    def weight(self):
+        return self.attributes.get("weight", default=0)
+
+    @weight.setter
+    def weight(self, value):
+        self._set_total_attribute("weight", value)
+
+    @property
+    def value(self):
+        return self.attributes.get("value", default=0)
+
+    @value.setter
+    def value(self, value):
+        self._set_total_attribute("value", value)
+
+    def _set_total_attribute(self, name, value):
+        before = inventory.own_totals(self)
+        self.attributes.add(name, value)
+        inventory.adjust(self.location, lambda: inventory.own_totals(self) - before)
+
+    def get_totals(self):
+        """
+        Returns the cached totals (count, weight, value) of everything
+        nested inside this object, see world/inventory.py.
+        """
+        totals = self.ndb.totals
+        if totals is None:
+            totals = self.ndb.totals = inventory.contents_totals(self)
+        return totals
+
+    def at_object_receive(self, moved_obj, source_location, **kwargs):
+        super().at_object_receive(moved_obj, source_location, **kwargs)
+        inventory.added(self, moved_obj)
+
+    def at_object_leave(self, moved_obj, target_location, **kwargs):
+        super().at_object_leave(moved_obj, target_location, **kwargs)
+        inventory.removed(self, moved_obj)
+
+    def at_after_move(self, source_location, **kwargs):
+        super().at_after_move(source_location, **kwargs)
+        # Grid devices inside this object moved along with it.
+        grid.moved(self)
+        events.emit(events.Moved, self, source_location, self.location)
+
+    def at_get(self, getter, **kwargs):
+        super().at_get(getter, **kwargs)
+        events.emit(events.Got, self, getter, self.attributes.get("quantity", 1))
+
+    def at_give(self, giver, getter, **kwargs):
+        super().at_give(giver, getter, **kwargs)
+        events.emit(events.Given, self, giver, getter, self.attributes.get("quantity", 1))
+
+    def at_object_delete(self):
+        # The contents are moved out (through the hooks above) after
+        # this; only the object itself leaves its location's totals.
+        inventory.adjust(self.location, lambda: -inventory.own_totals(self))
+        return super().at_object_delete()
 
 class RealEnvironment(RealObject):
     """
@@ -219,17 +338,97 @@ class RealItem(RealObject):
     manipulated, picked up, stored inside things, and much more. 
     Objects created using this typeclass are intended to be 
     picked up or manipulated by characters.
+
+    Items with a `stack_key` Attribute (set by the prototypes of
+    ammunition, chips and the like) are stacks: one object standing
+    for `quantity` identical items, sharing their description and
+    condition. Stacks are split and merged by the get and give
+    commands; change the quantity through the `quantity` property so
+    cached room appearances stay current.
     """
     def at_object_creation(self):
         # Values used by the get_condition() function
         self.db.hitpoints = 16
         self.db.damage = 0
 
+    @property
+    def stack_key(self):
+        "Items with the same stack key (and damage) stack. None if unstackable."
+        return self.attributes.get("stack_key")
+
+    @property
+    def quantity(self):
+        return self.attributes.get("quantity", default=1)
+
+    @quantity.setter
+    def quantity(self, value):
+        self._set_total_attribute("quantity", value)
+        invalidate_room_of(self)
+
+    def stacks_with(self, other):
+        "True if `other` is a stack this item can be merged into."
+        return (
+            other is not self
+            and other.key == self.key
+            and other.typeclass_path == self.typeclass_path
+            and self.stack_key is not None
+            and other.stack_key == self.stack_key
+            and other.db.damage == self.db.damage
+        )
+
+    def split_stack(self, amount):
+        """
+        Take `amount` items off this stack into a new stack in the
+        same location, and return the new stack.
+        """
+        self.quantity = self.quantity - amount
+        part = self.copy(new_key=self.key)
+        part.db.quantity = amount
+        # Copies are created in place without move hooks; have the
+        # location take in the new stack.
+        if part.location:
+            part.location.at_object_receive(part, None)
+        return part
+
+    def merge_stack(self):
+        """
+        Merge this stack into a matching stack in the same location,
+        if there is one, deleting this object. Returns the stack the
+        items ended up in.
+        """
+        if self.stack_key is None or not self.location:
+            return self
+        for other in self.location.contents:
+            if isinstance(other, RealItem) and self.stacks_with(other):
+                other.quantity = other.quantity + self.quantity
+                self.delete()
+                return other
+        return self
+
+    def get_stack_name(self, looker):
+        "The display name with the quantity, like 'twenty bullets'."
+        quantity = self.quantity
+        if quantity == 1:
+            return self.get_display_name(looker)
+        return self.get_numbered_name(quantity, looker)[1]
+
+    def return_appearance(self, looker, **kwargs):
+        string = super().return_appearance(looker, **kwargs)
+        quantity = self.quantity
+        if string and quantity != 1:
+            string += "\n|wQuantity:|n %i" % quantity
+        return string
+
 class RealThing(RealObject):
     """
     RealThing objects can serve many purposes, but are mainly 
     intended to be more advanced versions of RealItems that are 
     connected to The Grid.
+
+    Connected things are devices on The Grid (see world/grid.py).
+    Use connect() and disconnect() rather than setting the
+    `grid_connection` Attribute, and override at_grid_event() to
+    react to grid broadcasts.
     """
     def at_object_creation(self):
         # Values used by the get_condition() function
@@ -238,6 +437,39 @@ class RealThing(RealObject):
 
         #GridOfThings
         self.db.grid_connection = True
+        # Only join the Grid once a bulk build's transaction has been
+        # committed.
+        transaction.on_commit(lambda: grid.add(self))
+
+    @property
+    def grid_connected(self):
+        return bool(self.db.grid_connection)
+
+    def connect(self):
+        "Connect this thing to The Grid."
+        self.db.grid_connection = True
+        grid.add(self)
+
+    def disconnect(self):
+        "Take this thing off The Grid."
+        self.db.grid_connection = False
+        grid.remove(self)
+
+    def at_grid_event(self, event, source, **kwargs):
+        """
+        Called for grid events broadcast by a device this one can
+        reach (see world.grid.broadcast).
+
+        Args:
+            event (str): The kind of event.
+            source (RealThing): The device that sent it.
+            **kwargs: Event data.
+        """
+        pass
+
+    def at_object_delete(self):
+        grid.remove(self)
+        return super().at_object_delete()
 
 class RealContainer(RealObject):
     """
@@ -252,3 +484,16 @@ class RealContainer(RealObject):
 
         # Containers can receive items via the 'give' command
         self.locks.add('receive:true()')
+
+    def return_appearance(self, looker, **kwargs):
+        """
+        Containers sum up everything inside them, however deeply
+        nested.
+        """
+        string = super().return_appearance(looker, **kwargs)
+        if string:
+            totals = self.get_totals()
+            string += "\n|wHolds:|n %i item%s, %g kg, worth %g gridbits" % (
+                totals.count, "" if totals.count == 1 else "s", totals.weight, totals.value
+            )
+        return string
@@ -5,7 +5,26 @@ Rooms are simple containers that has no location of their own.
 
 """
 
+from collections import defaultdict
+
 from evennia import DefaultRoom
+from evennia.utils.utils import list_to_string
+
+from world import metrics, zones
+
+# View locks that let everyone see an object. Objects with any other
+# view lock are checked for every looker.
+_PUBLIC_VIEW_LOCKS = ("", "view:all()")
+
+def invalidate_room_of(obj):
+    """
+    Forget the cached contents section of the appearance of the room
+    `obj` is in, after `obj` changed how it is listed there.
+    """
+    location = obj.location
+    if hasattr(location, "invalidate_appearance"):
+        location.invalidate_appearance()
+
 
 # ==============================================================
 # ==
@@ -28,9 +47,132 @@ class Room(DefaultRoom):
     gridpunx details
     ================
     The Room class will be used for any game mechanics which will 
-    be shared between realms. Currently, this has nothing defined.
+    be shared between realms. Rooms belong to a zone (see
+    world/zones.py) and report puppeted characters coming and going,
+    so that world-wide processes can skip the empty parts of the world.
+
+    The appearance of a room is cached: the header and desc are kept
+    until the key or desc changes, and the contents section (exits,
+    characters and things) until something enters or leaves the room
+    or changes how it is listed. Moves are reported by the hooks below;
+    deletions, renames, view lock changes and objects created in bulk
+    by the objects' own hooks, world/derived.py and the batch creators
+    (see `invalidate_room_of`).
+    Only the looker's own name is taken out per look. Builders, who
+    see dbrefs, always get a freshly built appearance.
     """
-    pass
+
+    @property
+    def zone(self):
+        "The zone this room belongs to, or None."
+        return zones.zone_of(self)
+
+    @zone.setter
+    def zone(self, value):
+        old = self.zone
+        if old == value:
+            return
+        if old:
+            self.tags.remove(old, category=zones.ZONE_CATEGORY)
+        if value:
+            self.tags.add(value, category=zones.ZONE_CATEGORY)
+
+    def at_object_receive(self, moved_obj, source_location, **kwargs):
+        super().at_object_receive(moved_obj, source_location, **kwargs)
+        self.invalidate_appearance()
+        if moved_obj.has_account:
+            zones.arrived(self, moved_obj)
+
+    def at_object_leave(self, moved_obj, target_location, **kwargs):
+        super().at_object_leave(moved_obj, target_location, **kwargs)
+        self.invalidate_appearance()
+        zones.departed(self, moved_obj)
+
+    def invalidate_appearance(self):
+        "Forget the cached contents section of the room's appearance."
+        self.ndb.appearance_contents = None
+
+    def _appearance_header(self, looker):
+        """
+        The cached name and desc part of the appearance. Cleared by
+        world/derived.py when the room is renamed or its desc changes.
+        """
+        string = self.ndb.appearance_header
+        if string is None:
+            string = "|c%s|n\n" % self.get_display_name(looker)
+            desc = self.db.desc
+            if desc:
+                string += "%s" % desc
+            self.ndb.appearance_header = string
+        return string
+
+    def _appearance_contents(self, looker):
+        """
+        The cached contents section, as `(exits, users, things, private)`:
+        the display strings of exits, `(id, string)` pairs of characters,
+        the grouped display strings of things, and the objects whose
+        view lock must be checked per looker.
+        """
+        cached = self.ndb.appearance_contents
+        if cached is not None:
+            metrics.CACHE_REQUESTS.inc(1, "room_appearance", "hit")
+            return cached
+        metrics.CACHE_REQUESTS.inc(1, "room_appearance", "miss")
+        exits, users, things, private = [], [], defaultdict(list), []
+        for con in self.contents:
+            if con.locks.get("view") not in _PUBLIC_VIEW_LOCKS:
+                private.append(con)
+                continue
+            key = con.get_display_name(looker)
+            if con.destination:
+                exits.append(key)
+            elif con.has_account:
+                users.append((con.id, "|c%s|n" % key))
+            else:
+                things[key].append(con)
+        thing_strings = []
+        for key, itemlist in sorted(things.items()):
+            # Stacks (see RealItem) count with their quantity.
+            nitem = sum(getattr(item, "quantity", 1) for item in itemlist)
+            if nitem == 1:
+                key, _ = itemlist[0].get_numbered_name(nitem, looker, key=key)
+            else:
+                key = itemlist[0].get_numbered_name(nitem, looker, key=key)[1]
+            thing_strings.append(key)
+        cached = self.ndb.appearance_contents = (exits, users, thing_strings, private)
+        return cached
+
+    def return_appearance(self, looker, **kwargs):
+        """
+        Describe the room to `looker`, using the cached parts where
+        possible.
+        """
+        if not looker:
+            return ""
+        if looker.locks.check_lockstring(looker, "perm(Builder)"):
+            return super().return_appearance(looker, **kwargs)
+        exits, users, things, private = self._appearance_contents(looker)
+        exits = list(exits)
+        users = [string for objid, string in users if objid != looker.id]
+        things = list(things)
+        for con in private:
+            if con == looker or not con.access(looker, "view"):
+                continue
+            key = con.get_display_name(looker)
+            if con.destination:
+                exits.append(key)
+            elif con.has_account:
+                users.append("|c%s|n" % key)
+            else:
+                nitem = getattr(con, "quantity", 1)
+                things.append(con.get_numbered_name(nitem, looker, key=key)[0 if nitem == 1 else 1])
+
+        string = self._appearance_header(looker)
+        if exits:
+            string += "\n|wExits:|n " + list_to_string(exits)
+        if users or things:
+            string += "\n|wYou see:|n " + list_to_string(users + things)
+        return string
 
 
 # ==============================================================
@@ -45,7 +187,37 @@ class RealRoom(Room):
     currently just used as a means of establishing a hierarchy of 
     classes to separate the physical and digital realms.
     """
-    pass
+
+    def condition_report(self):
+        """
+        The condition of every real object in the room, for damage
+        systems handling many objects at once. Objects without a cached
+        condition are computed from one query for all of them, and
+        their caches are primed.
+
+        Returns:
+            report (dict): Maps objects to their condition (0-100).
+        """
+        from evennia.objects.models import ObjectDB
+        from typeclasses.objects import compute_condition
+
+        objs = [con for con in self.contents if hasattr(con, "reset_condition")]
+        report = {obj: obj.ndb.condition for obj in objs}
+        missing = {obj.id: obj for obj, condition in report.items() if condition is None}
+        if missing:
+            values = defaultdict(dict)
+            for conn in ObjectDB.db_attributes.through.objects.filter(
+                objectdb_id__in=list(missing),
+                attribute__db_key__in=("hitpoints", "damage"),
+                attribute__db_category=None,
+            ).select_related("attribute"):
+                values[conn.objectdb_id][conn.attribute.db_key] = conn.attribute.value
+            for objid, obj in missing.items():
+                condition = compute_condition(
+                    values[objid].get("hitpoints"), values[objid].get("damage")
+                )
+                obj.ndb.condition = report[obj] = condition
+        return report
 
 
 
@@ -64,11 +236,10 @@ class RealOutside(RealRoom):
     """
     Rooms that are "outside" of structures in the physical realm 
     will have harsh conditions which harm the player -- accomplished 
-    via a Script object (based on the Weather script from Evennia's
-    documentation (/path/to/your/evennia/docs/source/Scripts.md).
+    by the climate zone ticker (see world/climate.py), which handles
+    every room with `harsh_climate` set while its zone is active.
     """
-    def at_object_creation(self):
-        # Add the HarshClimate script these rooms
-        self.scripts.add('scripts.HarshClimate')
+
+    harsh_climate = True
 
         
@@ -14,7 +14,6 @@ just overloads its hooks to have it perform its function.
 """
 
 from evennia import DefaultScript
-import random
 
 # ==============================================================
 # ==
@@ -109,49 +108,19 @@ class Script(DefaultScript):
 # ==
 # ==============================================================
 
-class HarshClimate(Script): 
+class HarshClimate(Script):
     """
-    This script is based on the Weather script from Evennia's documentation 
-    (/path/to/your/evennia/docs/source/Scripts.md) and modified to harm the 
-    player at regular intervals. Meant to be attached to a RealOutside room to 
-    establish a setting with a harmful climate. 
+    Retired: the harsh climate of RealOutside rooms now runs per zone
+    (see world/climate.py). The class stays so that the scripts still
+    attached to existing rooms load; they report themselves invalid
+    and are removed when Evennia validates its scripts at the next
+    server start.
     """
-    
+
     def at_script_creation(self):
         self.key = "harsh_climate"
-        self.desc = "Harms an unprotected player at regular intervals."
-        self.persistent = True  # will survive reload
-        self.start_delay = True # Delay on first start.
-
-    def at_start(self):
-        # 1-2 minutes. Changes at server restart.
-        self.interval = random.randint(60,120)
-
-    def at_repeat(self):
-        "called every self.interval seconds."        
-        rand = random.random()
-        if rand < 0.5:
-            climate_damage = 2
-            climate_message = "Foul air of the concrete jungle lingers around you."
-        elif rand < 0.8:
-            climate_damage = 4
-            climate_message = "The already dense smog thickens some more."
-        else:
-            climate_damage = 8
-            climate_message = "A gentle breeze brings in some more toxic industrial fumes."
-
-        # send the climate_message string to everyone inside the room
-        self.obj.msg_contents(climate_message)
-
-        # Damage all unprotected humans in the room:
-        # Loop through all objects in room.  
-        for list_item in self.obj.contents:
-            if list_item.db.is_human == True:
-                # Check if it's a human and if they have protection from climate damage
-                if list_item.get_climate_protection() == True:
-                    # Let protected humans know they avoided damage.
-                    list_item.msg("Fortunately, you have climate protection and aren't harmed.")
-                else:
-                    # Hurt unprotected humans, and then let them know how much it hurts.
-                    list_item.db.hitpoints -= climate_damage
-                    list_item.msg("You take " + str(climate_damage) + " damage.")
+        self.desc = "Retired; see world/climate.py."
+        self.persistent = True
+
+    def is_valid(self):
+        return False
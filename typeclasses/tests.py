@@ -0,0 +1,42 @@
+"""
+Typeclass tests
+
+Run with
+
+    evennia test --settings settings.py typeclasses
+
+"""
+
+from evennia.utils import create
+from evennia.utils.test_resources import EvenniaTest
+
+from typeclasses.rooms import Room
+from world import zones
+
+
+class TestRoomZone(EvenniaTest):
+    "Setting `Room.zone` keeps the zone registry current."
+
+    def setUp(self):
+        super().setUp()
+        zones.start()
+        self.room = create.create_object(Room, key="Zoned")
+
+    def test_set_zone(self):
+        self.room.zone = "docks"
+        self.assertEqual(zones.zone_of(self.room), "docks")
+        self.assertIn(self.room.id, zones.rooms_in("docks"))
+
+    def test_change_zone(self):
+        self.room.zone = "docks"
+        self.room.zone = "market"
+        self.assertEqual(zones.zone_of(self.room), "market")
+        self.assertNotIn(self.room.id, zones.rooms_in("docks"))
+        self.assertEqual(self.room.tags.get(category=zones.ZONE_CATEGORY), "market")
+
+    def test_clear_zone(self):
+        self.room.zone = "docks"
+        self.room.zone = None
+        self.assertIsNone(zones.zone_of(self.room))
+        self.assertNotIn(self.room.id, zones.rooms_in("docks"))
+        self.assertIsNone(self.room.tags.get(category=zones.ZONE_CATEGORY))
@@ -9,9 +9,15 @@ from django.conf.urls import url, include
 # default evennia patterns
 from evennia.web.urls import urlpatterns
 
+from web import views
+
 # eventual custom patterns
 custom_patterns = [
     # url(r'/desired/url/', view, name='example'),
+    url(r"^metrics/?$", views.metrics, name="metrics"),
+    url(r"^api/who/?$", views.api_who, name="api-who"),
+    url(r"^api/rooms/?$", views.api_rooms, name="api-rooms"),
+    url(r"^api/economy/?$", views.api_economy, name="api-economy"),
 ]
 
 # this is required by Django.
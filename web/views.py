@@ -0,0 +1,111 @@
+"""
+Views
+
+Custom gridpunx web views, routed from `web/urls.py`.
+
+"""
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_safe
+
+from world import metrics as game_metrics
+from world import worldstate
+
+
+def _client_ip(request):
+    """
+    Returns the address of the client. Requests reach the Server's
+    webserver through the Portal's reverse proxy, which appends the real
+    client address to X-Forwarded-For.
+    """
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint. Only reads in-memory metrics, so it is
+    safe to scrape every few seconds.
+    """
+    allowed = settings.GRIDPUNX_METRICS_ALLOWED_IPS
+    if allowed and _client_ip(request) not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        game_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# ==============================================================
+# ==
+# == Read-only JSON API
+# ==
+# ==============================================================
+
+def _positive_int(value, default):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def _section_response(request, name, paginate=True):
+    """
+    Answer a request from the in-memory world state snapshot. Supports
+    conditional requests (If-None-Match) and page/per_page pagination
+    of list sections. Never queries the game database.
+    """
+    section = worldstate.get_section(name)
+    if section is None:
+        return JsonResponse({"error": "World state is not available yet."}, status=503)
+
+    etag = section["etag"]
+    payload = {"generated": section["generated"]}
+    if paginate:
+        per_page = min(
+            _positive_int(request.GET.get("per_page"), settings.GRIDPUNX_API_PAGE_SIZE),
+            settings.GRIDPUNX_API_MAX_PAGE_SIZE,
+        )
+        page = _positive_int(request.GET.get("page"), 1)
+        etag = "%s-%s-%s" % (etag, page, per_page)
+        results = section["data"]
+        payload.update(
+            {
+                "count": len(results),
+                "page": page,
+                "per_page": per_page,
+                "results": results[(page - 1) * per_page : page * per_page],
+            }
+        )
+    else:
+        payload["results"] = section["data"]
+
+    etag = '"%s"' % etag
+    if etag in [tag.strip() for tag in request.META.get("HTTP_IF_NONE_MATCH", "").split(",")]:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(payload)
+    response["ETag"] = etag
+    response["Cache-Control"] = "public, max-age=%i" % settings.GRIDPUNX_API_MAX_AGE
+    return response
+
+
+@require_safe
+def api_who(request):
+    "Accounts currently online, with their character and location."
+    return _section_response(request, "who")
+
+
+@require_safe
+def api_rooms(request):
+    "Rooms with online characters in them, busiest first."
+    return _section_response(request, "rooms")
+
+
+@require_safe
+def api_economy(request):
+    "Aggregate gridbits statistics over all characters."
+    return _section_response(request, "economy", paginate=False)
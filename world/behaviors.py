@@ -0,0 +1,223 @@
+"""
+Behaviors
+
+One scheduler for the ambient behavior of every NPC (a gambler
+calling out to passers-by, a drunk wandering the streets), instead of
+a Script per NPC.
+
+An NPC typeclass lists its behaviors and how often (in seconds) each
+runs, and implements each as a `behavior_<name>` method:
+
+    class RealGamblerNPC(RealTalkingNPC):
+        behaviors = {"callout": 90}
+
+        def behavior_callout(self):
+            self.location.msg_contents("'Feeling lucky, punk?'")
+
+The method can return the delay until its next run instead of the
+usual interval, or False to stop running until the NPC is registered
+again. NPCs register themselves when they are loaded into memory
+(see `RealTalkingNPC.at_init`); an NPC that drops out of the cache
+unregisters on its next run, and registers again when it is loaded.
+
+Behaviors only run while a puppeted character is in the NPC's room
+(see world/zones.py); in an empty room the run is skipped and the
+behavior is rescheduled. Due behaviors are run in batches of at most
+`settings.GRIDPUNX_NPC_BATCH` per tick; the rest wait for the next
+tick.
+
+Scheduling is a hierarchical timing wheel: adding or rescheduling a
+behavior is O(1), a tick only looks at the behaviors due in it, and
+each scheduled behavior is one small slotted object.
+
+"""
+
+import random
+from collections import deque
+from time import perf_counter
+
+from django.conf import settings
+from twisted.internet.task import LoopingCall
+
+from evennia.utils import logger
+
+from world import metrics, zones
+
+
+class TimingWheel:
+    """
+    A hierarchical timing wheel of `levels` wheels with `slots` slots
+    each. Level 0 holds what is due in the next `slots` ticks, level 1
+    what is due in the next `slots ** 2`, and so on; entries cascade
+    down a level as their time comes closer. Delays beyond the top
+    level are cascaded again until they are in reach.
+
+    Entries are any objects with a writable `due` attribute.
+    """
+
+    def __init__(self, slots=64, levels=4):
+        self.slots = slots
+        self.levels = levels
+        self.now = 0
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+
+    def schedule(self, entry, ticks):
+        "Make `entry` due in `ticks` ticks (at least 1)."
+        entry.due = self.now + max(1, int(ticks))
+        self._place(entry)
+
+    def _place(self, entry):
+        delta = entry.due - self.now
+        level, span, width = 0, self.slots, 1
+        while delta >= span and level < self.levels - 1:
+            level += 1
+            width = span
+            span *= self.slots
+        self.wheels[level][(entry.due // width) % self.slots].append(entry)
+
+    def advance(self):
+        """
+        Move on one tick.
+
+        Returns:
+            due (list): The entries due in the new tick.
+        """
+        self.now += 1
+        now = self.now
+        width = self.slots
+        for level in range(1, self.levels):
+            if now % width:
+                break
+            wheel = self.wheels[level]
+            index = (now // width) % self.slots
+            bucket, wheel[index] = wheel[index], []
+            for entry in bucket:
+                self._place(entry)
+            width *= self.slots
+        wheel = self.wheels[0]
+        index = now % self.slots
+        due, wheel[index] = wheel[index], []
+        return due
+
+    def __len__(self):
+        return sum(len(bucket) for wheel in self.wheels for bucket in wheel)
+
+
+class _Scheduled:
+    "One behavior of one NPC."
+
+    __slots__ = ("npc_id", "name", "interval", "due", "cancelled")
+
+    def __init__(self, npc_id, name, interval):
+        self.npc_id = npc_id
+        self.name = name
+        self.interval = interval
+        self.due = 0
+        self.cancelled = False
+
+
+WHEEL = TimingWheel()
+# npc id -> its scheduled behaviors
+SCHEDULED = {}
+# Due behaviors not run yet (over the batch size).
+_DUE = deque()
+_LOOP = None
+_ObjectDB = None
+
+
+def _ticks(seconds):
+    return round(seconds / settings.GRIDPUNX_NPC_TICK)
+
+
+# ==============================================================
+# ==
+# == Registration
+# ==
+# ==============================================================
+
+def register(npc):
+    """
+    Schedule the behaviors of `npc`, replacing any scheduled before.
+    The first run of each is at a random point within its interval,
+    so NPCs loaded together do not all act in the same tick.
+    """
+    unregister(npc)
+    behaviors = getattr(npc, "behaviors", None)
+    if not behaviors:
+        return
+    scheduled = []
+    for name, interval in behaviors.items():
+        entry = _Scheduled(npc.id, name, interval)
+        WHEEL.schedule(entry, _ticks(random.uniform(0, interval)))
+        scheduled.append(entry)
+    SCHEDULED[npc.id] = scheduled
+
+
+def unregister(npc):
+    "Stop running the behaviors of `npc` (an object or id)."
+    npc_id = npc if isinstance(npc, int) else npc.id
+    # Cancelled entries are dropped from the wheel when they come due.
+    for entry in SCHEDULED.pop(npc_id, ()):
+        entry.cancelled = True
+
+
+# ==============================================================
+# ==
+# == Ticking
+# ==
+# ==============================================================
+
+def _run(entry):
+    global _ObjectDB
+    if _ObjectDB is None:
+        from evennia.objects.models import ObjectDB
+
+        _ObjectDB = ObjectDB
+    npc = _ObjectDB.get_cached_instance(entry.npc_id)
+    if npc is None:
+        # Deleted, or dropped out of the cache; it registers again
+        # when it is loaded.
+        unregister(entry.npc_id)
+        return
+    delay = entry.interval
+    if zones.PRESENT.get(getattr(npc.location, "id", None)):
+        try:
+            result = getattr(npc, "behavior_%s" % entry.name)()
+        except Exception:
+            logger.log_trace("NPC behavior '%s' of %s failed." % (entry.name, npc.dbref))
+            result = None
+        if result is False:
+            scheduled = SCHEDULED.get(entry.npc_id)
+            if scheduled and entry in scheduled:
+                scheduled.remove(entry)
+            return
+        if result is not None:
+            delay = result
+    WHEEL.schedule(entry, _ticks(delay))
+
+
+def tick():
+    "Run the behaviors due now, up to the batch size."
+    started = perf_counter()
+    _DUE.extend(WHEEL.advance())
+    for _ in range(min(settings.GRIDPUNX_NPC_BATCH, len(_DUE))):
+        entry = _DUE.popleft()
+        if not entry.cancelled:
+            _run(entry)
+    metrics.SCRIPT_TICK_SECONDS.observe(perf_counter() - started, "npc_behaviors")
+
+
+def start():
+    "Start the scheduler. Called from at_server_start."
+    global _LOOP
+    if _LOOP is None:
+        _LOOP = LoopingCall(tick)
+        _LOOP.start(settings.GRIDPUNX_NPC_TICK, now=False)
+
+
+def stop():
+    "Stop the scheduler. Called from at_server_stop."
+    global _LOOP
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
@@ -0,0 +1,452 @@
+"""
+Benchmarks
+
+Micro-benchmarks of the gridpunx hot paths, with results stored as
+JSON so a run can be checked against an earlier one:
+
+    cd gridpunx
+    python -m world.benchmarks --output benchmarks.json
+    python -m world.benchmarks --compare benchmarks.json --threshold 0.2
+
+Like `evennia test`, the suite runs against a throwaway test database
+(see `world.loadtest.setup_game()`). Every benchmark sets up its own
+objects and returns the operation to time; the runner repeats it for
+at least `--min-time` seconds and records the median and fastest wall
+time and the database queries per operation. With `--compare`, the
+run fails (exit status 1) if any benchmark's median got slower than
+the stored one by more than `--threshold` (a fraction, 0.2 = 20%).
+`-k <text>` only runs the benchmarks whose name contains the text.
+
+The channel fan-out comparison can also be run on its own from the
+game shell:
+
+    evennia shell
+    >>> from world import benchmarks
+    >>> print(benchmarks.report(benchmarks.channel_fanout()))
+
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from time import perf_counter
+from types import SimpleNamespace
+
+# A typical colored channel line.
+SAMPLE_CHANNEL_MESSAGE = "|w[|cOOC|w]|n |gNeoRunner|n says, \"|yAnyone seen the fixer at the |rDead Pixel|y?|n\""
+
+# Default allowed slowdown of a benchmark's median before it counts
+# as a regression.
+DEFAULT_THRESHOLD = 0.2
+
+# Registered benchmarks: (name, setup function, parameter).
+BENCHMARKS = []
+
+
+class BenchSession:
+    """
+    Stand-in for a connected session that only records what it is
+    sent. Cycles through telnet (xterm256 and ansi) and webclient
+    clients so all send paths are exercised.
+    """
+
+    _KINDS = (
+        ("telnet", {"TTYPE": True, "XTERM256": True, "ANSI": True}),
+        ("telnet", {"TTYPE": True, "XTERM256": False, "ANSI": True}),
+        ("webclient/websocket", {}),
+    )
+
+    def __init__(self, sessid):
+        self.sessid = sessid
+        self.uid = sessid
+        self.logged_in = True
+        self.protocol_key, self.protocol_flags = self._KINDS[sessid % len(self._KINDS)]
+        self.sent = 0
+
+    def msg(self, text=None, **kwargs):
+        self.sent += 1
+
+
+def channel_fanout(counts=(10, 100, 500, 1000), messages=20, text=SAMPLE_CHANNEL_MESSAGE):
+    """
+    Time sending a channel message to growing numbers of subscribers,
+    once with per-capability pre-rendering (as `Channel` does) and once
+    parsing the message per receiver (what the Portal does for every
+    session on the default path).
+
+    Returns:
+        rows (list): One dict per subscriber count, with milliseconds
+            per message for both paths.
+    """
+    from evennia.utils.ansi import parse_ansi
+    from world.rendering import broadcast
+
+    rows = []
+    for num in counts:
+        sessions = [BenchSession(i) for i in range(num)]
+
+        started = perf_counter()
+        for _ in range(messages):
+            broadcast(sessions, text, from_channel=1)
+        rendered = (perf_counter() - started) / messages
+
+        started = perf_counter()
+        for _ in range(messages):
+            for session in sessions:
+                session.msg(text=parse_ansi(text + "|n", xterm256=True), options={"from_channel": 1})
+        per_session = (perf_counter() - started) / messages
+
+        rows.append(
+            {
+                "subscribers": num,
+                "rendered_ms": rendered * 1000,
+                "per_session_ms": per_session * 1000,
+            }
+        )
+    return rows
+
+
+def report(rows):
+    "Format benchmark rows as a text table."
+    if not rows:
+        return ""
+    keys = list(rows[0])
+    lines = ["  ".join("%16s" % key for key in keys)]
+    for row in rows:
+        lines.append(
+            "  ".join(
+                "%16.3f" % row[key] if isinstance(row[key], float) else "%16s" % row[key]
+                for key in keys
+            )
+        )
+    return "\n".join(lines)
+
+
+# ==============================================================
+# ==
+# == Fixtures
+# ==
+# ==============================================================
+
+def benchmark(*params):
+    """
+    Register a benchmark. The decorated function is called as
+    `setup(param)` (or `setup()` without parameters) once per
+    parameter and returns `(operation, reset)`: the callable to time
+    and a callable (or None) run, untimed, after every operation.
+    """
+
+    def _register(setup):
+        name = setup.__name__.replace("bench_", "", 1)
+        for param in params or (None,):
+            BENCHMARKS.append(
+                ("%s[%s]" % (name, param) if params else name, setup, param)
+            )
+        return setup
+
+    return _register
+
+
+def _create(typeclass, key, location=None, **kwargs):
+    from evennia.utils import create
+
+    return create.create_object(typeclass, key=key, location=location, home=location, **kwargs)
+
+
+def _room(key, occupants=1, things=0):
+    """
+    Create a street room with `occupants` characters and `things`
+    items on the ground. Returns the room and its characters; the
+    first character is the one acting, and counts as a player present
+    in the room (see world/zones.py).
+    """
+    from django.conf import settings
+    from world import zones
+
+    room = _create("typeclasses.rooms.RealOutside", key)
+    chars = [
+        _create(settings.BASE_CHARACTER_TYPECLASS, "runner %i" % num, room)
+        for num in range(occupants)
+    ]
+    for num in range(things):
+        _create("typeclasses.objects.RealItem", "junk %i" % num, room)
+    zones.arrived(room, chars[0])
+    return room, chars
+
+
+def _command(cmdclass, caller, raw, obj=None):
+    """
+    Returns a callable running the command line `raw` through
+    `cmdclass` for `caller`, calling the same hooks, in the same
+    order, as the command handler.
+    """
+    cmdname, _, args = raw.partition(" ")
+
+    def _run():
+        cmd = cmdclass()
+        cmd.caller = caller
+        cmd.obj = obj or caller
+        cmd.cmdname = cmd.cmdstring = cmdname
+        cmd.args = " " + args if args else ""
+        cmd.raw_string = raw
+        cmd.cmdset = cmd.session = cmd.account = None
+        if cmd.at_pre_cmd():
+            return
+        cmd.parse()
+        cmd.func()
+        cmd.at_post_cmd()
+
+    return _run
+
+
+# ==============================================================
+# ==
+# == Benchmarks
+# ==
+# ==============================================================
+
+@benchmark(1, 10, 100, 500)
+def bench_harsh_climate(occupants):
+    "One climate tick in a room with `occupants` unprotected characters."
+    from world import climate
+
+    room, _ = _room("climate %i" % occupants, occupants=occupants)
+    return lambda: climate.harsh_climate(room), None
+
+
+@benchmark(10, 100, 500)
+def bench_cmd_get(things):
+    "Take an item out of a crate, with `things` items in the crate and on the ground."
+    from commands.modified import CmdGet
+
+    room, (char,) = _room("get %i" % things, things=things)
+    crate = _create("typeclasses.objects.RealContainer", "crate", room)
+    for num in range(things):
+        _create("typeclasses.objects.RealItem", "chip %i" % num, crate)
+    keycard = _create("typeclasses.objects.RealItem", "keycard", crate)
+
+    def _reset():
+        keycard.move_to(crate, quiet=True)
+
+    return _command(CmdGet, char, "get keycard -from crate"), _reset
+
+
+@benchmark(10, 100, 500)
+def bench_cmd_give(things):
+    "Give an item to another character, with `things` items carried and on the ground."
+    from commands.modified import CmdGive
+
+    room, (char, fixer) = _room("give %i" % things, occupants=2, things=things)
+    for num in range(things):
+        _create("typeclasses.objects.RealItem", "chip %i" % num, char)
+    keycard = _create("typeclasses.objects.RealItem", "keycard", char)
+
+    def _reset():
+        keycard.move_to(char, quiet=True)
+
+    return _command(CmdGive, char, "give keycard -to %s" % fixer.key), _reset
+
+
+@benchmark()
+def bench_cmd_talk():
+    "Strike up a conversation with the gambler (menu startup)."
+    from typeclasses.npc import CmdTalk
+
+    room, (char,) = _room("talk")
+    gambler = _create("typeclasses.npcs.gambler.RealGamblerNPC", "gambler", room)
+
+    def _reset():
+        menu = char.ndb._menutree
+        if menu:
+            menu.close_menu()
+
+    return _command(CmdTalk, char, "talk", obj=gambler), _reset
+
+
+@benchmark()
+def bench_duodo_shoot():
+    "One round of duodo dice, betting on any doubles."
+    from typeclasses.npcs.gambler import _duodo_shoot
+
+    room, (char,) = _room("duodo", occupants=5)
+    char.db.gridbits = 10 ** 9
+    char.ndb._menutree = SimpleNamespace(player_bet={"doubles": "any", "payout": 2, "wager": 1})
+    return (lambda: _duodo_shoot(char, "")), None
+
+
+@benchmark("cached", "uncached")
+def bench_get_condition(mode):
+    "An object's condition, cached or recomputed."
+    room, _ = _room("condition %s" % mode)
+    item = _create("typeclasses.objects.RealItem", "chip", room)
+    return item.get_condition, item.reset_condition if mode == "uncached" else None
+
+
+@benchmark("cached", "uncached")
+def bench_room_appearance(mode):
+    "Looking at a room with 50 items and 5 characters."
+    room, (char, *_) = _room("appearance %s" % mode, occupants=5, things=50)
+    reset = room.invalidate_appearance if mode == "uncached" else None
+    return (lambda: room.return_appearance(char)), reset
+
+
+@benchmark()
+def bench_object_appearance():
+    "Looking at an item (description and condition)."
+    room, (char,) = _room("object appearance")
+    item = _create("typeclasses.objects.RealItem", "chip", room)
+    item.db.desc = "A worn credit chip."
+    return (lambda: item.return_appearance(char)), None
+
+
+@benchmark(100, 1000)
+def bench_channel_fanout(subscribers):
+    "Pre-render and send a channel message to `subscribers` sessions."
+    from world.rendering import broadcast
+
+    sessions = [BenchSession(i) for i in range(subscribers)]
+    return (lambda: broadcast(sessions, SAMPLE_CHANNEL_MESSAGE, from_channel=1)), None
+
+
+# ==============================================================
+# ==
+# == Running and comparing
+# ==
+# ==============================================================
+
+def measure(operation, reset=None, min_time=1.0, min_rounds=5, warmup=3):
+    """
+    Time `operation` until at least `min_time` seconds and
+    `min_rounds` rounds have passed, after `warmup` untimed rounds.
+
+    Returns:
+        result (dict): Median and fastest milliseconds per operation,
+            rounds run and database queries per operation.
+    """
+    from world import metrics
+
+    for _ in range(warmup):
+        operation()
+        if reset:
+            reset()
+    times, queries = [], 0
+    while sum(times) < min_time or len(times) < min_rounds:
+        before = metrics.query_count()
+        started = perf_counter()
+        operation()
+        times.append(perf_counter() - started)
+        queries += metrics.query_count() - before
+        if reset:
+            reset()
+    times.sort()
+    return {
+        "median_ms": times[len(times) // 2] * 1000,
+        "min_ms": times[0] * 1000,
+        "rounds": len(times),
+        "queries": queries / len(times),
+    }
+
+
+def run(select=None, min_time=1.0, seed=0, use_sqlite=False):
+    """
+    Run the benchmarks whose name contains `select` (default all).
+    Must be the only thing running in this process: it sets up Django
+    and Evennia against a test database.
+
+    Returns:
+        results (dict): `measure()` results by benchmark name.
+    """
+    from world.loadtest import setup_game, teardown_game
+
+    old_name = setup_game(use_sqlite)
+    try:
+        from evennia.server.sessionhandler import SESSION_HANDLER
+
+        from world import metrics
+
+        metrics.install_query_counter()
+        # No Portal to send to.
+        SESSION_HANDLER.data_out = lambda session, **kwargs: None
+        results = {}
+        for name, setup, param in BENCHMARKS:
+            if select and select not in name:
+                continue
+            random.seed(seed)
+            operation, reset = setup() if param is None else setup(param)
+            results[name] = measure(operation, reset, min_time=min_time)
+        return results
+    finally:
+        teardown_game(old_name)
+
+
+def compare(current, previous, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two sets of results.
+
+    Returns:
+        regressions (list): `(name, old median, new median)` of the
+            benchmarks whose median grew by more than `threshold`.
+    """
+    regressions = []
+    for name, result in current.items():
+        old = previous.get(name)
+        if old and result["median_ms"] > old["median_ms"] * (1 + threshold):
+            regressions.append((name, old["median_ms"], result["median_ms"]))
+    return regressions
+
+
+def format_results(results, previous=None):
+    "Returns a text table of results, with the change against `previous`."
+    previous = previous or {}
+    lines = ["%-26s %12s %12s %8s %9s %9s" % ("benchmark", "median(ms)", "min(ms)", "rounds", "queries", "change")]
+    for name, result in results.items():
+        old = previous.get(name)
+        change = (
+            "%+8.1f%%" % ((result["median_ms"] - old["median_ms"]) / old["median_ms"] * 100)
+            if old and old["median_ms"]
+            else ""
+        )
+        lines.append(
+            "%-26s %12.4f %12.4f %8i %9.1f %9s"
+            % (name, result["median_ms"], result["min_ms"], result["rounds"], result["queries"], change)
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gridpunx micro-benchmarks")
+    parser.add_argument("-k", dest="select", help="only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="seconds to spend timing each benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sqlite", action="store_true", help="use an in-memory SQLite database")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of a median before failing (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.select, args.min_time, args.seed, args.sqlite)
+    previous = {}
+    if args.compare:
+        with open(args.compare) as fil:
+            stored = json.load(fil)
+        previous = stored["results"]
+        print("Compared with %s (%s):" % (args.compare, stored.get("date", "?")))
+    print(format_results(results, previous))
+    if args.output:
+        with open(args.output, "w") as fil:
+            json.dump(
+                {"date": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results},
+                fil, indent=2, sort_keys=True,
+            )
+    regressions = compare(results, previous, args.threshold)
+    for name, old, new in regressions:
+        print("REGRESSION %s: %.4fms -> %.4fms" % (name, old, new))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Builder
+
+Bulk world loader. Reads a declarative world file (JSON) and creates
+its rooms, exits and objects in one database transaction.
+
+A world file looks like this:
+
+    {
+        "district": "old_town",
+        "rooms": [
+            {"id": "plaza", "key": "Neon Plaza",
+             "typeclass": "typeclasses.rooms.RealOutside",
+             "desc": "Holo-ads flicker over the wet concrete."},
+            {"id": "bar", "key": "The Dead Pixel",
+             "typeclass": "typeclasses.rooms.RealInside"}
+        ],
+        "exits": [
+            {"id": "plaza-bar", "key": "bar", "aliases": ["in"],
+             "location": "plaza", "destination": "bar"},
+            {"id": "bar-plaza", "key": "out", "location": "bar",
+             "destination": "plaza"}
+        ],
+        "objects": [
+            {"id": "bar-gambler", "key": "gambler",
+             "typeclass": "typeclasses.npcs.gambler.RealGamblerNPC",
+             "location": "bar"},
+            {"id": "bar-crate", "key": "crate",
+             "typeclass": "typeclasses.objects.RealContainer",
+             "location": "bar", "attributes": {"damage": 4}}
+        ]
+    }
+
+Every entry needs a unique `id`; `location` and `destination` refer to
+ids declared earlier in the file (objects may be placed inside objects
+listed before them). Optional keys are `typeclass`, `desc`, `aliases`,
+`locks`, `tags` (strings or `[key, category]` pairs) and `attributes`.
+Each created object is tagged with its id (category `world_id`) and
+the district (category `district`), so that it can be found again
+when the world file changes.
+
+Objects are created through Evennia's spawner batch path inside a
+single transaction: nothing is committed until the whole file has been
+built, and hook work deferred with `transaction.on_commit` (such as a
+`RealThing` joining The Grid) runs only once the build has succeeded.
+
+The creation hooks themselves are not deferred. Evennia runs
+`at_object_creation` as part of an object's first save, before the
+Attributes given here are applied, and the typeclasses set their
+defaults (and locks) there; skipping it would leave objects built from
+a file different from ones made with `@create`. What the hooks cost is
+their Attribute writes, which share the build's transaction instead of
+committing one by one. Values given in the file overwrite the hook
+defaults.
+
+Parsing and validating (`load_world()`) only touch the file and is
+declared offloadable (see world/offload.py); `build_world()` must run
+on the reactor thread.
+
+"""
+
+import json
+from time import perf_counter
+
+from django.conf import settings
+from django.db import transaction
+from evennia.prototypes.spawner import batch_create_object
+from evennia.utils import logger
+from evennia.utils.idmapper.models import flush_cache
+
+from world import offload
+
+# Tag categories used to find built objects again.
+WORLD_ID_CATEGORY = "world_id"
+DISTRICT_CATEGORY = "district"
+
+# Objects are created (and progress reported) in batches of this size.
+BATCH_SIZE = 250
+
+# Default typeclass per section of the world file.
+SECTIONS = (
+    ("rooms", "BASE_ROOM_TYPECLASS"),
+    ("exits", "BASE_EXIT_TYPECLASS"),
+    ("objects", "BASE_OBJECT_TYPECLASS"),
+)
+
+
+class WorldFileError(ValueError):
+    """
+    Raised when a world file is malformed.
+    """
+
+    pass
+
+
+# ==============================================================
+# ==
+# == Loading and validation
+# ==
+# ==============================================================
+
+def validate_world(data):
+    """
+    Check and normalize world data.
+
+    Args:
+        data (dict): Parsed world file.
+
+    Returns:
+        world (dict): The data with `district` set and every entry
+            carrying `section` and `typeclass`.
+
+    Raises:
+        WorldFileError: If the data is malformed.
+    """
+    if not isinstance(data, dict):
+        raise WorldFileError("A world file must contain a JSON object.")
+    seen = {}
+    for section, typeclass_setting in SECTIONS:
+        entries = data.setdefault(section, [])
+        if not isinstance(entries, list):
+            raise WorldFileError("'%s' must be a list." % section)
+        for num, entry in enumerate(entries):
+            where = "%s[%i]" % (section, num)
+            if not isinstance(entry, dict) or not entry.get("id") or not entry.get("key"):
+                raise WorldFileError("%s: every entry needs an 'id' and a 'key'." % where)
+            if entry["id"] in seen:
+                raise WorldFileError("%s: duplicate id '%s'." % (where, entry["id"]))
+            if section == "rooms" and entry.get("location"):
+                raise WorldFileError("%s: rooms cannot have a location." % where)
+            if section != "rooms" and entry.get("location") not in seen:
+                raise WorldFileError(
+                    "%s: location '%s' must be declared before it." % (where, entry.get("location"))
+                )
+            if section == "exits" and seen.get(entry.get("destination")) != "rooms":
+                raise WorldFileError(
+                    "%s: destination '%s' is not a room." % (where, entry.get("destination"))
+                )
+            if not isinstance(entry.get("attributes", {}), dict):
+                raise WorldFileError("%s: 'attributes' must be an object." % where)
+            entry["section"] = section
+            entry.setdefault("typeclass", getattr(settings, typeclass_setting))
+            seen[entry["id"]] = section
+    data.setdefault("district", None)
+    return data
+
+
+@offload.offloadable(offload.BATCH)
+def load_world(path):
+    """
+    Read and validate a world file. Touches no game state, so it is
+    safe to call off the reactor thread.
+
+    Raises:
+        WorldFileError: If the file cannot be read or is malformed.
+    """
+    try:
+        with open(path, encoding="utf-8") as fil:
+            data = json.load(fil)
+    except (OSError, ValueError) as err:
+        raise WorldFileError("Could not read world file %s: %s" % (path, err))
+    return validate_world(data)
+
+
+# ==============================================================
+# ==
+# == Building
+# ==
+# ==============================================================
+
+def entry_tags(entry, district):
+    "The tags an entry's object should carry."
+    tags = [(entry["id"], WORLD_ID_CATEGORY)]
+    if district:
+        tags.append((district, DISTRICT_CATEGORY))
+    for tag in entry.get("tags", ()):
+        tags.append(tuple(tag) if isinstance(tag, (list, tuple)) else (tag, None))
+    return tags
+
+
+def entry_attributes(entry):
+    "The Attributes an entry's object should carry, as (key, value) tuples."
+    attributes = dict(entry.get("attributes", {}))
+    if "desc" in entry:
+        attributes["desc"] = entry["desc"]
+    return list(attributes.items())
+
+
+def entry_objparams(entry, built, district):
+    """
+    Build the spawner parameter tuple for one entry. `built` maps the
+    ids created so far to their objects.
+    """
+    location = built.get(entry.get("location"))
+    create_kwargs = {
+        "db_key": entry["key"],
+        "db_typeclass_path": entry["typeclass"],
+        "db_location": location,
+        # things go home to the room they were built in
+        "db_home": location if location and entry["section"] != "exits" else None,
+        "db_destination": built.get(entry.get("destination")),
+    }
+    return (
+        create_kwargs,
+        [],  # permissions
+        entry.get("locks", ""),
+        entry.get("aliases", []),
+        [],  # nattributes
+        entry_attributes(entry),
+        entry_tags(entry, district),
+        [],  # execs
+    )
+
+
+def receive_created(objs):
+    """
+    Have the locations of objects made with `batch_create_object` take
+    them in. The batch path runs no move hooks, so without this cached
+    room appearances and container totals would miss the new objects.
+    """
+    for obj in objs:
+        if obj.location:
+            obj.location.at_object_receive(obj, None)
+
+
+def build_world(world, report=None):
+    """
+    Create everything in validated world data in one transaction.
+
+    Args:
+        world (dict): Output of `load_world()` or `validate_world()`.
+        report (callable, optional): Called with progress strings.
+            Defaults to the server log.
+
+    Returns:
+        built (dict): Maps world ids to the created objects.
+
+    """
+    report = report or logger.log_info
+    entries = [entry for section, _ in SECTIONS for entry in world[section]]
+    total = len(entries)
+    district = world["district"]
+    built = {}
+    started = perf_counter()
+    report("Building %i objects%s ..." % (total, " for '%s'" % district if district else ""))
+
+    def _flush(batch):
+        objs = batch_create_object(*[entry_objparams(entry, built, district) for entry in batch])
+        for entry, obj in zip(batch, objs):
+            built[entry["id"]] = obj
+        receive_created(objs)
+        num = len(built)
+        if num // BATCH_SIZE != (num - len(batch)) // BATCH_SIZE or num == total:
+            report("  %i/%i objects (%.0f/s)" % (num, total, num / (perf_counter() - started)))
+
+    try:
+        with transaction.atomic():
+            batch, pending = [], set()
+            for entry in entries:
+                # An entry placed in (or leading to) an object of the
+                # current batch has to wait for that batch to exist.
+                if (
+                    entry.get("location") in pending
+                    or entry.get("destination") in pending
+                    or len(batch) >= BATCH_SIZE
+                ):
+                    _flush(batch)
+                    batch, pending = [], set()
+                batch.append(entry)
+                pending.add(entry["id"])
+            if batch:
+                _flush(batch)
+    except Exception:
+        # The database rolled back; drop the now-stale cached instances.
+        flush_cache()
+        raise
+    elapsed = perf_counter() - started
+    report(
+        "Built %i objects in %.2fs (%.0f objects/s)."
+        % (total, elapsed, total / elapsed if elapsed else total)
+    )
+    return built
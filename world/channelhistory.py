@@ -0,0 +1,156 @@
+"""
+Channel history
+
+In-memory history and batched log archiving for channels.
+
+Every channel keeps its last messages in a ring buffer (a bounded
+deque), so recent chatter can be replayed to someone who just joined
+or reconnected without reading log files or the database. The buffers
+are carried over reloads (see world/hotstate.py).
+
+Channels that keep a log (their `keep_log` setting) do not write every
+message to their log file as it is sent. Lines are queued here instead
+and appended in one go per file every
+`settings.GRIDPUNX_CHANNEL_ARCHIVE_INTERVAL` seconds, in a worker
+thread of the batch lane (see world/offload.py); when the lane is too
+busy to take them, they wait for the next flush. Ephemeral channels
+(`channel.db.ephemeral = True`) are never logged at all; they only
+have their ring buffer.
+
+"""
+
+import os
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from twisted.internet.task import LoopingCall
+
+from evennia.utils import logger
+
+from world import offload
+
+# channel id -> deque of (timestamp, message)
+HISTORY = {}
+# log file name -> pending lines
+_PENDING = defaultdict(list)
+_LOOP = None
+
+
+# ==============================================================
+# ==
+# == Ring buffers
+# ==
+# ==============================================================
+
+def record(channel, message, size=None):
+    """
+    Remember a message sent to `channel`.
+
+    Args:
+        channel (Channel): The channel.
+        message (str): The message as sent to the listeners.
+        size (int, optional): The number of messages kept for this
+            channel. Defaults to `settings.GRIDPUNX_CHANNEL_HISTORY`.
+    """
+    size = size or settings.GRIDPUNX_CHANNEL_HISTORY
+    history = HISTORY.get(channel.id)
+    if history is None or history.maxlen != size:
+        history = HISTORY[channel.id] = deque(history or (), maxlen=size)
+    history.append((time.time(), message))
+
+
+def recent(channel, num=None):
+    """
+    Returns the last `num` (default all kept) `(timestamp, message)`
+    entries of `channel`, oldest first.
+    """
+    history = HISTORY.get(channel.id, ())
+    if num is None or num >= len(history):
+        return list(history)
+    return list(history)[-num:]
+
+
+def forget(channel):
+    "Drop the history of a channel."
+    HISTORY.pop(channel.id, None)
+
+
+def dump_state():
+    "Hot state provider: the ring buffers."
+    return {chan_id: (history.maxlen, list(history)) for chan_id, history in HISTORY.items()}
+
+
+def load_state(state):
+    "Hot state provider: restore the ring buffers."
+    for chan_id, (size, entries) in state.items():
+        HISTORY[chan_id] = deque(entries, maxlen=size)
+
+
+# ==============================================================
+# ==
+# == Batched archive
+# ==
+# ==============================================================
+
+def archive(filename, message):
+    "Queue a message for the channel log file `filename`."
+    _PENDING[filename].append(
+        "%s %s\n" % (time.strftime("%Y-%m-%d %H:%M:%S"), message.replace("\n", " "))
+    )
+
+
+@offload.offloadable(offload.BATCH)
+def _write(batches):
+    "Append the batched lines to their files. Runs in a worker thread."
+    for filename, lines in batches.items():
+        path = os.path.join(settings.LOG_DIR, filename)
+        with open(path, "a", encoding="utf-8") as fil:
+            fil.writelines(lines)
+
+
+def flush(threaded=True):
+    """
+    Write all queued lines, one append per log file.
+
+    Args:
+        threaded (bool): Write in a worker thread (the default) or
+            right away, like at server stop.
+    """
+    if not _PENDING:
+        return
+    batches = dict(_PENDING)
+    _PENDING.clear()
+    if threaded:
+        offload.run(_write, batches).addErrback(_failed, batches)
+    else:
+        _write(batches)
+
+
+def _failed(failure, batches):
+    """
+    A busy batch lane refused the write: queue the lines again, ahead
+    of anything newer, for the next flush. Other failures are logged.
+    """
+    if failure.check(offload.OffloadBusy):
+        for filename, lines in batches.items():
+            _PENDING[filename][:0] = lines
+        return
+    logger.log_err("Channel archive failed: %s" % failure.getErrorMessage())
+
+
+def start():
+    "Start the archive writer. Called from at_server_start."
+    global _LOOP
+    if _LOOP is None:
+        _LOOP = LoopingCall(flush)
+        _LOOP.start(settings.GRIDPUNX_CHANNEL_ARCHIVE_INTERVAL, now=False)
+
+
+def stop():
+    "Stop the archive writer and write what is left. Called from at_server_stop."
+    global _LOOP
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
+    flush(threaded=False)
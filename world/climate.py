@@ -0,0 +1,99 @@
+"""
+Climate
+
+The harsh climate of the rooms outside, run per zone.
+
+Every room whose typeclass sets `harsh_climate` (see `RealOutside`)
+harms the unprotected humans in it at regular intervals. Instead of a
+Script per room, one zone ticker (see world/zones.py) handles every
+active zone once per `settings.GRIDPUNX_CLIMATE_INTERVAL` seconds,
+with the zones spread over the ticker's slots. Inactive zones (no
+puppeted character in any of their rooms) cost nothing.
+
+    from world import climate
+
+    climate.harsh_climate(room)   # one climate tick in a room, now
+
+"""
+
+import random
+from time import perf_counter
+
+from django.conf import settings
+
+from world import events, metrics, zones
+
+_TICKER = None
+
+
+def harsh_climate(room):
+    "One climate tick in `room`: foul air, and damage to unprotected humans."
+    rand = random.random()
+    if rand < 0.5:
+        climate_damage = 2
+        climate_message = "Foul air of the concrete jungle lingers around you."
+    elif rand < 0.8:
+        climate_damage = 4
+        climate_message = "The already dense smog thickens some more."
+    else:
+        climate_damage = 8
+        climate_message = "A gentle breeze brings in some more toxic industrial fumes."
+
+    # send the climate_message string to everyone inside the room
+    room.msg_contents(climate_message)
+
+    # Damage all unprotected humans in the room:
+    # Loop through all objects in room.
+    harmed = []
+    for list_item in room.contents:
+        if list_item.db.is_human == True:
+            # Check if it's a human and if they have protection from climate damage
+            if list_item.get_climate_protection() == True:
+                # Let protected humans know they avoided damage.
+                list_item.msg("Fortunately, you have climate protection and aren't harmed.")
+            else:
+                # Hurt unprotected humans, and then let them know how much it hurts.
+                list_item.db.hitpoints -= climate_damage
+                list_item.msg("You take " + str(climate_damage) + " damage.")
+                harmed.append(list_item)
+    events.emit(events.ClimateTick, room, climate_damage, harmed)
+
+
+def _rooms(room_ids):
+    "The rooms with the given ids; those not in memory are loaded with one query."
+    from evennia.objects.models import ObjectDB
+
+    rooms, missing = [], []
+    for room_id in room_ids:
+        room = ObjectDB.get_cached_instance(room_id)
+        if room is None:
+            missing.append(room_id)
+        else:
+            rooms.append(room)
+    if missing:
+        rooms.extend(ObjectDB.objects.filter(id__in=missing))
+    return rooms
+
+
+def tick(zone, room_ids):
+    "Zone ticker handler: a climate tick in the harsh rooms of an active zone."
+    started = perf_counter()
+    for room in _rooms(room_ids):
+        if getattr(room, "harsh_climate", False):
+            harsh_climate(room)
+    metrics.SCRIPT_TICK_SECONDS.observe(perf_counter() - started, "harsh_climate")
+
+
+def start():
+    "Start the climate ticker. Called from at_server_start."
+    global _TICKER
+    if _TICKER is None:
+        _TICKER = zones.ZoneTicker("harsh_climate", settings.GRIDPUNX_CLIMATE_INTERVAL, tick).start()
+
+
+def stop():
+    "Stop the climate ticker. Called from at_server_stop (zones.stop() also does)."
+    global _TICKER
+    if _TICKER is not None:
+        _TICKER.stop()
+    _TICKER = None
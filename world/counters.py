@@ -0,0 +1,215 @@
+"""
+Counters
+
+An incrementally maintained registry of world object counts, used to
+fill the MSSP table in `server/conf/mssp.py`.
+
+The registry lives in the Server process. It is seeded with one
+aggregate query at server start and then kept current by Django
+signals as objects and help entries are created and deleted, so
+reading a count never touches the database.
+
+MSSP requests are answered by the Portal, which is a separate
+process. The Server therefore publishes the counts to a small JSON
+file (only when they have changed), and the Portal keeps its own
+in-memory copy of that file, checking it for changes at most every
+few seconds. Crawler hits are answered from memory no matter how
+often they arrive.
+
+"""
+
+import json
+import os
+import time
+
+from django.conf import settings
+
+# Where the Server publishes counts for the Portal to read.
+PUBLISH_FILE = os.path.join(settings.GAME_DIR, "server", "mssp_counts.json")
+
+# Typeclass parents used to sort objects into MSSP categories. The
+# first matching parent wins; anything else counts as an object.
+CATEGORY_PARENTS = (
+    ("rooms", "evennia.objects.objects.DefaultRoom"),
+    ("exits", "evennia.objects.objects.DefaultExit"),
+    ("characters", "evennia.objects.objects.DefaultCharacter"),
+    ("mobiles", "typeclasses.npc.RealTalkingNPC"),
+)
+
+# Server-side state: object counts per typeclass path, help entry
+# count and a cache of typeclass path -> category.
+BY_TYPECLASS = {}
+HELPFILES = [0]
+_CATEGORIES = {}
+_DIRTY = [True]
+_LOOP = None
+
+# Model classes, imported in start() (the Portal never needs them).
+_ObjectDB = None
+_HelpEntry = None
+
+
+# ==============================================================
+# ==
+# == Server side - counting
+# ==
+# ==============================================================
+
+def category(typeclass_path):
+    """
+    Returns the MSSP category of objects with the given typeclass
+    path. Results are cached per path.
+    """
+    cat = _CATEGORIES.get(typeclass_path)
+    if cat is None:
+        from evennia.utils.utils import class_from_module, inherits_from
+
+        cat = "objects"
+        try:
+            typeclass = class_from_module(typeclass_path)
+        except ImportError:
+            typeclass = None
+        if typeclass:
+            for name, parent in CATEGORY_PARENTS:
+                if inherits_from(typeclass, parent):
+                    cat = name
+                    break
+        _CATEGORIES[typeclass_path] = cat
+    return cat
+
+
+def counts():
+    """
+    Returns a dict of object counts per category, plus `helpfiles`.
+    """
+    totals = {name: 0 for name, _ in CATEGORY_PARENTS}
+    totals["objects"] = 0
+    for path, num in list(BY_TYPECLASS.items()):
+        cat = category(path)
+        totals[cat] = totals.get(cat, 0) + num
+    totals["helpfiles"] = HELPFILES[0]
+    return totals
+
+
+def _change(typeclass_path, delta):
+    BY_TYPECLASS[typeclass_path] = BY_TYPECLASS.get(typeclass_path, 0) + delta
+    _DIRTY[0] = True
+
+
+def _on_post_save(sender, instance, created=False, raw=False, **kwargs):
+    if not created or raw:
+        return
+    if isinstance(instance, _ObjectDB):
+        _change(instance.db_typeclass_path, 1)
+    elif isinstance(instance, _HelpEntry):
+        HELPFILES[0] += 1
+        _DIRTY[0] = True
+
+
+def _on_post_delete(sender, instance, **kwargs):
+    if isinstance(instance, _ObjectDB):
+        _change(instance.db_typeclass_path, -1)
+    elif isinstance(instance, _HelpEntry):
+        HELPFILES[0] -= 1
+        _DIRTY[0] = True
+
+
+def seed():
+    """
+    Rebuild the registry from the database with one aggregate query
+    per model. Called at server start.
+    """
+    from django.db.models import Count
+
+    BY_TYPECLASS.clear()
+    for row in _ObjectDB.objects.values("db_typeclass_path").annotate(num=Count("id")):
+        BY_TYPECLASS[row["db_typeclass_path"]] = row["num"]
+    HELPFILES[0] = _HelpEntry.objects.count()
+    _DIRTY[0] = True
+
+
+def publish():
+    """
+    Write the current counts to PUBLISH_FILE if they changed since
+    the last write. The file is replaced atomically.
+    """
+    if not _DIRTY[0]:
+        return
+    _DIRTY[0] = False
+    tmpfile = PUBLISH_FILE + ".tmp"
+    with open(tmpfile, "w") as fil:
+        json.dump(counts(), fil)
+    os.replace(tmpfile, PUBLISH_FILE)
+
+
+def start():
+    """
+    Seed the registry, connect the signals and start publishing.
+    Called from at_server_start.
+    """
+    global _LOOP, _ObjectDB, _HelpEntry
+    from django.db.models.signals import post_delete, post_save
+    from twisted.internet.task import LoopingCall
+    from evennia.help.models import HelpEntry
+    from evennia.objects.models import ObjectDB
+
+    _ObjectDB, _HelpEntry = ObjectDB, HelpEntry
+    seed()
+    post_save.connect(_on_post_save, dispatch_uid="gridpunx_counters_save")
+    post_delete.connect(_on_post_delete, dispatch_uid="gridpunx_counters_delete")
+    if _LOOP is None:
+        _LOOP = LoopingCall(publish)
+        _LOOP.start(settings.GRIDPUNX_MSSP_PUBLISH_INTERVAL, now=True)
+
+
+def stop():
+    "Publish a final time and stop the loop. Called from at_server_stop."
+    global _LOOP
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
+    publish()
+
+
+# ==============================================================
+# ==
+# == Portal side - reading
+# ==
+# ==============================================================
+
+_PUBLISHED = {"counts": {}, "mtime": None, "checked": 0.0}
+
+# How often (seconds) the Portal checks the published file for changes.
+_CHECK_INTERVAL = 10.0
+
+
+def published_counts():
+    """
+    Returns the counts last published by the Server. The file is only
+    stat'ed once every `_CHECK_INTERVAL` seconds and only re-read if it
+    changed.
+    """
+    now = time.time()
+    if now - _PUBLISHED["checked"] >= _CHECK_INTERVAL:
+        _PUBLISHED["checked"] = now
+        try:
+            mtime = os.stat(PUBLISH_FILE).st_mtime
+            if mtime != _PUBLISHED["mtime"]:
+                with open(PUBLISH_FILE) as fil:
+                    _PUBLISHED["counts"] = json.load(fil)
+                _PUBLISHED["mtime"] = mtime
+        except (OSError, ValueError):
+            pass
+    return _PUBLISHED["counts"]
+
+
+def published_count(name):
+    """
+    Returns a callable suitable as an MSSP table value. Evennia calls
+    it for every crawler request.
+    """
+
+    def _count():
+        return str(published_counts().get(name, 0))
+
+    return _count
@@ -0,0 +1,103 @@
+"""
+Derived caches
+
+Keeps the `ndb` caches derived from Attributes and object fields
+current, however they are written: through a typeclass property,
+`obj.db`, `@set`, `@name`, `@lock`, the spawner or a world file.
+
+Caches are declared by the Attribute keys they are derived from:
+
+    ATTRIBUTE_CACHES = {"hitpoints": ("condition",), ...}
+
+When an Attribute with one of these keys (and no category) is saved or
+deleted, the listed ndb entries of the objects owning it are cleared,
+if those objects are in memory; when Attributes are added to or
+removed from an object, all of its listed entries are. The caches
+themselves only check for None on a read.
+
+Saving or deleting one of these Attributes costs one extra query, to
+find its owners. Other Attributes cost nothing.
+
+Renaming an object, or changing its locks, clears the cached header of
+its appearance (for rooms) and the cached contents section of the room
+it is in, since it may now be listed differently or not at all.
+
+"""
+
+from itertools import chain
+
+# Attribute key -> ndb entries of the owner derived from it
+ATTRIBUTE_CACHES = {
+    "hitpoints": ("condition",),
+    "damage": ("condition",),
+    "desc": ("appearance_header",),
+}
+
+# Object fields shown in (or deciding) the appearance of rooms.
+APPEARANCE_FIELDS = {"db_key", "db_lock_storage"}
+
+# Model class, imported in start().
+_ObjectDB = None
+
+
+def _clear(obj, names):
+    for name in names:
+        setattr(obj.ndb, name, None)
+
+
+def _clear_owners(attribute):
+    names = ATTRIBUTE_CACHES.get(attribute.db_key)
+    if not names or attribute.db_category is not None or attribute.db_attrtype is not None:
+        return
+    for objid in _ObjectDB.objects.filter(db_attributes=attribute).values_list("id", flat=True):
+        obj = _ObjectDB.get_cached_instance(objid)
+        if obj is not None:
+            _clear(obj, names)
+
+
+def _on_attribute_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _clear_owners(instance)
+
+
+def _on_attribute_delete(sender, instance, **kwargs):
+    # pre_delete: the links to the owners are still there.
+    _clear_owners(instance)
+
+
+def _on_attributes_changed(sender, instance, action, reverse=False, **kwargs):
+    if reverse or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, _ObjectDB):
+        _clear(instance, set(chain.from_iterable(ATTRIBUTE_CACHES.values())))
+
+
+def _on_object_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Typeclasses are proxies, so this is connected for every model.
+    if raw or not isinstance(instance, _ObjectDB):
+        return
+    if update_fields is not None and not APPEARANCE_FIELDS.intersection(update_fields):
+        return
+    _clear(instance, ("appearance_header",))
+    if instance.db_location_id is not None:
+        location = _ObjectDB.get_cached_instance(instance.db_location_id)
+        if hasattr(location, "invalidate_appearance"):
+            location.invalidate_appearance()
+
+
+def start():
+    "Connect the signals. Called from at_server_start."
+    global _ObjectDB
+    from django.db.models.signals import m2m_changed, post_save, pre_delete
+    from evennia.objects.models import ObjectDB
+    from evennia.typeclasses.attributes import Attribute
+
+    _ObjectDB = ObjectDB
+    post_save.connect(_on_attribute_save, sender=Attribute, dispatch_uid="gridpunx_derived_save")
+    post_save.connect(_on_object_save, dispatch_uid="gridpunx_derived_object_save")
+    pre_delete.connect(_on_attribute_delete, sender=Attribute, dispatch_uid="gridpunx_derived_delete")
+    m2m_changed.connect(
+        _on_attributes_changed,
+        sender=ObjectDB.db_attributes.through,
+        dispatch_uid="gridpunx_derived_attributes",
+    )
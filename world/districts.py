@@ -0,0 +1,291 @@
+"""
+Districts
+
+Incremental updates of built districts.
+
+A district is everything built from one world file (see
+`world/builder.py`); all of its objects carry the district tag and
+their world id. Instead of deleting and re-creating a district when its
+file changes, `diff_district()` compares the file with the live
+database and returns a minimal `Changeset`, and `apply_changeset()`
+applies it in batched transactions, touching only what changed. Objects
+keep their dbrefs.
+
+What is compared, per world id:
+
+- missing objects are created,
+- key, typeclass, location, destination, aliases and the Attributes
+  declared in the file (including `desc`) are updated if they differ,
+- objects no longer in the file are deleted, if `prune` is set.
+
+Attributes that are not declared in the file (like the `damage` an
+object took in play) are left alone.
+
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from evennia.objects.models import ObjectDB
+from evennia.prototypes.spawner import batch_create_object
+from evennia.utils import logger
+
+from world import builder, inventory
+
+# Changes applied per transaction.
+BATCH_SIZE = 200
+
+
+class Changeset:
+    """
+    The changes needed to bring a district in line with its world file.
+
+    Attributes:
+        district (str): The district name.
+        create (list): World entries to create, in file order.
+        update (list): `(entry, obj, changes)` tuples, where `changes`
+            maps field names (or `attributes`) to the new value.
+        delete (list): `(world_id, obj)` tuples of objects to delete.
+        live (dict): Maps the world ids of all existing objects of the
+            district to the objects.
+    """
+
+    def __init__(self, district, live=None):
+        self.district = district
+        self.live = live or {}
+        self.create = []
+        self.update = []
+        self.delete = []
+
+    def __bool__(self):
+        return bool(self.create or self.update or self.delete)
+
+    def summary(self):
+        "Returns a short, human-readable summary of the changes."
+        lines = [
+            "District '%s': %i to create, %i to update, %i to delete."
+            % (self.district, len(self.create), len(self.update), len(self.delete))
+        ]
+        for entry, obj, changes in self.update:
+            lines.append("  update %s (%s): %s" % (entry["id"], obj.dbref, ", ".join(sorted(changes))))
+        for world_id, obj in self.delete:
+            lines.append("  delete %s (%s)" % (world_id, obj.dbref))
+        return "\n".join(lines)
+
+
+# ==============================================================
+# ==
+# == Diffing
+# ==
+# ==============================================================
+
+def _live_district(district):
+    """
+    Returns `{world_id: obj}` for all objects of `district`, along with
+    their aliases and Attributes, using three queries.
+    """
+    objs = {obj.id: obj for obj in ObjectDB.objects.get_by_tag(key=district, category="district")}
+    world_ids, aliases = {}, defaultdict(set)
+    attributes = defaultdict(dict)
+    ids = list(objs)
+    for chunk in (ids[i : i + 500] for i in range(0, len(ids), 500)):
+        for objid, tagkey, category, tagtype in ObjectDB.db_tags.through.objects.filter(
+            objectdb_id__in=chunk
+        ).values_list("objectdb_id", "tag__db_key", "tag__db_category", "tag__db_tagtype"):
+            if category == builder.WORLD_ID_CATEGORY and not tagtype:
+                world_ids[objid] = tagkey
+            elif tagtype == "alias":
+                aliases[objid].add(tagkey)
+        for conn in ObjectDB.db_attributes.through.objects.filter(
+            objectdb_id__in=chunk, attribute__db_attrtype=None, attribute__db_category=None
+        ).select_related("attribute"):
+            attributes[conn.objectdb_id][conn.attribute.db_key] = conn.attribute.value
+    live = {}
+    for objid, obj in objs.items():
+        world_id = world_ids.get(objid)
+        if world_id is not None:
+            live[world_id] = (obj, aliases[objid], attributes[objid])
+    return live
+
+
+def diff_district(world, prune=False):
+    """
+    Compare validated world data with the live database.
+
+    Args:
+        world (dict): Output of `builder.load_world()`. Must name its
+            `district`.
+        prune (bool): Also delete live objects missing from the file.
+
+    Returns:
+        changeset (Changeset): The minimal set of changes.
+
+    Raises:
+        builder.WorldFileError: If the world data has no district.
+    """
+    district = world.get("district")
+    if not district:
+        raise builder.WorldFileError("Only world files with a 'district' can be diffed.")
+    live = _live_district(district)
+    changeset = Changeset(district, {world_id: found[0] for world_id, found in live.items()})
+    declared = set()
+
+    def _ref(world_id):
+        "The live object of a world id, or the id itself if not built yet."
+        return live[world_id][0] if world_id in live else world_id
+
+    for section, _ in builder.SECTIONS:
+        for entry in world[section]:
+            declared.add(entry["id"])
+            if entry["id"] not in live:
+                changeset.create.append(entry)
+                continue
+            obj, aliases, attributes = live[entry["id"]]
+            changes = {}
+            if obj.db_key != entry["key"]:
+                changes["key"] = entry["key"]
+            if obj.db_typeclass_path != entry["typeclass"]:
+                changes["typeclass"] = entry["typeclass"]
+            location = _ref(entry.get("location"))
+            if entry.get("location") and obj.db_location_id != getattr(location, "id", None):
+                changes["location"] = location
+            destination = _ref(entry.get("destination"))
+            if entry.get("destination") and obj.db_destination_id != getattr(destination, "id", None):
+                changes["destination"] = destination
+            if set(entry.get("aliases", ())) != aliases:
+                changes["aliases"] = list(entry.get("aliases", ()))
+            changed_attrs = [
+                (key, value)
+                for key, value in builder.entry_attributes(entry)
+                if key not in attributes or attributes[key] != value
+            ]
+            if changed_attrs:
+                changes["attributes"] = changed_attrs
+            if changes:
+                changeset.update.append((entry, obj, changes))
+
+    if prune:
+        # Exits go first, rooms last, so nothing is moved home needlessly.
+        def _order(item):
+            obj = item[1]
+            return 0 if obj.db_destination_id else 2 if not obj.db_location_id else 1
+
+        changeset.delete = sorted(
+            ((world_id, found[0]) for world_id, found in live.items() if world_id not in declared),
+            key=_order,
+        )
+    return changeset
+
+
+# ==============================================================
+# ==
+# == Applying
+# ==
+# ==============================================================
+
+def _batches(items):
+    "Split a list into BATCH_SIZE chunks."
+    for i in range(0, len(items), BATCH_SIZE):
+        yield items[i : i + BATCH_SIZE]
+
+
+def _apply_update(obj, changes, built):
+    """
+    Apply the changes of one object. Locations and destinations given
+    as world ids refer to objects created by this changeset.
+    """
+
+    def _resolve(value):
+        return built.get(value) if isinstance(value, str) else value
+
+    if "typeclass" in changes:
+        obj.swap_typeclass(changes["typeclass"], clean_attributes=False)
+    if "key" in changes:
+        obj.key = changes["key"]
+    if "location" in changes:
+        obj.move_to(_resolve(changes["location"]), quiet=True)
+    if "destination" in changes:
+        obj.destination = _resolve(changes["destination"])
+    if "aliases" in changes:
+        obj.aliases.clear()
+        obj.aliases.batch_add(*changes["aliases"])
+    if "attributes" in changes:
+        totals = any(key in inventory.TOTAL_ATTRIBUTES for key, _ in changes["attributes"])
+        before = inventory.own_totals(obj) if totals else None
+        obj.attributes.batch_add(*changes["attributes"])
+        if totals:
+            inventory.adjust(obj.location, lambda: inventory.own_totals(obj) - before)
+            _invalidate(obj.location)
+
+
+def _invalidate(location):
+    "Forget the cached appearance of a room whose contents changed."
+    if hasattr(location, "invalidate_appearance"):
+        location.invalidate_appearance()
+
+
+def _delete(obj):
+    "Delete an object and take it out of its location's caches."
+    location = obj.location
+    # Real objects take themselves out of the totals when deleted.
+    if location is not None and not hasattr(obj, "get_totals"):
+        inventory.adjust(location, lambda: -inventory.own_totals(obj))
+    obj.delete()
+    _invalidate(location)
+
+
+def apply_changeset(changeset, report=None):
+    """
+    Apply a changeset in transactions of up to BATCH_SIZE changes.
+
+    Args:
+        changeset (Changeset): Output of `diff_district()`.
+        report (callable, optional): Called with progress strings.
+            Defaults to the server log.
+
+    Returns:
+        built (dict): Maps the world ids of created objects to the
+            new objects.
+
+    """
+    report = report or logger.log_info
+    built = {}
+
+    # Creates, in file order. Like the builder, an entry referring to an
+    # object of the current batch waits for that batch to exist.
+    batch, pending = [], set()
+    for entry in changeset.create + [None]:
+        if entry is None or (
+            entry.get("location") in pending
+            or entry.get("destination") in pending
+            or len(batch) >= BATCH_SIZE
+        ):
+            if batch:
+                refs = dict(changeset.live, **built)
+                with transaction.atomic():
+                    objs = batch_create_object(
+                        *[builder.entry_objparams(e, refs, changeset.district) for e in batch]
+                    )
+                built.update({e["id"]: obj for e, obj in zip(batch, objs)})
+                builder.receive_created(objs)
+            batch, pending = [], set()
+        if entry is not None:
+            batch.append(entry)
+            pending.add(entry["id"])
+    if changeset.create:
+        report("Created %i objects." % len(built))
+
+    for batch in _batches(changeset.update):
+        with transaction.atomic():
+            for entry, obj, changes in batch:
+                _apply_update(obj, changes, built)
+    if changeset.update:
+        report("Updated %i objects." % len(changeset.update))
+
+    for batch in _batches(changeset.delete):
+        with transaction.atomic():
+            for _, obj in batch:
+                _delete(obj)
+    if changeset.delete:
+        report("Deleted %i objects." % len(changeset.delete))
+    return built
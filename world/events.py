@@ -0,0 +1,168 @@
+"""
+Events
+
+An in-process event bus for game hooks. Cross-cutting reactions
+(economy tracking, NPCs reacting to gifts, climate statistics)
+subscribe to typed events here instead of overriding the hooks of
+every typeclass involved.
+
+    from world import events
+
+    def on_payout(event):
+        print(event.player, event.amount)
+
+    events.subscribe(events.Payout, on_payout)
+
+    def on_moves(batch):
+        ...  # a list of Moved events, in the order they happened
+
+    events.subscribe(events.Moved, on_moves, batched=True)
+
+Synchronous subscribers are called from `emit()`, in the middle of the
+hook that emitted the event. Batched subscribers are called with a
+list of every event they subscribed to that was emitted since their
+last batch; batches are delivered `settings.GRIDPUNX_EVENT_BATCH_INTERVAL`
+seconds after the first event of the batch. By then the objects in
+the events may have moved on (or, for stacks merged after a give, be
+deleted), so batched subscribers should not assume they are where
+the event says.
+
+Emitting takes the event type and its fields, and only builds the
+event if anything subscribed to its type:
+
+    events.emit(events.Moved, obj, source_location, obj.location)
+
+so an event nobody listens to costs one set lookup.
+
+"""
+
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from twisted.internet import reactor
+
+from evennia.utils import logger
+
+# ==============================================================
+# ==
+# == Event types
+# ==
+# ==============================================================
+
+# `obj` moved from `source` to `destination` (see move_to).
+Moved = namedtuple("Moved", "obj source destination")
+# `getter` picked up `quantity` of `item`.
+Got = namedtuple("Got", "item getter quantity")
+# `giver` gave `quantity` of `item` to `getter`.
+Given = namedtuple("Given", "item giver getter quantity")
+# A gambling game paid `amount` gridbits to `player` for `wager`.
+Payout = namedtuple("Payout", "game player wager amount")
+# The climate of `room` hurt the characters in `harmed` by `damage`.
+ClimateTick = namedtuple("ClimateTick", "room damage harmed")
+
+EVENT_TYPES = (Moved, Got, Given, Payout, ClimateTick)
+
+# ==============================================================
+# ==
+# == Subscriptions
+# ==
+# ==============================================================
+
+# event type -> synchronous handlers
+SYNC = defaultdict(list)
+# event type -> batched handlers
+BATCHED = defaultdict(list)
+# Event types anything subscribed to.
+_WANTED = set()
+# Events waiting for the next batch, in order.
+_PENDING = []
+_FLUSH = None
+
+
+def _refresh():
+    _WANTED.clear()
+    _WANTED.update(kind for kind, handlers in SYNC.items() if handlers)
+    _WANTED.update(kind for kind, handlers in BATCHED.items() if handlers)
+
+
+def subscribe(kind, handler, batched=False):
+    """
+    Call `handler` for every event of type `kind`: with the event, or
+    with a list of events if `batched`.
+    """
+    if kind not in EVENT_TYPES:
+        raise ValueError("Unknown event type %r." % (kind,))
+    handlers = (BATCHED if batched else SYNC)[kind]
+    if handler not in handlers:
+        handlers.append(handler)
+    _refresh()
+
+
+def unsubscribe(kind, handler):
+    "Stop calling `handler` for events of type `kind`."
+    for registry in (SYNC, BATCHED):
+        handlers = registry.get(kind)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+    _refresh()
+
+
+def wanted(kind):
+    "True if anything subscribed to events of type `kind`."
+    return kind in _WANTED
+
+
+# ==============================================================
+# ==
+# == Emitting
+# ==
+# ==============================================================
+
+def emit(kind, *fields):
+    """
+    Emit an event of type `kind` with the given fields, if anything
+    subscribed to it.
+    """
+    if kind not in _WANTED:
+        return
+    event = kind(*fields)
+    for handler in SYNC.get(kind, ()):
+        try:
+            handler(event)
+        except Exception:
+            logger.log_trace("Event handler %r failed for %r." % (handler, event))
+    if BATCHED.get(kind):
+        _PENDING.append(event)
+        _schedule()
+
+
+def _schedule():
+    global _FLUSH
+    if _FLUSH is None:
+        _FLUSH = reactor.callLater(settings.GRIDPUNX_EVENT_BATCH_INTERVAL, flush)
+
+
+def flush():
+    "Deliver the pending events to the batched subscribers now."
+    global _FLUSH
+    if _FLUSH is not None and _FLUSH.active():
+        _FLUSH.cancel()
+    _FLUSH = None
+    if not _PENDING:
+        return
+    pending = list(_PENDING)
+    del _PENDING[:]
+    batches = defaultdict(list)
+    for event in pending:
+        for handler in BATCHED.get(type(event), ()):
+            batches[handler].append(event)
+    for handler, batch in batches.items():
+        try:
+            handler(batch)
+        except Exception:
+            logger.log_trace("Batched event handler %r failed." % (handler,))
+
+
+def stop():
+    "Deliver what is pending. Called from at_server_stop."
+    flush()
@@ -0,0 +1,257 @@
+"""
+The Grid
+
+An in-memory network of the grid-connected devices in the world:
+every `RealThing` with `db.grid_connection` set.
+
+Devices are indexed by the room they are in (however deeply nested
+they are in containers or inventories) and, through world/zones.py,
+by zone. Devices in the same room share a local network, and the
+networks of adjacent rooms (joined by an exit, see
+world/pathfinding.py) are linked when both have devices in them, so
+the Grid is a mesh: a signal travels from room to room as long as
+there is a device to relay it.
+
+    from world import grid
+
+    grid.neighbors(camera)                 # other devices in its room
+    grid.reachable(terminal, max_hops=3)   # device ids it can reach
+    grid.broadcast("alarm", camera, max_hops=2, level=3)
+
+Broadcasting calls `at_grid_event(event, source, **kwargs)` on every
+device reached. None of these queries touch the database, except to
+load the devices a broadcast reaches that are not in memory yet (one
+query).
+
+The index is built at server start and kept current by the hooks of
+real objects and characters: devices are added when created or
+connected, moved when they (or anything holding them) move, and
+removed when disconnected or deleted.
+
+"""
+
+from collections import defaultdict, deque
+
+from world import zones
+
+# device id -> chain of location ids, innermost first; the last one is
+# the room
+DEVICES = {}
+# room id -> device ids in the room
+BY_ROOM = defaultdict(set)
+# holder id -> ids of devices nested inside it (rooms excluded)
+INSIDE = defaultdict(set)
+
+_ObjectDB = None
+
+
+def _chain(obj):
+    "The ids of the locations `obj` is nested in, innermost first."
+    chain = []
+    location = obj.location
+    while location is not None:
+        chain.append(location.id)
+        location = location.location
+    return tuple(chain)
+
+
+def _index(device_id, chain):
+    _unindex(device_id)
+    if not chain:
+        return
+    DEVICES[device_id] = chain
+    BY_ROOM[chain[-1]].add(device_id)
+    for holder_id in chain[:-1]:
+        INSIDE[holder_id].add(device_id)
+
+
+def _unindex(device_id):
+    chain = DEVICES.pop(device_id, None)
+    if not chain:
+        return
+    room = BY_ROOM.get(chain[-1])
+    if room is not None:
+        room.discard(device_id)
+        if not room:
+            del BY_ROOM[chain[-1]]
+    for holder_id in chain[:-1]:
+        held = INSIDE.get(holder_id)
+        if held is not None:
+            held.discard(device_id)
+            if not held:
+                del INSIDE[holder_id]
+
+
+# ==============================================================
+# ==
+# == Upkeep
+# ==
+# ==============================================================
+
+def add(device):
+    "Connect a device (or update where it is)."
+    _index(device.id, _chain(device))
+
+
+def remove(device):
+    "Disconnect a device."
+    _unindex(device.id)
+
+
+def moved(obj):
+    """
+    Called after `obj` moved. Updates `obj` if it is a connected
+    device and every device nested inside it.
+    """
+    if obj.id in DEVICES:
+        _index(obj.id, _chain(obj))
+    held = INSIDE.get(obj.id)
+    if held:
+        chain = _chain(obj)
+        for device_id in list(held):
+            inner = DEVICES[device_id]
+            # The part of the chain inside `obj` stays the same.
+            _index(device_id, inner[: inner.index(obj.id) + 1] + chain)
+
+
+def build():
+    """
+    Rebuild the index from the database: one query for the connected
+    devices and one per level of nesting for their locations.
+    """
+    DEVICES.clear()
+    BY_ROOM.clear()
+    INSIDE.clear()
+    device_ids = [
+        link.objectdb_id
+        for link in _ObjectDB.db_attributes.through.objects.filter(
+            attribute__db_key="grid_connection", attribute__db_category=None
+        ).select_related("attribute")
+        if link.attribute.value
+    ]
+    locations = dict(
+        _ObjectDB.objects.filter(id__in=device_ids).values_list("id", "db_location_id")
+    )
+    missing = {loc for loc in locations.values() if loc is not None}
+    while missing:
+        found = dict(_ObjectDB.objects.filter(id__in=missing).values_list("id", "db_location_id"))
+        locations.update(found)
+        missing = {loc for loc in found.values() if loc is not None and loc not in locations}
+    for device_id in device_ids:
+        chain = []
+        location = locations.get(device_id)
+        while location is not None:
+            chain.append(location)
+            location = locations.get(location)
+        _index(device_id, tuple(chain))
+
+
+def start():
+    "Build the index. Called from at_server_start."
+    global _ObjectDB
+    from evennia.objects.models import ObjectDB
+
+    _ObjectDB = ObjectDB
+    build()
+
+
+# ==============================================================
+# ==
+# == Queries
+# ==
+# ==============================================================
+
+def _id(obj):
+    return obj if isinstance(obj, int) else obj.id
+
+
+def room_of(device):
+    "The id of the room a device is in, or None if it is not connected."
+    chain = DEVICES.get(_id(device))
+    return chain[-1] if chain else None
+
+
+def devices_in_room(room):
+    "The ids of the connected devices in a room."
+    return set(BY_ROOM.get(_id(room), ()))
+
+
+def devices_in_zone(zone):
+    "The ids of the connected devices in the rooms of a zone."
+    found = set()
+    for room_id in zones.rooms_in(zone):
+        found.update(BY_ROOM.get(room_id, ()))
+    return found
+
+
+def neighbors(device):
+    "The ids of the other devices on the local network of `device`."
+    device_id = _id(device)
+    room_id = room_of(device_id)
+    if room_id is None:
+        return set()
+    return BY_ROOM[room_id] - {device_id}
+
+
+def reachable_rooms(room, max_hops=None):
+    """
+    The ids of the rooms whose networks are linked to the one in
+    `room`, with the number of hops to each, as a dict. Only rooms
+    with devices in them relay.
+    """
+    from world import pathfinding
+
+    start = _id(room)
+    hops = {start: 0}
+    queue = deque([start])
+    while queue:
+        room_id = queue.popleft()
+        if max_hops is not None and hops[room_id] >= max_hops:
+            continue
+        for destination in pathfinding.ADJACENCY.get(room_id, {}).values():
+            if destination not in hops and destination in BY_ROOM:
+                hops[destination] = hops[room_id] + 1
+                queue.append(destination)
+    return hops
+
+
+def reachable(device, max_hops=None):
+    """
+    The ids of every device `device` can reach over the Grid, in at
+    most `max_hops` room-to-room links (default unlimited).
+    """
+    device_id = _id(device)
+    room_id = room_of(device_id)
+    if room_id is None:
+        return set()
+    found = set()
+    for linked in reachable_rooms(room_id, max_hops):
+        found.update(BY_ROOM.get(linked, ()))
+    found.discard(device_id)
+    return found
+
+
+def broadcast(event, source, max_hops=None, **kwargs):
+    """
+    Send a grid event from `source` (a connected device) to every
+    device it can reach. Each device's `at_grid_event(event, source,
+    **kwargs)` is called.
+
+    Returns:
+        num (int): The number of devices reached.
+    """
+    device_ids = reachable(source, max_hops)
+    devices = []
+    missing = []
+    for device_id in device_ids:
+        device = _ObjectDB.get_cached_instance(device_id)
+        if device is None:
+            missing.append(device_id)
+        else:
+            devices.append(device)
+    if missing:
+        devices.extend(_ObjectDB.objects.filter(id__in=missing))
+    for device in devices:
+        if hasattr(device, "at_grid_event"):
+            device.at_grid_event(event, source, **kwargs)
+    return len(devices)
@@ -0,0 +1,162 @@
+"""
+Hot state
+
+Snapshot and restore of in-memory state across server reloads.
+
+A reload wipes everything that only lives in memory: `ndb` attributes,
+open conversation menus, metrics and the various gridpunx caches.
+Systems holding such state register a provider here:
+
+    from world import hotstate
+
+    hotstate.register("mysystem", dump_function, load_function)
+
+`dump_function()` takes no arguments and returns any picklable value;
+`load_function(value)` gets that value back after the reload.
+
+`save()` runs from `at_server_reload_stop` and writes all dumps to a
+single local snapshot file: a fixed-size header followed by one pickle
+(highest protocol). `restore()` runs from `at_server_reload_start`,
+memory-maps the file, validates the header (magic, format version,
+state version, Evennia version, payload length and checksum) and hands
+each provider its value. If anything about the snapshot is off, it is
+discarded and the server simply starts cold. The snapshot is deleted
+once read, and on every cold start.
+
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import zlib
+
+from django.conf import settings
+from evennia.utils import logger
+from evennia.utils.utils import get_evennia_version
+
+SNAPSHOT_FILE = os.path.join(settings.GAME_DIR, "server", "hotstate.snapshot")
+
+# Bump FORMAT_VERSION when the file layout changes.
+MAGIC = b"GPXHOT"
+FORMAT_VERSION = 1
+
+# magic, format version, version hash, payload length, payload crc32
+_HEADER = struct.Struct("!6sH16sQI")
+
+# Registered providers: key -> (dump, load)
+PROVIDERS = {}
+
+
+def register(key, dump, load):
+    """
+    Register a state provider. Registering the same key again
+    replaces the earlier provider.
+
+    Args:
+        key (str): Unique name of the state in the snapshot.
+        dump (callable): Returns the picklable state to save.
+        load (callable): Receives the saved state after a reload.
+    """
+    PROVIDERS[key] = (dump, load)
+
+
+def _version_hash():
+    """
+    Snapshots are only valid for the same game state version and
+    Evennia version that wrote them.
+    """
+    version = "%s:%s" % (settings.GRIDPUNX_HOTSTATE_VERSION, get_evennia_version())
+    return zlib.crc32(version.encode("utf-8")).to_bytes(4, "big").ljust(16, b"\0")
+
+
+def discard():
+    "Remove any snapshot file."
+    try:
+        os.remove(SNAPSHOT_FILE)
+    except OSError:
+        pass
+
+
+def save():
+    """
+    Dump all providers to the snapshot file. Called from
+    at_server_reload_stop.
+    """
+    state = {}
+    for key, (dump, _) in list(PROVIDERS.items()):
+        try:
+            state[key] = dump()
+        except Exception:
+            logger.log_trace("hotstate: could not dump '%s'." % key)
+    try:
+        payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        logger.log_trace("hotstate: could not pickle the snapshot.")
+        discard()
+        return
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, _version_hash(), len(payload), zlib.crc32(payload)
+    )
+    tmpfile = SNAPSHOT_FILE + ".tmp"
+    with open(tmpfile, "wb") as fil:
+        fil.write(header)
+        fil.write(payload)
+    os.replace(tmpfile, SNAPSHOT_FILE)
+    logger.log_info("hotstate: saved %i sections (%i bytes)." % (len(state), len(payload)))
+
+
+def _read():
+    """
+    Memory-map and validate the snapshot. Returns the state dict, or
+    None if there is no valid snapshot.
+    """
+    try:
+        fil = open(SNAPSHOT_FILE, "rb")
+    except OSError:
+        return None
+    with fil:
+        try:
+            mapped = mmap.mmap(fil.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return None
+        with mapped:
+            if len(mapped) < _HEADER.size:
+                return None
+            magic, version, vhash, length, crc = _HEADER.unpack_from(mapped)
+            if magic != MAGIC or version != FORMAT_VERSION or vhash != _version_hash():
+                logger.log_info("hotstate: snapshot is from another version; starting cold.")
+                return None
+            payload = memoryview(mapped)[_HEADER.size : _HEADER.size + length]
+            try:
+                if len(payload) != length or zlib.crc32(payload) != crc:
+                    logger.log_err("hotstate: snapshot is corrupt; starting cold.")
+                    return None
+                return pickle.loads(payload)
+            finally:
+                payload.release()
+
+
+def restore():
+    """
+    Load the snapshot and hand each provider its state. Called from
+    at_server_reload_start. The snapshot is removed afterwards.
+    """
+    try:
+        state = _read()
+    except Exception:
+        logger.log_trace("hotstate: could not read the snapshot; starting cold.")
+        state = None
+    discard()
+    if not state:
+        return
+    for key, value in state.items():
+        provider = PROVIDERS.get(key)
+        if not provider:
+            continue
+        try:
+            provider[1](value)
+        except Exception:
+            logger.log_trace("hotstate: could not restore '%s'." % key)
+    logger.log_info("hotstate: restored %i sections." % len(state))
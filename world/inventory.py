@@ -0,0 +1,184 @@
+"""
+Inventory
+
+Aggregate totals (item count, weight and value) of everything nested
+inside an object, for capacity checks and "what's in my backpack".
+
+Totals are cached per object (in `ndb.totals`) by the real objects
+(see `RealObject.get_totals()`). The first read of an object's totals
+loads its whole content tree with one recursive query and primes the
+caches of every real object in it that is in memory. After that the
+caches are kept current incrementally: when something enters or
+leaves an object, or a stack's quantity or an object's weight or
+value changes, the difference is added to every cached ancestor.
+
+Weight and value are per item; stacks (see `RealItem`) count with
+their quantity. Objects without `weight` or `value` Attributes count
+as weightless and worthless.
+
+"""
+
+from collections import defaultdict, namedtuple
+
+from django.db import connection
+
+# Attributes read for the totals.
+TOTAL_ATTRIBUTES = ("weight", "value", "quantity")
+
+
+class Totals(namedtuple("Totals", "count weight value")):
+    """
+    Number of items, total weight and total value.
+    """
+
+    __slots__ = ()
+
+    def __add__(self, other):
+        return Totals(self.count + other.count, self.weight + other.weight, self.value + other.value)
+
+    def __sub__(self, other):
+        return Totals(self.count - other.count, self.weight - other.weight, self.value - other.value)
+
+    def __neg__(self):
+        return Totals(-self.count, -self.weight, -self.value)
+
+
+EMPTY = Totals(0, 0, 0)
+
+
+def _own(weight, value, quantity):
+    quantity = 1 if quantity is None else quantity
+    return Totals(quantity, (weight or 0) * quantity, (value or 0) * quantity)
+
+
+def own_totals(obj):
+    "What `obj` itself (not its contents) adds to the totals of its location."
+    attrs = obj.attributes
+    return _own(attrs.get("weight"), attrs.get("value"), attrs.get("quantity"))
+
+
+def subtree_totals(obj):
+    "What `obj` and everything inside it add to the totals of its location."
+    if hasattr(obj, "get_totals"):
+        return own_totals(obj) + obj.get_totals()
+    return own_totals(obj) + contents_totals(obj)
+
+
+# ==============================================================
+# ==
+# == Reading the content tree
+# ==
+# ==============================================================
+
+_TREE_SQL = """
+WITH RECURSIVE tree(id, location_id, depth) AS (
+    SELECT id, db_location_id, 1 FROM {objects} WHERE db_location_id = %s
+    UNION ALL
+    SELECT obj.id, obj.db_location_id, tree.depth + 1
+    FROM {objects} obj JOIN tree ON obj.db_location_id = tree.id
+)
+SELECT tree.id, tree.location_id, tree.depth, {objects}.db_key, vals.db_key, vals.db_value
+FROM tree
+JOIN {objects} ON {objects}.id = tree.id
+LEFT JOIN (
+    SELECT link.objectdb_id, attr.db_key, attr.db_value
+    FROM {links} link JOIN {attributes} attr ON attr.id = link.attribute_id
+    WHERE attr.db_key IN (%s, %s, %s) AND attr.db_category IS NULL AND attr.db_attrtype IS NULL
+) vals ON vals.objectdb_id = tree.id
+ORDER BY tree.depth, tree.id
+"""
+
+
+def contents_tree(obj):
+    """
+    Everything nested inside `obj`, with one query.
+
+    Returns:
+        tree (list): `(id, location id, depth, key, attributes)` per
+            object, outermost first; `attributes` holds the values of
+            the `TOTAL_ATTRIBUTES` the object has.
+    """
+    from evennia.objects.models import ObjectDB
+    from evennia.typeclasses.attributes import Attribute
+    from evennia.utils.dbserialize import from_pickle
+
+    sql = _TREE_SQL.format(
+        objects=ObjectDB._meta.db_table,
+        links=ObjectDB.db_attributes.through._meta.db_table,
+        attributes=Attribute._meta.db_table,
+    )
+    decode = Attribute._meta.get_field("db_value").from_db_value
+    rows = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [obj.id] + list(TOTAL_ATTRIBUTES))
+        for objid, location_id, depth, key, attrkey, attrvalue in cursor.fetchall():
+            entry = rows.get(objid)
+            if entry is None:
+                entry = rows[objid] = (objid, location_id, depth, key, {})
+            if attrkey is not None:
+                entry[4][attrkey] = from_pickle(decode(attrvalue, None, connection))
+    return list(rows.values())
+
+
+def tree_totals(tree, root_id):
+    """
+    The totals of every object in a `contents_tree()`, and of its
+    root, from the tree alone.
+
+    Returns:
+        totals (dict): Maps object ids to the totals of their contents.
+    """
+    totals = defaultdict(lambda: EMPTY)
+    for objid, location_id, _, _, attrs in reversed(tree):
+        own = _own(attrs.get("weight"), attrs.get("value"), attrs.get("quantity"))
+        totals[location_id] += own + totals[objid]
+    totals.setdefault(root_id, EMPTY)
+    return dict(totals)
+
+
+def contents_totals(obj):
+    """
+    Compute the totals of `obj` from the database (one query), and
+    prime the caches of the real objects in its tree that are in
+    memory.
+    """
+    from evennia.objects.models import ObjectDB
+
+    tree = contents_tree(obj)
+    totals = tree_totals(tree, obj.id)
+    for objid, _, _, _, _ in tree:
+        inst = ObjectDB.get_cached_instance(objid)
+        if inst is not None and hasattr(inst, "get_totals") and inst.ndb.totals is None:
+            inst.ndb.totals = totals.get(objid, EMPTY)
+    return totals[obj.id]
+
+
+# ==============================================================
+# ==
+# == Incremental upkeep
+# ==
+# ==============================================================
+
+def adjust(location, delta):
+    """
+    Add `delta` to the cached totals of `location` and of everything
+    it is nested in. `delta` can be a callable returning the Totals;
+    it is only called if one of them has cached totals.
+    """
+    while location is not None:
+        cached = location.ndb.totals
+        if cached is not None:
+            if callable(delta):
+                delta = delta()
+            location.ndb.totals = cached + delta
+        location = location.location
+
+
+def added(location, obj):
+    "`obj` arrived in `location`."
+    adjust(location, lambda: subtree_totals(obj))
+
+
+def removed(location, obj):
+    "`obj` left `location`."
+    adjust(location, lambda: -subtree_totals(obj))
@@ -0,0 +1,439 @@
+"""
+Load test
+
+A headless load-test harness. It starts the game server's code
+against a throwaway test database, builds a small test district,
+connects N simulated players (real ServerSessions, but without
+sockets or a Portal) and has them play for a while:
+
+- walking between `RealOutside` street rooms,
+- taking items out of `RealContainer` crates and giving them back,
+- playing duodo with the gambler NPC in the bar.
+
+Every command goes through Evennia's normal command handler, so
+cmdsets, locks, hooks and the gridpunx caches are all exercised. At
+the end it reports throughput, p50/p99 command latency and database
+queries per command, overall and per action, and can write them to a
+JSON file and compare them with an earlier run:
+
+    cd gridpunx
+    python -m world.loadtest --players 200 --duration 60 \\
+        --output loadtest.json --compare last-release.json
+
+The test database is created next to the configured one (for
+PostgreSQL a separate `test_` database, for SQLite an in-memory one)
+and dropped afterwards. Pass `--sqlite` to use an in-memory SQLite
+database whatever the settings say.
+
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from time import perf_counter
+
+# Seconds between the commands of one simulated player (randomized).
+DEFAULT_THINK_TIME = 1.0
+
+# Relative weights of the actions players pick.
+ACTIONS = (("walk", 50), ("look", 10), ("items", 25), ("duodo", 15))
+
+# The duodo conversation: talk, "Sure.", "let's play", bet on any
+# doubles, wager 1, shoot, and leave.
+DUODO_INPUTS = ("talk", "1", "2", "any", "1", "1", "2")
+
+
+# ==============================================================
+# ==
+# == Setup
+# ==
+# ==============================================================
+
+def setup_game(use_sqlite=False):
+    """
+    Load the game settings and Evennia (optionally forcing an in-memory
+    SQLite database), create and migrate a test database and create
+    the objects and channels of a new game.
+
+    Returns:
+        old_name (str): The real database name, for `teardown_game()`.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.conf.settings")
+    from django.conf import settings
+
+    if use_sqlite:
+        settings.DATABASES["default"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": ":memory:",
+        }
+    # Hashing hundreds of passwords properly would dominate the setup.
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    import django
+
+    django.setup()
+    import evennia
+
+    evennia._init()
+
+    from django.db import connection
+    from evennia.accounts.models import AccountDB
+    from evennia.server import initial_setup
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    AccountDB.objects.create_superuser("loadadmin", "loadadmin@loadtest.invalid", "loadtest")
+    initial_setup.create_objects()
+    initial_setup.create_channels()
+    return old_name
+
+
+def teardown_game(old_name):
+    "Drop the test database created by `setup_game()`."
+    from django.db import connection
+
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def test_world(streets=24, crate_every=4, items_per_crate=6):
+    """
+    World data (see world/builder.py) for the load test: a ring of
+    street rooms, crates with items along it and a bar with the
+    gambler, reached from the first street.
+    """
+    rooms, exits, objects = [], [], []
+    for num in range(streets):
+        rooms.append(
+            {
+                "id": "street-%i" % num,
+                "key": "Street %i" % num,
+                "typeclass": "typeclasses.rooms.RealOutside",
+                "desc": "Neon signs buzz over a wet street.",
+                "tags": [["loadtest", "zone"]],
+            }
+        )
+    rooms.append(
+        {
+            "id": "bar",
+            "key": "The Dead Pixel",
+            "typeclass": "typeclasses.rooms.RealInside",
+            "desc": "A smoky bar.",
+            "tags": [["loadtest", "zone"]],
+        }
+    )
+    for num in range(streets):
+        nxt = (num + 1) % streets
+        exits.append(
+            {"id": "street-%i-east" % num, "key": "east", "aliases": ["e"],
+             "location": "street-%i" % num, "destination": "street-%i" % nxt}
+        )
+        exits.append(
+            {"id": "street-%i-west" % nxt, "key": "west", "aliases": ["w"],
+             "location": "street-%i" % nxt, "destination": "street-%i" % num}
+        )
+    exits.append({"id": "street-0-in", "key": "in", "location": "street-0", "destination": "bar"})
+    exits.append({"id": "bar-out", "key": "out", "location": "bar", "destination": "street-0"})
+    objects.append(
+        {"id": "gambler", "key": "gambler",
+         "typeclass": "typeclasses.npcs.gambler.RealGamblerNPC", "location": "bar"}
+    )
+    for num in range(0, streets, crate_every):
+        crate = "crate-%i" % num
+        objects.append(
+            {"id": crate, "key": "crate", "typeclass": "typeclasses.objects.RealContainer",
+             "location": "street-%i" % num}
+        )
+        for inum in range(items_per_crate):
+            objects.append(
+                {"id": "%s-chip-%i" % (crate, inum), "key": "chip",
+                 "typeclass": "typeclasses.objects.RealItem", "location": crate}
+            )
+    return {"district": "loadtest", "rooms": rooms, "exits": exits, "objects": objects}
+
+
+# ==============================================================
+# ==
+# == Simulated players
+# ==
+# ==============================================================
+
+class SimulatedPlayer:
+    """
+    One simulated player: an account, its character and a connected
+    ServerSession without a socket. `next_input()` decides what it
+    types next.
+    """
+
+    def __init__(self, num, session, character, bar, rng):
+        self.num = num
+        self.session = session
+        self.character = character
+        self.bar = bar
+        self.rng = rng
+        self.queue = []
+        self.action = None
+
+    def _choose(self):
+        total = sum(weight for _, weight in ACTIONS)
+        pick = self.rng.uniform(0, total)
+        for action, weight in ACTIONS:
+            pick -= weight
+            if pick <= 0:
+                return action
+        return ACTIONS[-1][0]
+
+    def _walk(self):
+        from world import pathfinding
+
+        steps = pathfinding.neighbors(self.character.location)
+        return self.rng.choice(steps)[1] if steps else "look"
+
+    def next_input(self):
+        "Returns `(action, raw command)` for the next command."
+        from world import pathfinding
+
+        if self.queue:
+            return self.action, self.queue.pop(0)
+        char = self.character
+        action = self._choose()
+        if action == "walk":
+            return action, self._walk()
+        if action == "look":
+            return action, "look"
+        if action == "items":
+            if any(obj.key == "crate" for obj in char.location.contents):
+                if any(obj.key == "chip" for obj in char.contents):
+                    return action, "give chip -to crate"
+                return action, "get chip -from crate"
+            return "walk", self._walk()
+        # duodo
+        if char.location == self.bar:
+            self.action = action
+            self.queue = list(DUODO_INPUTS[1:])
+            return action, DUODO_INPUTS[0]
+        step = pathfinding.next_step(char.location, self.bar)
+        return "walk", step or self._walk()
+
+
+def _connect_players(num, start, bar, seed):
+    """
+    Create `num` accounts with characters and log each in through a
+    simulated session.
+    """
+    from django.conf import settings
+    from evennia.server.sessionhandler import SESSION_HANDLER
+    from evennia.utils import create
+    from evennia.utils.utils import class_from_module
+
+    session_class = class_from_module(settings.SERVER_SESSION_CLASS)
+    players = []
+    for pnum in range(num):
+        key = "loadtester%i" % pnum
+        account = create.create_account(
+            key, "%s@loadtest.invalid" % key, "loadtest", typeclass=settings.BASE_ACCOUNT_TYPECLASS
+        )
+        char = create.create_object(
+            settings.BASE_CHARACTER_TYPECLASS, key=key, location=start, home=start
+        )
+        char.locks.add("puppet:id(%i) or pid(%i)" % (char.id, account.id))
+        account.db._playable_characters = [char]
+        account.db._last_puppet = char
+
+        session = session_class()
+        session.init_session("telnet", ("127.0.0.1", 4000 + pnum), SESSION_HANDLER)
+        session.sessid = pnum + 1
+        SESSION_HANDLER.portal_connect(session.get_sync_data())
+        session = SESSION_HANDLER.session_from_sessid(pnum + 1)
+        SESSION_HANDLER.login(session, account, testmode=True)
+        if not session.puppet:
+            account.puppet_object(session, char)
+        players.append(SimulatedPlayer(pnum, session, char, bar, random.Random(seed + pnum)))
+    return players
+
+
+# ==============================================================
+# ==
+# == Running and reporting
+# ==
+# ==============================================================
+
+def percentile(values, q):
+    "The `q` (0-1) percentile of a sorted list, or None if empty."
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Recorder:
+    "Collects per-command latencies and query counts."
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(int)
+        self.errors = 0
+        self.messages = [0]
+
+    def summary(self, elapsed, players):
+        "The results as a JSON-serializable dict."
+        everything = sorted(lat for lats in self.latencies.values() for lat in lats)
+        total = len(everything)
+
+        def _stats(lats, queries):
+            lats = sorted(lats)
+            return {
+                "commands": len(lats),
+                "p50_ms": percentile(lats, 0.5) * 1000 if lats else None,
+                "p99_ms": percentile(lats, 0.99) * 1000 if lats else None,
+                "queries_per_command": queries / len(lats) if lats else None,
+            }
+
+        result = {
+            "players": players,
+            "seconds": elapsed,
+            "throughput": total / elapsed if elapsed else 0.0,
+            "messages": self.messages[0],
+            "errors": self.errors,
+        }
+        result.update(_stats(everything, sum(self.queries.values())))
+        result["actions"] = {
+            action: _stats(lats, self.queries[action])
+            for action, lats in sorted(self.latencies.items())
+        }
+        return result
+
+
+def _play(players, duration, think_time, recorder):
+    """
+    Run the simulation in the reactor for `duration` seconds. Returns
+    the wall time.
+    """
+    from twisted.internet import reactor
+    from evennia.commands.cmdhandler import cmdhandler
+    from world import metrics
+
+    started = perf_counter()
+    deadline = started + duration
+
+    def _turn(player):
+        if perf_counter() >= deadline:
+            return
+        action, raw = player.next_input()
+        queries = metrics.query_count()
+        cmd_started = perf_counter()
+
+        def _done(result):
+            recorder.latencies[action].append(perf_counter() - cmd_started)
+            recorder.queries[action] += metrics.query_count() - queries
+            reactor.callLater(player.rng.uniform(0.5, 1.5) * think_time, _turn, player)
+            return result
+
+        def _failed(failure):
+            recorder.errors += 1
+            return None
+
+        deferred = cmdhandler(player.session, raw, callertype="session", session=player.session)
+        deferred.addErrback(_failed).addCallback(_done)
+
+    for player in players:
+        # Spread the first commands over one think time.
+        reactor.callLater(player.rng.uniform(0, think_time), _turn, player)
+    reactor.callLater(duration + think_time * 2, reactor.stop)
+    reactor.run()
+    return perf_counter() - started
+
+
+def compare(current, previous):
+    "Returns lines comparing two result dicts."
+    lines = []
+    for key in ("throughput", "p50_ms", "p99_ms", "queries_per_command"):
+        new, old = current.get(key), previous.get(key)
+        if new is None or not old:
+            continue
+        lines.append("  %-20s %10.2f -> %10.2f (%+.1f%%)" % (key, old, new, (new - old) / old * 100))
+    return lines
+
+
+def report(result):
+    "Returns a text report of a result dict."
+    lines = [
+        "%i players, %.1fs: %i commands, %.1f commands/s, %i errors"
+        % (result["players"], result["seconds"], result["commands"], result["throughput"], result["errors"]),
+        "%-10s %9s %9s %9s %9s" % ("action", "commands", "p50(ms)", "p99(ms)", "queries"),
+    ]
+    rows = [("all", result)] + list(result["actions"].items())
+    for name, stats in rows:
+        if not stats["commands"]:
+            continue
+        lines.append(
+            "%-10s %9i %9.2f %9.2f %9.1f"
+            % (name, stats["commands"], stats["p50_ms"], stats["p99_ms"], stats["queries_per_command"])
+        )
+    return "\n".join(lines)
+
+
+def run(players=100, duration=60, think_time=DEFAULT_THINK_TIME, seed=0, use_sqlite=False):
+    """
+    Run a load test. Must be the only thing running in this process:
+    it sets up Django and Evennia and runs (and stops) the reactor.
+
+    Returns:
+        result (dict): The measurements, see `Recorder.summary()`.
+    """
+    old_name = setup_game(use_sqlite)
+    try:
+        from evennia.server.sessionhandler import SESSION_HANDLER
+
+        from world import builder, metrics, pathfinding, warmup, zones
+
+        built = builder.build_world(builder.validate_world(test_world()), report=lambda msg: None)
+        # The parts of at_server_start that commands rely on; the rest
+        # would publish files used by the real game.
+        metrics.install_query_counter()
+        warmup.warm_up_world()
+        pathfinding.start()
+        zones.start()
+
+        recorder = Recorder()
+
+        def _data_out(session, **kwargs):
+            # No Portal to send to; just count.
+            recorder.messages[0] += 1
+
+        SESSION_HANDLER.data_out = _data_out
+        simulated = _connect_players(players, built["street-0"], built["bar"], seed)
+        elapsed = _play(simulated, duration, think_time, recorder)
+        return recorder.summary(elapsed, players)
+    finally:
+        teardown_game(old_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gridpunx headless load test")
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of play")
+    parser.add_argument("--think-time", type=float, default=DEFAULT_THINK_TIME,
+                        help="average seconds between a player's commands")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sqlite", action="store_true", help="use an in-memory SQLite database")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    args = parser.parse_args(argv)
+
+    result = run(args.players, args.duration, args.think_time, args.seed, args.sqlite)
+    result["date"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(report(result))
+    if args.compare:
+        with open(args.compare) as fil:
+            previous = json.load(fil)
+        print("Compared with %s (%s):" % (args.compare, previous.get("date", "?")))
+        print("\n".join(compare(result, previous)))
+    if args.output:
+        with open(args.output, "w") as fil:
+            json.dump(result, fil, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,571 @@
+"""
+Metrics
+
+Low-overhead, in-memory instrumentation for gridpunx. Game code records
+observations into the metric objects defined at the bottom of this
+module, and `render()` turns the whole registry into the Prometheus text
+exposition format (served at `/metrics` by `web/views.py`).
+
+Recording an observation is a couple of dict lookups and additions, and
+rendering only walks the in-memory registry, so scraping every few
+seconds never touches the game database.
+
+Commands are timed automatically by the gridpunx base Command (wall
+time, database queries and messages sent). A fraction of invocations
+can be sampled with cProfile, keeping the profiles of the slowest ones;
+`dump_commands()` writes them to a file.
+
+Usage:
+
+    from world import metrics
+
+    metrics.SCRIPT_TICK_SECONDS.observe(0.0123, "harsh_climate")
+    metrics.CACHE_REQUESTS.inc(1, "room_appearance", "hit")
+
+"""
+
+import cProfile
+import heapq
+import io
+import pstats
+import random
+import time
+from bisect import bisect_left
+from time import perf_counter
+
+from django.db import connection
+
+# Upper bounds (in seconds) of the default latency buckets.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# All registered metrics, in registration order.
+REGISTRY = []
+
+
+# ==============================================================
+# ==
+# == Metric types
+# ==
+# ==============================================================
+
+def _escape(value):
+    "Escape a label value for the Prometheus text format."
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labelstring(names, values, extra=None):
+    """Build a `{name="value",...}` string (or an empty string)."""
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class Metric:
+    """
+    Base class for all metrics. A metric has a name, a help text and
+    an optional tuple of label names. Values are stored per tuple of
+    label values, in the same order as the label names.
+    """
+
+    metric_type = "untyped"
+
+    def __init__(self, name, helptext, labels=()):
+        self.name = name
+        self.helptext = helptext
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def samples(self):
+        """
+        Yields `(suffix, labelstring, value)` tuples for rendering.
+        """
+        for labelvalues, value in list(self.values.items()):
+            yield "", _labelstring(self.labels, labelvalues), value
+
+    def render(self):
+        "Return this metric in Prometheus text format."
+        lines = [
+            "# HELP %s %s" % (self.name, self.helptext),
+            "# TYPE %s %s" % (self.name, self.metric_type),
+        ]
+        for suffix, labelstring, value in self.samples():
+            lines.append("%s%s%s %s" % (self.name, suffix, labelstring, _format(value)))
+        return "\n".join(lines)
+
+
+def _format(value):
+    "Render a sample value the way Prometheus expects."
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing counter.
+    """
+
+    metric_type = "counter"
+
+    def inc(self, amount=1, *labelvalues):
+        values = self.values
+        values[labelvalues] = values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues):
+        return self.values.get(labelvalues, 0)
+
+
+class Gauge(Metric):
+    """
+    A gauge whose samples are computed by `callback` at scrape time.
+
+    The callback takes no arguments and returns an iterable of
+    `(labelvalues, value)` tuples, where `labelvalues` is a tuple
+    matching the gauge's label names. It must only read in-memory
+    state.
+    """
+
+    metric_type = "gauge"
+
+    def __init__(self, name, helptext, labels=(), callback=None):
+        super().__init__(name, helptext, labels)
+        self.callback = callback
+
+    def samples(self):
+        if not self.callback:
+            return
+        for labelvalues, value in self.callback():
+            yield "", _labelstring(self.labels, labelvalues), value
+
+
+class Histogram(Metric):
+    """
+    A histogram with fixed bucket boundaries. Each labelset stores a
+    list of per-bucket counts (non-cumulative, converted on render),
+    the running sum and the total count.
+    """
+
+    metric_type = "histogram"
+
+    def __init__(self, name, helptext, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, helptext, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        entry = self.values.get(labelvalues)
+        if entry is None:
+            entry = self.values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def count(self, *labelvalues):
+        "Number of observations for a labelset."
+        entry = self.values.get(labelvalues)
+        return entry[2] if entry else 0
+
+    def quantile(self, q, *labelvalues):
+        """
+        Estimate the `q` quantile (0-1) from the bucket counts. Returns
+        the upper bound of the bucket the quantile falls into, or None
+        if nothing has been observed.
+        """
+        entry = self.values.get(labelvalues)
+        if not entry or not entry[2]:
+            return None
+        target = q * entry[2]
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), entry[0]):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for labelvalues, (counts, total, count) in list(self.values.items()):
+            running = 0
+            for bound, bucketcount in zip(self.buckets, counts):
+                running += bucketcount
+                yield "_bucket", _labelstring(
+                    self.labels, labelvalues, 'le="%s"' % _format(float(bound))
+                ), running
+            yield "_bucket", _labelstring(self.labels, labelvalues, 'le="+Inf"'), count
+            yield "_sum", _labelstring(self.labels, labelvalues), total
+            yield "_count", _labelstring(self.labels, labelvalues), count
+
+
+def render():
+    """
+    Render every registered metric in the Prometheus text format.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def dump_state():
+    """
+    Returns the recorded counter and histogram values, keyed by metric
+    name, for the reload snapshot (see `world/hotstate.py`).
+    """
+    return {
+        metric.name: dict(metric.values)
+        for metric in REGISTRY
+        if isinstance(metric, (Counter, Histogram))
+    }
+
+
+def load_state(state):
+    """
+    Add values saved by `dump_state()` to the current ones, so metrics
+    keep counting across reloads.
+    """
+    metrics = {metric.name: metric for metric in REGISTRY}
+    for name, values in state.items():
+        metric = metrics.get(name)
+        if isinstance(metric, Counter):
+            for labelvalues, value in values.items():
+                metric.inc(value, *labelvalues)
+        elif isinstance(metric, Histogram):
+            for labelvalues, (counts, total, count) in values.items():
+                if len(counts) != len(metric.buckets) + 1:
+                    # bucket layout changed
+                    continue
+                entry = metric.values.setdefault(
+                    labelvalues, [[0] * len(counts), 0.0, 0]
+                )
+                entry[0] = [mine + saved for mine, saved in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+
+
+# ==============================================================
+# ==
+# == Database query counting
+# ==
+# ==============================================================
+
+_QUERY_COUNT = [0]
+
+
+def _count_query(execute, sql, params, many, context):
+    "Django execute wrapper that counts every query on the connection."
+    _QUERY_COUNT[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter():
+    """
+    Install the query counter on the current thread's database
+    connection (the reactor thread, when called from the server
+    startstop hooks). Safe to call more than once.
+    """
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def query_count():
+    "Total number of queries counted since the server started."
+    return _QUERY_COUNT[0]
+
+
+# ==============================================================
+# ==
+# == Command and session helpers
+# ==
+# ==============================================================
+
+# Commands currently executing, per session id. Progressive commands
+# (those yielding in func()) stay here until at_post_cmd runs.
+PENDING_COMMANDS = {}
+
+
+# Messages sent to sessions since the server started (counted by
+# the gridpunx ServerSession).
+_MESSAGE_COUNT = [0]
+
+
+def message_sent():
+    "Called for every message the Server sends to a session."
+    _MESSAGE_COUNT[0] += 1
+
+
+def command_started(cmd):
+    """
+    Called from `Command.at_pre_cmd`. Stores the start markers on the
+    command instance. Nothing else is set up yet, since a subclass's
+    at_pre_cmd can still abort the command (and then at_post_cmd is
+    never called).
+    """
+    cmd._metrics_start = (perf_counter(), _QUERY_COUNT[0], _MESSAGE_COUNT[0])
+    cmd._metrics_running = False
+
+
+def command_running(cmd):
+    """
+    Called when the command's func() is entered. Counts the command as
+    pending for its session, and starts a profiler for sampled
+    invocations.
+    """
+    if getattr(cmd, "_metrics_start", None) is None or cmd._metrics_running:
+        return
+    cmd._metrics_running = True
+    sessid = getattr(cmd.session, "sessid", None)
+    PENDING_COMMANDS[sessid] = PENDING_COMMANDS.get(sessid, 0) + 1
+    if PROFILING["rate"] and PROFILING["active"] is None and random.random() < PROFILING["rate"]:
+        profiler = cProfile.Profile()
+        PROFILING["active"] = cmd
+        cmd._metrics_profiler = profiler
+        profiler.enable()
+
+
+def _stop_profiler(cmd):
+    "Stop the command's profiler, if it has one, and return it."
+    profiler = getattr(cmd, "_metrics_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        cmd._metrics_profiler = PROFILING["active"] = None
+    return profiler
+
+
+def _release(cmd):
+    "Forget the command's markers and its pending count."
+    cmd._metrics_start = None
+    if not getattr(cmd, "_metrics_running", False):
+        return
+    cmd._metrics_running = False
+    sessid = getattr(cmd.session, "sessid", None)
+    pending = PENDING_COMMANDS.get(sessid, 0) - 1
+    if pending > 0:
+        PENDING_COMMANDS[sessid] = pending
+    else:
+        PENDING_COMMANDS.pop(sessid, None)
+
+
+def command_waiting(cmd):
+    """
+    Called when func() returned a Deferred (or a generator). The rest
+    of the command runs in later reactor turns, between other
+    commands, so a profile of it would not be its own; it is dropped.
+    """
+    _stop_profiler(cmd)
+
+
+def command_failed(cmd):
+    """
+    Called when func() raised, or its Deferred failed. The command
+    handler will not call at_post_cmd, so clean up here; failed
+    invocations are not timed.
+    """
+    if getattr(cmd, "_metrics_start", None) is None:
+        return
+    _stop_profiler(cmd)
+    _release(cmd)
+
+
+def command_finished(cmd):
+    """
+    Called from `Command.at_post_cmd`. Records the command's wall time
+    and the number of database queries and messages it issued.
+    """
+    start = getattr(cmd, "_metrics_start", None)
+    if start is None:
+        return
+    started, queries, messages = start
+    elapsed = perf_counter() - started
+    profiler = _stop_profiler(cmd)
+    if profiler is not None:
+        _keep_profile(cmd.key, elapsed, profiler)
+    COMMAND_SECONDS.observe(elapsed, cmd.key)
+    COMMAND_QUERIES.inc(_QUERY_COUNT[0] - queries, cmd.key)
+    COMMAND_MESSAGES.inc(_MESSAGE_COUNT[0] - messages, cmd.key)
+    _release(cmd)
+
+
+def session_disconnected(session):
+    "Forget any pending-command bookkeeping for `session`."
+    PENDING_COMMANDS.pop(session.sessid, None)
+
+
+# ==============================================================
+# ==
+# == Command profiling
+# ==
+# ==============================================================
+
+# Sampled invocations are run under cProfile. A profile is kept if the
+# invocation was among the slowest 1% of its command (it falls into the
+# bucket of the command's 99th percentile, or above), and only the
+# slowest PROFILE_KEEP profiles are kept overall.
+PROFILING = {"rate": 0.0, "active": None}
+PROFILE_KEEP = 50
+# Heap of (seconds, sequence, command key, timestamp, stats text).
+SLOW_PROFILES = []
+_PROFILE_SEQ = [0]
+# Observations needed before a command's percentiles are trusted.
+_PROFILE_MIN_COUNT = 100
+
+
+def set_profile_rate(rate):
+    "Profile the given fraction (0-1) of command invocations."
+    PROFILING["rate"] = max(0.0, min(1.0, float(rate)))
+
+
+def _keep_profile(key, elapsed, profiler):
+    if COMMAND_SECONDS.count(key) < _PROFILE_MIN_COUNT:
+        return
+    p99 = COMMAND_SECONDS.quantile(0.99, key)
+    buckets = COMMAND_SECONDS.buckets
+    if bisect_left(buckets, elapsed) < bisect_left(buckets, p99):
+        return
+    if len(SLOW_PROFILES) >= PROFILE_KEEP and elapsed <= SLOW_PROFILES[0][0]:
+        return
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+    _PROFILE_SEQ[0] += 1
+    entry = (elapsed, _PROFILE_SEQ[0], key, time.time(), out.getvalue())
+    if len(SLOW_PROFILES) >= PROFILE_KEEP:
+        heapq.heapreplace(SLOW_PROFILES, entry)
+    else:
+        heapq.heappush(SLOW_PROFILES, entry)
+
+
+def command_summary():
+    """
+    Returns per-command statistics, slowest p99 first, as a list of
+    `(key, count, mean seconds, p50, p99, queries per call, messages
+    per call)` tuples.
+    """
+    rows = []
+    for (key,), (_, total, count) in list(COMMAND_SECONDS.values.items()):
+        if not count:
+            continue
+        rows.append(
+            (
+                key,
+                count,
+                total / count,
+                COMMAND_SECONDS.quantile(0.5, key),
+                COMMAND_SECONDS.quantile(0.99, key),
+                COMMAND_QUERIES.get(key) / count,
+                COMMAND_MESSAGES.get(key) / count,
+            )
+        )
+    rows.sort(key=lambda row: row[4], reverse=True)
+    return rows
+
+
+def dump_commands(path):
+    """
+    Write the command statistics and the kept slow-invocation profiles
+    to a text file.
+
+    Returns:
+        num (int): The number of profiles written.
+    """
+    return write_commands(path, command_summary(), sorted(SLOW_PROFILES, reverse=True))
+
+
+def write_commands(path, summary, profiles):
+    """
+    Write a `command_summary()` and a list of slow profiles to a text
+    file. Only touches its arguments, so it can run in a worker thread.
+
+    Returns:
+        num (int): The number of profiles written.
+    """
+    with open(path, "w", encoding="utf-8") as fil:
+        fil.write("gridpunx command statistics, %s\n\n" % time.strftime("%Y-%m-%d %H:%M:%S"))
+        fil.write("%-24s %8s %10s %10s %10s %9s %9s\n" % (
+            "command", "calls", "mean(s)", "p50(s)", "p99(s)", "queries", "messages"))
+        for row in summary:
+            fil.write("%-24s %8i %10.4f %10s %10s %9.1f %9.1f\n" % row)
+        for elapsed, _, key, stamp, text in profiles:
+            fil.write(
+                "\n%s\n%s took %.4fs at %s\n\n%s"
+                % ("=" * 72, key, elapsed, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stamp)), text)
+            )
+    return len(profiles)
+
+
+def _session_samples():
+    for sessid, pending in list(PENDING_COMMANDS.items()):
+        if sessid is not None:
+            yield (sessid,), pending
+
+
+def _offload_samples():
+    from world import offload
+
+    for lane, pending in list(offload.PENDING.items()):
+        yield (lane,), pending
+
+
+def _idmapper_samples():
+    from evennia.utils.idmapper.models import cache_size
+
+    total, classes = cache_size()
+    for classname, num in classes.items():
+        yield (classname,), num
+
+
+# ==============================================================
+# ==
+# == gridpunx metrics
+# ==
+# ==============================================================
+
+COMMAND_SECONDS = Histogram(
+    "gridpunx_command_seconds", "Command execution wall time by command key.", ("command",)
+)
+COMMAND_QUERIES = Counter(
+    "gridpunx_command_db_queries_total",
+    "Database queries issued while executing a command, by command key.",
+    ("command",),
+)
+COMMAND_MESSAGES = Counter(
+    "gridpunx_command_messages_total",
+    "Messages sent to sessions while executing a command, by command key.",
+    ("command",),
+)
+SCRIPT_TICK_SECONDS = Histogram(
+    "gridpunx_script_tick_seconds", "Duration of script at_repeat calls by script key.", ("script",)
+)
+CACHE_REQUESTS = Counter(
+    "gridpunx_cache_requests_total",
+    "Lookups against gridpunx in-memory caches by cache and result (hit/miss).",
+    ("cache", "result"),
+)
+OFFLOAD_SECONDS = Histogram(
+    "gridpunx_offload_seconds", "Run time of jobs offloaded to worker threads, by lane.", ("lane",)
+)
+OFFLOAD_WAIT_SECONDS = Histogram(
+    "gridpunx_offload_wait_seconds",
+    "Time offloaded jobs waited for a worker thread, by lane.",
+    ("lane",),
+)
+OFFLOAD_PENDING = Gauge(
+    "gridpunx_offload_pending_jobs",
+    "Offloaded jobs queued or running, by lane.",
+    ("lane",),
+    callback=_offload_samples,
+)
+SESSION_PENDING = Gauge(
+    "gridpunx_session_pending_commands",
+    "Commands currently executing, per session id.",
+    ("session",),
+    callback=_session_samples,
+)
+IDMAPPER_OBJECTS = Gauge(
+    "gridpunx_idmapper_cached_objects",
+    "Database objects held in the idmapper cache, per model class.",
+    ("model",),
+    callback=_idmapper_samples,
+)
+DB_QUERIES = Gauge(
+    "gridpunx_db_queries",
+    "Database queries issued by the game thread since the server started.",
+    callback=lambda: (((), _QUERY_COUNT[0]),),
+)
@@ -0,0 +1,137 @@
+"""
+Offload
+
+Runs blocking work (file reads and writes, heavy computation, big
+read-only queries) in worker threads so it does not stall the reactor
+thread every command and script runs on.
+
+Work goes into one of two lanes, each with its own thread pool:
+
+    interactive - work a player is waiting for; few jobs, short.
+    batch       - admin reports, bulk loaders, log writers.
+
+Batch work can never take the threads of the interactive lane, and a
+lane refuses new jobs (with `OffloadBusy`) once as many jobs as
+`settings.GRIDPUNX_OFFLOAD_LANES` allows are pending, instead of
+queueing without bound.
+
+Only functions declared with `@offloadable(lane)` can be offloaded.
+Declaring a function offloadable is a promise that it is safe to run
+off the reactor thread: it takes and returns plain data (ids, strings,
+dicts) and does not touch typeclassed objects, their handlers or any
+other in-memory game state. The Deferred returned by `run()` fires on
+the reactor thread, so its callbacks are where results are applied to
+the game.
+
+    from world import offload
+
+    @offload.offloadable(offload.BATCH)
+    def economy_report(since):
+        ...  # plain queries, returns a dict
+
+    offload.run(economy_report, since).addCallback(show_report)
+
+A command's func() can return that Deferred; the command handler
+waits for it (and only then calls at_post_cmd, so the command metrics
+cover the whole job) while other players' commands go on.
+
+"""
+
+from time import perf_counter
+
+from django.conf import settings
+from django.db import close_old_connections
+from twisted.internet import defer, reactor
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from world import metrics
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# lane -> ThreadPool, started on first use
+_POOLS = {}
+# lane -> jobs queued or running
+PENDING = {}
+
+
+class OffloadBusy(Exception):
+    "A lane has too many pending jobs."
+
+
+def offloadable(lane=BATCH):
+    """
+    Decorator declaring a function safe to run in a worker thread of
+    `lane`. The function can still be called directly.
+    """
+    if lane not in settings.GRIDPUNX_OFFLOAD_LANES:
+        raise ValueError("Unknown offload lane '%s'." % lane)
+
+    def _declare(func):
+        func.offload_lane = lane
+        return func
+
+    return _declare
+
+
+def _pool(lane):
+    "The thread pool of a lane, started on first use."
+    pool = _POOLS.get(lane)
+    if pool is None:
+        threads, _ = settings.GRIDPUNX_OFFLOAD_LANES[lane]
+        pool = _POOLS[lane] = ThreadPool(minthreads=0, maxthreads=threads, name="gridpunx-%s" % lane)
+        pool.start()
+        reactor.addSystemEventTrigger("during", "shutdown", stop, lane)
+    return pool
+
+
+def _job(func, lane, queued, args, kwargs):
+    "Runs in the worker thread."
+    started = perf_counter()
+    # Metrics are only recorded on the reactor thread.
+    reactor.callFromThread(metrics.OFFLOAD_WAIT_SECONDS.observe, started - queued, lane)
+    # Worker threads keep their own database connection; treat every
+    # job like Django treats a request.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+        reactor.callFromThread(metrics.OFFLOAD_SECONDS.observe, perf_counter() - started, lane)
+
+
+def _finished(result, lane):
+    PENDING[lane] -= 1
+    return result
+
+
+def run(func, *args, **kwargs):
+    """
+    Run an offloadable function in a worker thread of its lane.
+
+    Returns:
+        deferred (Deferred): Fires on the reactor thread with the
+            function's return value, or fails with its exception, or
+            with `OffloadBusy` if the lane is full.
+
+    Raises:
+        ValueError: If `func` was not declared `@offloadable`.
+    """
+    lane = getattr(func, "offload_lane", None)
+    if lane is None:
+        raise ValueError("%r is not declared offloadable." % func)
+    _, max_pending = settings.GRIDPUNX_OFFLOAD_LANES[lane]
+    if PENDING.get(lane, 0) >= max_pending:
+        return defer.fail(OffloadBusy("The server is busy; try again in a moment."))
+    PENDING[lane] = PENDING.get(lane, 0) + 1
+    deferred = deferToThreadPool(reactor, _pool(lane), _job, func, lane, perf_counter(), args, kwargs)
+    return deferred.addBoth(_finished, lane)
+
+
+def stop(lane=None):
+    "Stop the thread pool of `lane` (default all), waiting for running jobs."
+    for name in [lane] if lane else list(_POOLS):
+        pool = _POOLS.pop(name, None)
+        if pool is not None:
+            pool.stop()
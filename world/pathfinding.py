@@ -0,0 +1,253 @@
+"""
+Pathfinding
+
+An in-memory graph of rooms and exits, with cached route finding.
+
+The graph is built at server start with a single query over all exits
+and is then kept current by Django signals as exits are created,
+deleted or relinked (a changed `location` or `destination`). Finding
+a route never touches the database, so NPCs can call it freely:
+
+    from world import pathfinding
+
+    route = pathfinding.find_path(npc.location, target_room)
+    if route:
+        exit_key = route[0][1]
+
+A route is a list of `(exit_id, exit_key, room_id)` steps, where
+`room_id` is the room the exit leads to. Routes are found with a
+breadth-first search, or with A* when a `heuristic(room_id, goal_id)`
+estimating the remaining number of steps is given. Recent routes are
+kept in an LRU cache, which is cleared whenever the graph changes.
+
+The graph only knows where exits lead. Locks (`traverse`) are checked
+when an exit is actually used, not here.
+
+"""
+
+import heapq
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from world import metrics
+
+# exit id -> (room id, destination id, exit key)
+EXITS = {}
+# room id -> {exit id: destination id}
+ADJACENCY = {}
+
+# (algorithm, start id, goal id) -> route, most recently used last
+_ROUTES = OrderedDict()
+
+# Model class, imported in start().
+_ObjectDB = None
+
+
+def _id(room):
+    "Accept objects or ids."
+    return room if isinstance(room, int) or room is None else room.id
+
+
+# ==============================================================
+# ==
+# == Graph maintenance
+# ==
+# ==============================================================
+
+def _changed():
+    _ROUTES.clear()
+
+
+def _remove_exit(exit_id):
+    old = EXITS.pop(exit_id, None)
+    if old:
+        ADJACENCY.get(old[0], {}).pop(exit_id, None)
+    return old
+
+
+def update_exit(exit_id, room_id, destination_id, key):
+    """
+    Add or relink an exit. Exits without a location or destination
+    are removed from the graph.
+    """
+    current = EXITS.get(exit_id)
+    if room_id is None or destination_id is None:
+        if current:
+            _remove_exit(exit_id)
+            _changed()
+        return
+    if current == (room_id, destination_id, key):
+        return
+    _remove_exit(exit_id)
+    EXITS[exit_id] = (room_id, destination_id, key)
+    ADJACENCY.setdefault(room_id, {})[exit_id] = destination_id
+    _changed()
+
+
+def remove_exit(exit_id):
+    "Remove an exit from the graph."
+    if _remove_exit(exit_id):
+        _changed()
+
+
+def _on_post_save(sender, instance, raw=False, **kwargs):
+    if raw or not isinstance(instance, _ObjectDB):
+        return
+    if instance.db_destination_id is None and instance.id not in EXITS:
+        # not an exit; by far the most common case
+        return
+    update_exit(instance.id, instance.db_location_id, instance.db_destination_id, instance.db_key)
+
+
+def _on_post_delete(sender, instance, **kwargs):
+    if not isinstance(instance, _ObjectDB):
+        return
+    if instance.id in EXITS:
+        remove_exit(instance.id)
+    if ADJACENCY.pop(instance.id, None) is not None:
+        _changed()
+
+
+def build():
+    """
+    Rebuild the whole graph from the database with one query.
+    """
+    EXITS.clear()
+    ADJACENCY.clear()
+    for exit_id, room_id, destination_id, key in _ObjectDB.objects.filter(
+        db_location__isnull=False, db_destination__isnull=False
+    ).values_list("id", "db_location_id", "db_destination_id", "db_key"):
+        EXITS[exit_id] = (room_id, destination_id, key)
+        ADJACENCY.setdefault(room_id, {})[exit_id] = destination_id
+    _changed()
+
+
+def start():
+    """
+    Build the graph and connect the signals keeping it current.
+    Called from at_server_start.
+    """
+    global _ObjectDB
+    from django.db.models.signals import post_delete, post_save
+    from evennia.objects.models import ObjectDB
+
+    _ObjectDB = ObjectDB
+    build()
+    post_save.connect(_on_post_save, dispatch_uid="gridpunx_pathfinding_save")
+    post_delete.connect(_on_post_delete, dispatch_uid="gridpunx_pathfinding_delete")
+
+
+# ==============================================================
+# ==
+# == Routes
+# ==
+# ==============================================================
+
+def neighbors(room):
+    """
+    Returns the `(exit_id, exit_key, room_id)` steps leading out of
+    a room.
+    """
+    return [
+        (exit_id, EXITS[exit_id][2], destination_id)
+        for exit_id, destination_id in ADJACENCY.get(_id(room), {}).items()
+    ]
+
+
+def _route(came_from, goal):
+    route = []
+    node = goal
+    while came_from[node] is not None:
+        prev, exit_id = came_from[node]
+        route.append((exit_id, EXITS[exit_id][2], node))
+        node = prev
+    route.reverse()
+    return route
+
+
+def _bfs(start, goal, max_steps):
+    came_from = {start: None}
+    queue = deque([(start, 0)])
+    while queue:
+        node, depth = queue.popleft()
+        if node == goal:
+            return _route(came_from, goal)
+        if max_steps is not None and depth >= max_steps:
+            continue
+        for exit_id, destination_id in ADJACENCY.get(node, {}).items():
+            if destination_id not in came_from:
+                came_from[destination_id] = (node, exit_id)
+                queue.append((destination_id, depth + 1))
+    return None
+
+
+def _astar(start, goal, heuristic, max_steps):
+    came_from = {start: None}
+    cost = {start: 0}
+    counter = 0  # tie-breaker, keeps the heap from comparing ids
+    heap = [(heuristic(start, goal), counter, start)]
+    while heap:
+        _, _, node = heapq.heappop(heap)
+        if node == goal:
+            return _route(came_from, goal)
+        steps = cost[node] + 1
+        if max_steps is not None and steps > max_steps:
+            continue
+        for exit_id, destination_id in ADJACENCY.get(node, {}).items():
+            if steps < cost.get(destination_id, steps + 1):
+                cost[destination_id] = steps
+                came_from[destination_id] = (node, exit_id)
+                counter += 1
+                heapq.heappush(heap, (steps + heuristic(destination_id, goal), counter, destination_id))
+    return None
+
+
+def find_path(start, goal, heuristic=None, max_steps=None):
+    """
+    Find the shortest route between two rooms.
+
+    Args:
+        start (Room or int): The room (or room id) to start from.
+        goal (Room or int): The room (or room id) to get to.
+        heuristic (callable, optional): `heuristic(room_id, goal_id)`
+            returning a lower bound of the steps left. Uses A* if
+            given, a breadth-first search otherwise.
+        max_steps (int, optional): Give up on routes longer than this.
+
+    Returns:
+        route (list or None): `(exit_id, exit_key, room_id)` steps, an
+            empty list if `start` is `goal`, or None if there is no
+            route.
+
+    """
+    start, goal = _id(start), _id(goal)
+    cachekey = (heuristic, max_steps, start, goal)
+    try:
+        route = _ROUTES[cachekey]
+    except KeyError:
+        pass
+    else:
+        _ROUTES.move_to_end(cachekey)
+        metrics.CACHE_REQUESTS.inc(1, "routes", "hit")
+        return list(route) if route is not None else None
+    metrics.CACHE_REQUESTS.inc(1, "routes", "miss")
+
+    if heuristic:
+        route = _astar(start, goal, heuristic, max_steps)
+    else:
+        route = _bfs(start, goal, max_steps)
+    _ROUTES[cachekey] = tuple(route) if route is not None else None
+    if len(_ROUTES) > settings.GRIDPUNX_ROUTE_CACHE_SIZE:
+        _ROUTES.popitem(last=False)
+    return route
+
+
+def next_step(start, goal, **kwargs):
+    """
+    Returns the key of the exit to take from `start` towards `goal`,
+    or None if already there or there is no route. Takes the same
+    keyword arguments as `find_path()`.
+    """
+    route = find_path(start, goal, **kwargs)
+    return route[0][1] if route else None
@@ -34,40 +34,157 @@ Possible keywords are:
 
 See the `@spawn` command and `evennia.utils.spawner` for more info.
 
+The prototypes below make up the gridpunx library for the object
+typeclasses in `typeclasses/objects.py`. Spawning many objects from
+code should go through `world.spawnplan.spawn_many`, which flattens
+the `prototype_parent` chains once and caches the result. Items with a
+`stack_key` are stacks (see `RealItem`); spawn any number of them as
+one object with `world.spawnplan.spawn_stack`. `weight` (kg) and
+`value` (gridbits) are per item and add up in the totals of the
+containers holding them (see world/inventory.py).
+
 """
 
-# from random import randint
-#
-# GOBLIN = {
-# "key": "goblin grunt",
-# "health": lambda: randint(20,30),
-# "resists": ["cold", "poison"],
-# "attacks": ["fists"],
-# "weaknesses": ["fire", "light"]
-# }
-#
-# GOBLIN_WIZARD = {
-# "prototype_parent": "GOBLIN",
-# "key": "goblin wizard",
-# "spells": ["fire ball", "lighting bolt"]
-# }
-#
-# GOBLIN_ARCHER = {
-# "prototype_parent": "GOBLIN",
-# "key": "goblin archer",
-# "attacks": ["short bow"]
-# }
-#
-# This is an example of a prototype without a prototype
-# (nor key) of its own, so it should normally only be
-# used as a mix-in, as in the example of the goblin
-# archwizard below.
-# ARCHWIZARD_MIXIN = {
-# "attacks": ["archwizard staff"],
-# "spells": ["greater fire ball", "greater lighting"]
-# }
-#
-# GOBLIN_ARCHWIZARD = {
-# "key": "goblin archwizard",
-# "prototype_parent" : ("GOBLIN_WIZARD", "ARCHWIZARD_MIXIN")
-# }
+# ==============================================================
+# ==
+# == RealItem prototypes
+# ==
+# ==============================================================
+
+REAL_ITEM = {
+    "prototype_key": "real_item",
+    "prototype_desc": "Base for things that can be picked up.",
+    "typeclass": "typeclasses.objects.RealItem",
+    "key": "item",
+    "desc": "A nondescript piece of junk.",
+}
+
+BULLET = {
+    "prototype_parent": "REAL_ITEM",
+    "prototype_key": "bullet",
+    "key": "bullet",
+    "aliases": ["round"],
+    "desc": "A 9mm round with a scuffed brass casing.",
+    "hitpoints": 2,
+    "stack_key": "bullet",
+    "weight": 0.012,
+    "value": 1,
+}
+
+DATA_CHIP = {
+    "prototype_parent": "REAL_ITEM",
+    "prototype_key": "data_chip",
+    "key": "data chip",
+    "aliases": ["chip"],
+    "desc": "A thumbnail-sized chip of black polymer. Who knows what's on it.",
+    "hitpoints": 4,
+    "stack_key": "data_chip",
+    "weight": 0.005,
+    "value": 25,
+}
+
+STIM_PATCH = {
+    "prototype_parent": "REAL_ITEM",
+    "prototype_key": "stim_patch",
+    "key": "stim patch",
+    "aliases": ["stim", "patch"],
+    "desc": "An adhesive patch loaded with cheap synthetic adrenaline.",
+    "hitpoints": 2,
+    "stack_key": "stim_patch",
+    "weight": 0.01,
+    "value": 40,
+}
+
+
+# ==============================================================
+# ==
+# == RealThing prototypes (connected to The Grid)
+# ==
+# ==============================================================
+
+REAL_THING = {
+    "prototype_key": "real_thing",
+    "prototype_desc": "Base for devices connected to The Grid.",
+    "typeclass": "typeclasses.objects.RealThing",
+    "key": "device",
+    "desc": "A small device with a blinking status light.",
+}
+
+SECURITY_CAMERA = {
+    "prototype_parent": "REAL_THING",
+    "prototype_key": "security_camera",
+    "key": "security camera",
+    "aliases": ["camera", "cam"],
+    "desc": "A dome camera, its lens tracking every movement.",
+    "locks": "get:perm(Builders)",
+}
+
+SMART_TERMINAL = {
+    "prototype_parent": "REAL_THING",
+    "prototype_key": "smart_terminal",
+    "key": "terminal",
+    "desc": "A public Grid terminal, its screen cracked and greasy.",
+    "hitpoints": 96,
+    "locks": "get:perm(Builders)",
+}
+
+
+# ==============================================================
+# ==
+# == RealContainer prototypes
+# ==
+# ==============================================================
+
+REAL_CONTAINER = {
+    "prototype_key": "real_container",
+    "prototype_desc": "Base for things that hold other things.",
+    "typeclass": "typeclasses.objects.RealContainer",
+    "key": "container",
+    "desc": "Something you could put things in.",
+}
+
+BACKPACK = {
+    "prototype_parent": "REAL_CONTAINER",
+    "prototype_key": "backpack",
+    "key": "backpack",
+    "aliases": ["pack", "bag"],
+    "desc": "A worn synthweave backpack.",
+    "weight": 1.2,
+    "value": 60,
+}
+
+SUPPLY_CRATE = {
+    "prototype_parent": "REAL_CONTAINER",
+    "prototype_key": "supply_crate",
+    "key": "supply crate",
+    "aliases": ["crate"],
+    "desc": "A dented plasteel crate stenciled with a corporate logo.",
+    "hitpoints": 64,
+    "weight": 15,
+    "value": 30,
+    "locks": "get:perm(Builders)",
+}
+
+
+# ==============================================================
+# ==
+# == RealEnvironment prototypes
+# ==
+# ==============================================================
+
+REAL_ENVIRONMENT = {
+    "prototype_key": "real_environment",
+    "prototype_desc": "Base for structures and other very large objects.",
+    "typeclass": "typeclasses.objects.RealEnvironment",
+    "key": "structure",
+    "desc": "Something big and immovable.",
+}
+
+VENDING_MACHINE = {
+    "prototype_parent": "REAL_ENVIRONMENT",
+    "prototype_key": "vending_machine",
+    "key": "vending machine",
+    "aliases": ["vendor", "machine"],
+    "desc": "A humming vending machine. Most of the slots are empty.",
+}
+
@@ -0,0 +1,118 @@
+"""
+Rendering
+
+Helpers for sending the same text to many sessions cheaply.
+
+Normally every outgoing string is ANSI-parsed by the Portal, once per
+receiving session, according to that session's client capabilities.
+For text that is sent to many sessions (the connection screen, busy
+channels) we instead parse it once per capability here and send the
+result with the `raw` option, which tells the telnet protocols to
+pass it through untouched. `broadcast()` does this for a whole list of
+sessions, optionally spread over several reactor turns.
+
+Only the telnet-style protocols understand pre-parsed ANSI. Sessions
+on other protocols (like the webclient), or with MXP, screenreader or
+raw mode enabled, get the markup and are parsed by the Portal as
+usual; `capability()` returns None for those.
+
+"""
+
+from evennia.utils import logger
+from evennia.utils.ansi import parse_ansi
+from twisted.internet import reactor
+
+# Client capabilities a text can be pre-rendered for.
+CAPABILITIES = ("xterm256", "ansi", "plain")
+
+# Protocols whose send_text passes raw text straight to the socket.
+RAW_PROTOCOLS = ("telnet", "ssl", "ssh")
+
+
+def render_variants(text):
+    """
+    Parse Evennia markup once for every client capability.
+
+    Args:
+        text (str): Text with Evennia color markup.
+
+    Returns:
+        variants (dict): Maps each capability in CAPABILITIES to the
+            parsed string, ready to be sent with the `raw` option.
+    """
+    # Like the telnet protocol, always reset colors at the end.
+    text = text + "|n"
+    return {
+        "xterm256": parse_ansi(text, xterm256=True),
+        "ansi": parse_ansi(text, xterm256=False),
+        "plain": parse_ansi(text, strip_ansi=True),
+    }
+
+
+def capability(session):
+    """
+    Returns the capability key (see CAPABILITIES) matching how the
+    Portal would render text for `session`, or None if the session
+    must be sent markup.
+    """
+    if session.protocol_key not in RAW_PROTOCOLS:
+        return None
+    flags = session.protocol_flags
+    if flags.get("RAW") or flags.get("MXP") or flags.get("SCREENREADER"):
+        return None
+    # Mirror the telnet protocol: without TTYPE, assume a capable client.
+    ttype = flags.get("TTYPE", False)
+    xterm256 = flags.get("XTERM256", False) if ttype else True
+    useansi = flags.get("ANSI", False) if ttype else True
+    if flags.get("NOCOLOR") or not (xterm256 or useansi):
+        return "plain"
+    return "xterm256" if xterm256 else "ansi"
+
+
+def msg_variant(session, markup, variants, **options):
+    """
+    Send pre-rendered text to `session`, falling back to the markup
+    for sessions that cannot take raw text.
+
+    Args:
+        session (Session): The receiving session.
+        markup (str): The unparsed text.
+        variants (dict): Output of `render_variants(markup)`.
+        **options: Extra output options, like `from_channel`.
+    """
+    cap = capability(session)
+    if cap is None:
+        session.msg(text=markup, options=options)
+    else:
+        options["raw"] = True
+        session.msg(text=variants[cap], options=options)
+
+
+def broadcast(sessions, markup, batch_size=0, **options):
+    """
+    Send the same text to many sessions, parsing it once per client
+    capability.
+
+    Args:
+        sessions (list): The receiving sessions.
+        markup (str): The text, with color markup.
+        batch_size (int, optional): If set, only this many sessions are
+            sent to right away; the rest follow in batches of the same
+            size, one per reactor turn.
+        **options: Extra output options, like `from_channel`.
+    """
+    if not sessions:
+        return
+    variants = render_variants(markup)
+    batch_size = batch_size or len(sessions)
+
+    def _send(start):
+        for session in sessions[start : start + batch_size]:
+            try:
+                msg_variant(session, markup, variants, **options)
+            except Exception:
+                logger.log_trace("Could not send to session %s." % session.sessid)
+        if start + batch_size < len(sessions):
+            reactor.callLater(0, _send, start + batch_size)
+
+    _send(0)
@@ -0,0 +1,254 @@
+"""
+Spawn plans
+
+Compiled, cached prototypes for spawning objects in bulk.
+
+Evennia's spawner re-resolves a prototype's whole `prototype_parent`
+chain and re-validates every key on each `spawn()` call. A spawn plan
+does that work once per prototype: the chain is flattened, the
+typeclass is checked, the keys are sorted into the parameter slots the
+spawner's batch path expects and values that must be computed per
+object (callables and $protfuncs) are set aside. Plans are cached by
+prototype key.
+
+    from world.spawnplan import spawn_many
+
+    terminals = spawn_many("smart_terminal", 20, location=office)
+
+Stackable items (prototypes with a `stack_key`, see `RealItem`) are
+better spawned as a single stack:
+
+    bullets = spawn_stack("bullet", 200, location=crate)
+
+Call `clear_plans()` after changing prototypes at runtime (for example
+with the OLC).
+
+"""
+
+from django.db import transaction
+from evennia.prototypes import prototypes as protlib
+from evennia.prototypes.spawner import batch_create_object
+from evennia.utils.utils import class_from_module, make_iter
+
+from world import builder
+
+# Prototype keys that are not turned into Attributes.
+_META_KEYS = (
+    "prototype_key",
+    "prototype_parent",
+    "prototype_desc",
+    "prototype_tags",
+    "prototype_locks",
+)
+_SLOT_KEYS = (
+    "key",
+    "typeclass",
+    "location",
+    "home",
+    "destination",
+    "permissions",
+    "locks",
+    "aliases",
+    "tags",
+    "attrs",
+    "exec",
+)
+
+# Tag category Evennia's spawner marks spawned objects with.
+_PROTOTYPE_TAG_CATEGORY = "from_prototype"
+
+# Cache of compiled plans: prototype key -> SpawnPlan
+_PLANS = {}
+
+
+class SpawnPlanError(ValueError):
+    """
+    Raised when a prototype cannot be compiled.
+    """
+
+    pass
+
+
+def _is_dynamic(value):
+    "Values that have to be computed anew for every spawned object."
+    return callable(value) or (isinstance(value, str) and "$" in value)
+
+
+def _find_prototype(prototype_key):
+    "Look up a prototype dict by key (module or database prototypes)."
+    matches = [
+        prot
+        for prot in protlib.search_prototype(prototype_key)
+        if prot.get("prototype_key", "").lower() == prototype_key.lower()
+    ]
+    if not matches:
+        raise SpawnPlanError("No prototype named '%s'." % prototype_key)
+    return matches[0]
+
+
+def flatten(prototype, _chain=()):
+    """
+    Resolve the `prototype_parent` chain of `prototype`.
+
+    Args:
+        prototype (dict or str): A prototype or a prototype key.
+
+    Returns:
+        flat (dict): A single prototype dict with every inherited key.
+            Later parents in a tuple override earlier ones, and the
+            prototype itself overrides all of its parents.
+
+    Raises:
+        SpawnPlanError: On unknown parents or inheritance loops.
+    """
+    if isinstance(prototype, str):
+        prototype = _find_prototype(prototype)
+    key = prototype.get("prototype_key")
+    if key and key.lower() in _chain:
+        raise SpawnPlanError("Prototype inheritance loop: %s" % " -> ".join(_chain + (key,)))
+    chain = _chain + ((key.lower(),) if key else ())
+    flat = {}
+    for parent in make_iter(prototype.get("prototype_parent") or ()):
+        flat.update(flatten(parent, chain))
+    flat.update(prototype)
+    return flat
+
+
+class SpawnPlan:
+    """
+    A flattened and validated prototype, ready for spawning.
+    """
+
+    def __init__(self, prototype):
+        flat = flatten(prototype)
+        self.prototype_key = flat.get("prototype_key")
+        self.typeclass = flat.get("typeclass")
+        if not self.typeclass:
+            raise SpawnPlanError("Prototype '%s' has no typeclass." % self.prototype_key)
+        try:
+            class_from_module(self.typeclass)
+        except ImportError as err:
+            raise SpawnPlanError(
+                "Prototype '%s': bad typeclass %s (%s)." % (self.prototype_key, self.typeclass, err)
+            )
+        self.key = flat.get("key")
+        self.home = flat.get("home")
+        self.permissions = make_iter(flat.get("permissions") or [])
+        self.locks = flat.get("locks", "")
+        self.aliases = make_iter(flat.get("aliases") or [])
+        self.tags = [
+            tuple(tag) if isinstance(tag, (list, tuple)) else tag
+            for tag in make_iter(flat.get("tags") or [])
+        ]
+        if self.prototype_key:
+            self.tags.append((self.prototype_key, _PROTOTYPE_TAG_CATEGORY))
+        self.execs = make_iter(flat.get("exec") or [])
+
+        # Attributes: explicit `attrs` tuples plus all free keys.
+        attributes = [tuple(make_iter(attr)) for attr in make_iter(flat.get("attrs") or [])]
+        nattributes = []
+        for name, value in flat.items():
+            if name in _META_KEYS or name in _SLOT_KEYS:
+                continue
+            if name.startswith("ndb_"):
+                nattributes.append((name[4:], value))
+            else:
+                attributes.append((name, value))
+        self.nattributes = nattributes
+
+        # Split static Attributes from those computed per object.
+        self.static_attributes = [attr for attr in attributes if not _is_dynamic(attr[1])]
+        self.dynamic_attributes = [attr for attr in attributes if _is_dynamic(attr[1])]
+        self.dynamic_key = _is_dynamic(self.key)
+
+    def objparams(self, location=None, **overrides):
+        """
+        Returns one parameter tuple for the spawner's batch_create_object.
+        `overrides` can replace `key` or add Attributes by name.
+        """
+        key = overrides.pop("key", None) or self.key
+        if self.dynamic_key and key is self.key:
+            key = protlib.init_spawn_value(key, str)
+        attributes = list(self.static_attributes)
+        for attr in self.dynamic_attributes:
+            attributes.append((attr[0], protlib.init_spawn_value(attr[1])) + attr[2:])
+        attributes.extend(overrides.items())
+        create_kwargs = {
+            "db_key": key,
+            "db_typeclass_path": self.typeclass,
+            "db_location": location,
+            "db_home": location if self.home is None else self.home,
+        }
+        return (
+            create_kwargs,
+            self.permissions,
+            self.locks,
+            self.aliases,
+            self.nattributes,
+            attributes,
+            self.tags,
+            self.execs,
+        )
+
+
+def compile_plan(prototype):
+    """
+    Returns the compiled SpawnPlan for a prototype. Plans for keyed
+    prototypes are cached; unkeyed prototype dicts are compiled anew.
+    """
+    if isinstance(prototype, str):
+        cachekey = prototype.lower()
+    else:
+        cachekey = (prototype.get("prototype_key") or "").lower() or None
+    plan = _PLANS.get(cachekey) if cachekey else None
+    if plan is None:
+        plan = SpawnPlan(prototype)
+        if cachekey:
+            _PLANS[cachekey] = plan
+    return plan
+
+
+def clear_plans():
+    "Forget all compiled plans."
+    _PLANS.clear()
+
+
+def spawn_many(prototype, n, location=None, **overrides):
+    """
+    Spawn `n` objects from one prototype in a single transaction.
+
+    Args:
+        prototype (dict or str): The prototype or its key.
+        n (int): How many objects to create.
+        location (Object, optional): Where to put them.
+        **overrides: `key` and/or Attributes to set on every object.
+
+    Returns:
+        objects (list): The new objects.
+
+    """
+    plan = compile_plan(prototype)
+    params = [plan.objparams(location, **dict(overrides)) for _ in range(n)]
+    with transaction.atomic():
+        objects = batch_create_object(*params)
+    builder.receive_created(objects)
+    return objects
+
+
+def spawn_stack(prototype, quantity, location=None, **overrides):
+    """
+    Spawn `quantity` stackable items (see `RealItem`) as one stack,
+    merged into a matching stack already in `location`.
+
+    Returns:
+        stack (RealItem): The stack the items ended up in.
+
+    Raises:
+        SpawnPlanError: If the prototype has no `stack_key`.
+
+    """
+    plan = compile_plan(prototype)
+    if not any(attr[0] == "stack_key" for attr in plan.static_attributes):
+        raise SpawnPlanError("Prototype '%s' is not stackable." % plan.prototype_key)
+    stack = spawn_many(prototype, 1, location, quantity=quantity, **overrides)[0]
+    return stack.merge_stack()
@@ -0,0 +1,235 @@
+"""
+Warm-up
+
+Cache priming after a server start or reload.
+
+Right after a reload the idmapper cache is empty, so the first commands
+in each room pay for loading typeclasses, contents and Attributes one
+object at a time. The functions here load the hot part of the world up
+front, in a few large queries, and report how long it took:
+
+- `warm_up_world()` runs from `at_server_start` and loads the rooms of
+  the typeclasses in `settings.GRIDPUNX_WARMUP_ROOM_TYPECLASSES`, their
+  contents (exits, NPCs, items) and all of their Attributes, and builds
+  the cmdsets of NPCs and exits.
+- `warm_up_online()` runs from `at_server_reload_start`, once sessions
+  have been re-attached to their puppets, and does the same for the
+  online characters and the rooms they are standing in.
+
+Set `settings.GRIDPUNX_WARMUP = False` to disable both.
+
+The derived caches kept in `ndb` (room appearances, conditions and
+container totals) are carried over a reload by the `caches` hot state
+provider (`dump_caches()` and `load_caches()`, see world/hotstate.py),
+for the objects primed again after the reload. Nothing can change
+them while the server is down, and they are kept current after it by
+the hooks and world/derived.py, so a restored value is as good as one
+computed before the reload.
+
+"""
+
+from collections import defaultdict
+from time import perf_counter
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.utils import logger
+from evennia.utils.utils import to_str
+
+from world import metrics
+
+# Fetch object ids in chunks of this size, to stay below the SQL
+# parameter limits of SQLite.
+_CHUNK = 500
+
+
+def _chunks(items):
+    items = list(items)
+    for i in range(0, len(items), _CHUNK):
+        yield items[i : i + _CHUNK]
+
+
+def _load_contents(room_ids):
+    "Load everything located in the given rooms. One query per chunk."
+    objs = []
+    for chunk in _chunks(room_ids):
+        objs.extend(ObjectDB.objects.filter(db_location_id__in=chunk))
+    return objs
+
+
+# The AttributeHandler internals _prime_attributes fills in, as of
+# Evennia 0.9.5. If any is missing, the handlers cache themselves.
+_HANDLER_INTERNALS = ("_cache", "_cache_complete", "_model", "_attrtype")
+
+
+def _prime_attributes(objs):
+    """
+    Load the Attributes of all `objs` with one query per chunk and
+    hand them to each object's AttributeHandler, just like the handler's
+    own full-cache load (which would cost one query per object): same
+    filter, same cache keys.
+
+    Nothing is primed if the handlers do not cache (with
+    `settings.TYPECLASS_AGGRESSIVE_CACHE` off), and if the handler's
+    internals are not the ones expected, each handler loads its own
+    cache through the public API instead.
+    """
+    if not getattr(settings, "TYPECLASS_AGGRESSIVE_CACHE", True):
+        return 0
+    objs = {obj.id: obj for obj in objs}
+    handlers = [obj.attributes for obj in objs.values()]
+    if not handlers:
+        return 0
+    if not all(hasattr(handler, name) for handler in handlers for name in _HANDLER_INTERNALS):
+        for handler in handlers:
+            handler.all()
+        return 0
+    model, attrtype = handlers[0]._model, handlers[0]._attrtype
+
+    through = ObjectDB.db_attributes.through
+    byobj = defaultdict(list)
+    for chunk in _chunks(objs):
+        for conn in through.objects.filter(
+            objectdb_id__in=chunk,
+            attribute__db_model__iexact=model,
+            attribute__db_attrtype=attrtype,
+        ).select_related("attribute"):
+            byobj[conn.objectdb_id].append(conn.attribute)
+
+    num = 0
+    for objid, obj in objs.items():
+        handler = obj.attributes
+        if handler._cache_complete:
+            continue
+        attrs = byobj.get(objid, ())
+        handler._cache = {
+            "%s-%s"
+            % (to_str(attr.db_key).lower(), attr.db_category.lower() if attr.db_category else None): attr
+            for attr in attrs
+        }
+        handler._cache_complete = True
+        num += len(attrs)
+    return num
+
+
+def _prime_cmdsets(objs):
+    "Build the cmdsets of objects that carry commands."
+    for obj in objs:
+        if obj.destination:
+            # Exits build their traversal cmdset on first access.
+            obj.at_cmdset_get()
+        elif obj.cmdset_storage:
+            # The handler loads all stored cmdsets when created.
+            obj.cmdset
+
+
+def _prime_rooms(rooms, extra=()):
+    """
+    Prime rooms, their contents and the `extra` objects. Returns the
+    number of objects and Attributes loaded.
+    """
+    contents = _load_contents([room.id for room in rooms])
+    objs = list({obj.id: obj for obj in list(rooms) + contents + list(extra)}.values())
+    numattrs = _prime_attributes(objs)
+    _prime_cmdsets(contents)
+    for room in rooms:
+        # Builds the room's contents cache.
+        room.contents
+    return len(objs), numattrs
+
+
+def _report(what, started, queries, numobjs, numattrs):
+    logger.log_info(
+        "gridpunx warm-up (%s): %i objects and %i Attributes in %.2fs (%i queries)."
+        % (what, numobjs, numattrs, perf_counter() - started, metrics.query_count() - queries)
+    )
+
+
+def warm_up_world():
+    """
+    Prime the rooms of the configured typeclasses and everything in
+    them. Called from at_server_start.
+    """
+    if not settings.GRIDPUNX_WARMUP:
+        return
+    started, queries = perf_counter(), metrics.query_count()
+    try:
+        rooms = list(
+            ObjectDB.objects.filter(
+                db_location__isnull=True,
+                db_typeclass_path__in=settings.GRIDPUNX_WARMUP_ROOM_TYPECLASSES,
+            ).order_by("id")[: settings.GRIDPUNX_WARMUP_MAX_ROOMS]
+        )
+        numobjs, numattrs = _prime_rooms(rooms)
+    except Exception:
+        logger.log_trace("gridpunx warm-up (world) failed.")
+        return
+    _report("world", started, queries, numobjs, numattrs)
+
+
+def warm_up_online():
+    """
+    Prime online characters and the rooms they are in. Called from
+    at_server_reload_start.
+    """
+    if not settings.GRIDPUNX_WARMUP:
+        return
+    started, queries = perf_counter(), metrics.query_count()
+    try:
+        puppets = [sess.puppet for sess in SESSION_HANDLER.get_sessions() if sess.puppet]
+        rooms = list({puppet.location for puppet in puppets if puppet.location})
+        numobjs, numattrs = _prime_rooms(rooms, extra=puppets)
+    except Exception:
+        logger.log_trace("gridpunx warm-up (online) failed.")
+        return
+    _report("online", started, queries, numobjs, numattrs)
+
+
+# ==============================================================
+# ==
+# == Derived caches across reloads
+# ==
+# ==============================================================
+
+# ndb caches whose values can be pickled as they are.
+_PLAIN_CACHES = ("appearance_header", "condition", "totals")
+
+
+def dump_caches():
+    "Hot state provider: the derived ndb caches of objects in memory."
+    state = {}
+    for obj in ObjectDB.get_all_cached_instances():
+        entry = {}
+        for key in _PLAIN_CACHES:
+            value = obj.nattributes.get(key)
+            if value is not None:
+                entry[key] = value
+        contents = obj.nattributes.get("appearance_contents")
+        if contents is not None:
+            # The objects checked per looker are saved by id.
+            exits, users, things, private = contents
+            entry["appearance_contents"] = (exits, users, things, [con.id for con in private])
+        if entry:
+            state[obj.id] = entry
+    return state
+
+
+def load_caches(state):
+    """
+    Hot state provider: restore the caches of the objects that are in
+    memory again (primed by warm_up_online). Others compute theirs
+    when first used, as after a cold start.
+    """
+    for objid, entry in state.items():
+        obj = ObjectDB.get_cached_instance(objid)
+        if obj is None:
+            continue
+        contents = entry.pop("appearance_contents", None)
+        if contents is not None:
+            exits, users, things, private_ids = contents
+            private = [ObjectDB.get_cached_instance(conid) for conid in private_ids]
+            if None not in private:
+                obj.nattributes.add("appearance_contents", (exits, users, things, private))
+        for key, value in entry.items():
+            obj.nattributes.add(key, value)
@@ -0,0 +1,194 @@
+"""
+World state
+
+In-memory snapshot of public world state ("who's online", room
+occupancy and economy statistics) for the read-only JSON API in
+`web/views.py`.
+
+The snapshot is rebuilt on the reactor thread: periodically (every
+`settings.GRIDPUNX_WORLDSTATE_INTERVAL` seconds) and shortly after
+change events such as logins and logouts (see `mark_dirty()`). Web
+requests only ever read the latest snapshot, so traffic spikes on the
+website never turn into queries against the game database.
+
+Each section of the snapshot carries an `etag` computed when it was
+built, so the views can answer conditional requests with a 304
+without serializing anything.
+
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+
+from evennia.server.sessionhandler import SESSION_HANDLER
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils import logger
+
+# Delay (in seconds) used to coalesce bursts of change events
+# into one rebuild.
+_DIRTY_DELAY = 2.0
+
+# The current snapshot. Replaced as a whole on every rebuild, so
+# readers in the webserver threads never see a half-built snapshot.
+_SNAPSHOT = {}
+
+_LOOP = None
+_PENDING = None
+
+
+# ==============================================================
+# ==
+# == Snapshot sections
+# ==
+# ==============================================================
+
+def _online_characters():
+    """
+    Yields `(session, account, puppet)` for all logged-in sessions.
+    Only in-memory objects are touched.
+    """
+    for session in SESSION_HANDLER.get_sessions():
+        if not session.logged_in:
+            continue
+        yield session, session.account, session.puppet
+
+
+def _build_who():
+    who = []
+    for session, account, puppet in _online_characters():
+        location = puppet.location if puppet else None
+        who.append(
+            {
+                "account": account.key if account else None,
+                "character": puppet.key if puppet else None,
+                "location": location.key if location else None,
+                "idle": int(time.time() - session.cmd_last_visible),
+            }
+        )
+    who.sort(key=lambda entry: (entry["account"] or "").lower())
+    return who
+
+
+def _build_rooms():
+    rooms = {}
+    for _, _, puppet in _online_characters():
+        location = puppet.location if puppet else None
+        if not location:
+            continue
+        entry = rooms.get(location.id)
+        if entry is None:
+            entry = rooms[location.id] = {"id": location.id, "room": location.key, "players": 0}
+        entry["players"] += 1
+    return sorted(rooms.values(), key=lambda entry: (-entry["players"], entry["room"]))
+
+
+def _build_economy():
+    # One query for every character's gridbits; this only ever runs
+    # on the refresh interval, never per web request.
+    balances = [
+        value
+        for value in Attribute.objects.filter(
+            db_key="gridbits", objectdb__isnull=False
+        ).values_list("db_value", flat=True)
+        if isinstance(value, int)
+    ]
+    balances.sort()
+    count = len(balances)
+    total = sum(balances)
+    return {
+        "characters": count,
+        "total_gridbits": total,
+        "mean_gridbits": round(total / count, 2) if count else 0,
+        "median_gridbits": balances[count // 2] if count else 0,
+        "max_gridbits": balances[-1] if count else 0,
+    }
+
+
+_BUILDERS = {"who": _build_who, "rooms": _build_rooms, "economy": _build_economy}
+
+# Sections that can be rebuilt from memory alone. These are the ones
+# refreshed on change events; the rest wait for the interval.
+_MEMORY_SECTIONS = ("who", "rooms")
+
+
+def _section(data):
+    "Wrap section data with its build time and etag."
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return {
+        "data": data,
+        "generated": time.time(),
+        "etag": hashlib.sha1(payload).hexdigest()[:16],
+    }
+
+
+# ==============================================================
+# ==
+# == Public API
+# ==
+# ==============================================================
+
+def refresh(sections=None):
+    """
+    Rebuild the given snapshot sections (all of them by default) and
+    publish the new snapshot. Must be called on the reactor thread.
+    """
+    global _SNAPSHOT, _PENDING
+    if sections is None:
+        sections = _BUILDERS.keys()
+        _PENDING = None
+    snapshot = dict(_SNAPSHOT)
+    for name in sections:
+        try:
+            snapshot[name] = _section(_BUILDERS[name]())
+        except Exception:
+            logger.log_trace("worldstate: could not build section '%s'." % name)
+    _SNAPSHOT = snapshot
+
+
+def _refresh_memory_sections():
+    global _PENDING
+    _PENDING = None
+    refresh(_MEMORY_SECTIONS)
+
+
+def mark_dirty():
+    """
+    Signal that online state changed. The in-memory sections are
+    rebuilt once after a short delay, however many events arrive.
+    """
+    global _PENDING
+    if _PENDING is None and _LOOP is not None:
+        _PENDING = reactor.callLater(_DIRTY_DELAY, _refresh_memory_sections)
+
+
+def get_section(name):
+    """
+    Returns the latest snapshot of section `name` as a dict with the
+    keys `data`, `generated` and `etag`, or None if the section has
+    not been built yet.
+    """
+    return _SNAPSHOT.get(name)
+
+
+def start():
+    "Start the periodic refresh. Called from at_server_start."
+    global _LOOP
+    if _LOOP is None:
+        _LOOP = LoopingCall(refresh)
+        _LOOP.start(settings.GRIDPUNX_WORLDSTATE_INTERVAL, now=True)
+
+
+def stop():
+    "Stop the periodic refresh. Called from at_server_stop."
+    global _LOOP, _PENDING
+    if _LOOP is not None and _LOOP.running:
+        _LOOP.stop()
+    _LOOP = None
+    if _PENDING is not None and _PENDING.active():
+        _PENDING.cancel()
+    _PENDING = None
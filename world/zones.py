@@ -0,0 +1,301 @@
+"""
+Zones
+
+Partitioning of rooms into zones, with per-zone activity and tick
+scheduling.
+
+A room's zone is a tag of category `zone` (so membership is indexed
+in the database and can be set from world files, `@tag` or the
+`Room.zone` property). The registry here mirrors those tags in memory:
+it is loaded with one query at server start and kept current by the
+tag signals, so looking up a zone never touches the database.
+
+A zone is *active* while at least one puppeted character is in one of
+its rooms; a room without a zone is active while it is occupied
+itself. Rooms report arrivals and departures from their
+`at_object_receive` and `at_object_leave` hooks, and characters from
+their puppet hooks. World-wide processes only need to look at active
+zones:
+
+    from world import zones
+
+    if not zones.is_room_active(room):
+        return
+
+For periodic work over whole zones, `ZoneTicker` spreads the zones
+over a number of tick slots, so that each zone is handled once per
+interval but not all of them in the same tick:
+
+    zones.ZoneTicker("weather", 60, update_weather).start()
+
+calls `update_weather(zone, room_ids)` for every active zone once a
+minute. Occupied rooms without a zone are handled on their own, as
+`update_weather(None, {room_id})`.
+
+"""
+
+import zlib
+from collections import defaultdict
+
+from django.conf import settings
+from twisted.internet.task import LoopingCall
+
+from evennia.utils import logger
+
+ZONE_CATEGORY = "zone"
+
+# zone -> set of room ids, and room id -> zone
+ZONES = defaultdict(set)
+ROOM_ZONE = {}
+# room id -> ids of puppeted characters in it
+PRESENT = defaultdict(set)
+# zone -> number of occupied rooms
+ACTIVE = defaultdict(int)
+
+# tag id -> zone, for all tags of the zone category
+_ZONE_TAGS = {}
+# Running tickers, by key.
+TICKERS = {}
+
+# Model classes, imported in start().
+_ObjectDB = None
+_Tag = None
+
+
+def _id(obj):
+    "Accept objects or ids."
+    return obj if isinstance(obj, int) or obj is None else obj.id
+
+
+# ==============================================================
+# ==
+# == Membership
+# ==
+# ==============================================================
+
+def zone_of(room):
+    "Returns the zone of a room (or room id), or None."
+    return ROOM_ZONE.get(_id(room))
+
+
+def rooms_in(zone):
+    "Returns the ids of the rooms in a zone."
+    return set(ZONES.get(zone, ()))
+
+
+def _set_zone(room_id, zone):
+    old = ROOM_ZONE.pop(room_id, None)
+    if old is not None:
+        ZONES[old].discard(room_id)
+        if not ZONES[old]:
+            del ZONES[old]
+        if PRESENT.get(room_id):
+            ACTIVE[old] -= 1
+    if zone is not None:
+        ROOM_ZONE[room_id] = zone
+        ZONES[zone].add(room_id)
+        if PRESENT.get(room_id):
+            ACTIVE[zone] += 1
+
+
+def _on_tag_save(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw and instance.db_category == ZONE_CATEGORY and not instance.db_tagtype:
+        _ZONE_TAGS[instance.id] = instance.db_key
+
+
+def _on_tags_changed(sender, instance, action, reverse=False, pk_set=None, **kwargs):
+    if reverse or not isinstance(instance, _ObjectDB):
+        return
+    if action == "post_add":
+        for tag_id in pk_set or ():
+            if tag_id in _ZONE_TAGS:
+                _set_zone(instance.id, _ZONE_TAGS[tag_id])
+    elif action == "post_remove":
+        if any(tag_id in _ZONE_TAGS for tag_id in pk_set or ()):
+            _set_zone(instance.id, None)
+    elif action == "post_clear":
+        _set_zone(instance.id, None)
+
+
+def _on_post_delete(sender, instance, **kwargs):
+    if isinstance(instance, _ObjectDB):
+        _set_zone(instance.id, None)
+        PRESENT.pop(instance.id, None)
+
+
+def load():
+    """
+    Rebuild the registry from the database with one query per model.
+    """
+    _ZONE_TAGS.clear()
+    ZONES.clear()
+    ROOM_ZONE.clear()
+    ACTIVE.clear()
+    for tag_id, key in _Tag.objects.filter(
+        db_category=ZONE_CATEGORY, db_tagtype=None
+    ).values_list("id", "db_key"):
+        _ZONE_TAGS[tag_id] = key
+    for room_id, tag_id in _ObjectDB.db_tags.through.objects.filter(
+        tag_id__in=list(_ZONE_TAGS)
+    ).values_list("objectdb_id", "tag_id"):
+        _set_zone(room_id, _ZONE_TAGS[tag_id])
+
+
+# ==============================================================
+# ==
+# == Activity
+# ==
+# ==============================================================
+
+def arrived(room, character):
+    "A puppeted character entered a room."
+    room_id = _id(room)
+    if room_id is None:
+        return
+    present = PRESENT[room_id]
+    if character.id in present:
+        return
+    present.add(character.id)
+    if len(present) == 1:
+        zone = ROOM_ZONE.get(room_id)
+        if zone is not None:
+            ACTIVE[zone] += 1
+
+
+def departed(room, character):
+    "A character left a room (or stopped being puppeted in it)."
+    room_id = _id(room)
+    present = PRESENT.get(room_id)
+    if not present or character.id not in present:
+        return
+    present.discard(character.id)
+    if not present:
+        del PRESENT[room_id]
+        zone = ROOM_ZONE.get(room_id)
+        if zone is not None:
+            ACTIVE[zone] -= 1
+            if ACTIVE[zone] <= 0:
+                del ACTIVE[zone]
+
+
+def is_active(zone):
+    "True if any room of the zone is occupied."
+    return ACTIVE.get(zone, 0) > 0
+
+
+def is_room_active(room):
+    """
+    True if the room's zone is active or, for rooms without a zone, if
+    the room itself is occupied.
+    """
+    room_id = _id(room)
+    zone = ROOM_ZONE.get(room_id)
+    if zone is None:
+        return bool(PRESENT.get(room_id))
+    return ACTIVE.get(zone, 0) > 0
+
+
+def active_zones():
+    "Returns the keys of all active zones."
+    return [zone for zone, num in ACTIVE.items() if num > 0]
+
+
+def seed_activity(puppets):
+    "Rebuild the activity flags from the given puppeted characters."
+    PRESENT.clear()
+    ACTIVE.clear()
+    for puppet in puppets:
+        arrived(puppet.location, puppet)
+
+
+# ==============================================================
+# ==
+# == Tick scheduling
+# ==
+# ==============================================================
+
+def slot(zone, slots):
+    "The tick slot (0 to slots - 1) a zone is handled in. Stable across reloads."
+    return zlib.crc32(str(zone).encode("utf-8")) % slots
+
+
+class ZoneTicker:
+    """
+    Calls `handler(zone, room_ids)` once per `interval` seconds for
+    every active zone, and `handler(None, {room_id})` for every
+    occupied room without a zone. The interval is split into `slots`
+    ticks and each zone (or zoneless room) is handled in its own slot.
+    """
+
+    def __init__(self, key, interval, handler, slots=None):
+        self.key = key
+        self.interval = interval
+        self.handler = handler
+        self.slots = max(1, slots or settings.GRIDPUNX_ZONE_TICK_SLOTS)
+        self.current = 0
+        self._loop = LoopingCall(self.tick)
+
+    def tick(self):
+        "Handle the active zones of the current slot."
+        current, self.current = self.current, (self.current + 1) % self.slots
+        for zone in active_zones():
+            if slot(zone, self.slots) != current:
+                continue
+            try:
+                self.handler(zone, rooms_in(zone))
+            except Exception:
+                logger.log_trace("zone ticker '%s' failed for zone '%s'." % (self.key, zone))
+        for room_id in list(PRESENT):
+            if room_id in ROOM_ZONE or slot("#%i" % room_id, self.slots) != current:
+                continue
+            try:
+                self.handler(None, {room_id})
+            except Exception:
+                logger.log_trace("zone ticker '%s' failed for room #%i." % (self.key, room_id))
+
+    def start(self):
+        "Start ticking, replacing any running ticker with the same key."
+        old = TICKERS.get(self.key)
+        if old is not None:
+            old.stop()
+        TICKERS[self.key] = self
+        self._loop.start(self.interval / self.slots, now=False)
+        return self
+
+    def stop(self):
+        "Stop ticking."
+        if self._loop.running:
+            self._loop.stop()
+        if TICKERS.get(self.key) is self:
+            del TICKERS[self.key]
+
+
+# ==============================================================
+# ==
+# == Startup
+# ==
+# ==============================================================
+
+def start():
+    """
+    Load the registry and connect the signals keeping it current.
+    Called from at_server_start.
+    """
+    global _ObjectDB, _Tag
+    from django.db.models.signals import m2m_changed, post_delete, post_save
+    from evennia.objects.models import ObjectDB
+    from evennia.typeclasses.tags import Tag
+
+    _ObjectDB, _Tag = ObjectDB, Tag
+    load()
+    post_save.connect(_on_tag_save, sender=Tag, dispatch_uid="gridpunx_zones_tag_save")
+    m2m_changed.connect(
+        _on_tags_changed, sender=ObjectDB.db_tags.through, dispatch_uid="gridpunx_zones_tags"
+    )
+    post_delete.connect(_on_post_delete, dispatch_uid="gridpunx_zones_delete")
+
+
+def stop():
+    "Stop all zone tickers. Called from at_server_stop."
+    for ticker in list(TICKERS.values()):
+        ticker.stop()